@@ -1,7 +1,14 @@
-from flask import Flask, render_template, redirect, url_for
+from flask import Flask, render_template, redirect
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.wrappers import Response
+import importlib
 import os
 import sys
 import logging
+import tempfile
+import threading
+import time
+import traceback
 from datetime import datetime
 
 # Configure logging
@@ -12,32 +19,154 @@ logger = logging.getLogger(__name__)
 sys.path.append(os.path.join(os.path.dirname(__file__), 'radiologytool'))
 sys.path.append(os.path.join(os.path.dirname(__file__), 'lab_value_helper'))
 
-app = Flask(__name__)
+from rate_limit import RateLimiter, TokenBucketStore, load_api_keys, load_rules
+from static_assets import StaticAssets
+
+# Every tool in the hub. A tool's blueprint is imported from `module` on the
+# first request under its url, so a slow or broken tool does not hold up startup.
+TOOLS = [
+    {
+        'name': 'Medical Report Helper',
+        'description': 'Turns medical reports into simple language anyone can understand',
+        'url': '/radiology',
+        'icon': 'medical.svg',
+        'module': 'radiologytool.app',
+    },
+    {
+        'name': 'Lab Value Helper',
+        'description': 'Clinical significance engine that reduces alert fatigue by showing what lab values actually matter',
+        'url': '/lab-value-helper',
+        'icon': 'flask',
+        'module': 'lab_value_helper.app',
+    },
+    # Add more tools here as they become available
+]
+
+# A tool that failed to import is not tried again for this many seconds
+TOOL_RETRY_SECONDS = float(os.environ.get('TOOL_RETRY_SECONDS', 60))
+
+# Compiled templates are kept on disk so a new worker does not compile them again
+JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'microapps-jinja-cache'))
+
+# Per-client token buckets, shared by every worker through a SQLite file
+rate_limiter = RateLimiter(
+    TokenBucketStore(os.environ.get('RATE_LIMIT_DB', os.path.join(os.path.dirname(__file__), 'rate_limits.db'))),
+    load_rules(os.environ.get('RATE_LIMITS')),
+    # Only trust X-Forwarded-For when the hub is deployed behind that many proxies
+    trusted_proxies=int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', 0)),
+    api_keys=load_api_keys(os.environ.get('RATE_LIMIT_API_KEYS')),
+    enabled=os.environ.get('RATE_LIMIT_ENABLED', '1').lower() not in ('0', 'false', 'no')
+)
+
+# Static files are served under content-hashed URLs and cached by browsers for a year
+static_assets = StaticAssets(
+    max_age=int(os.environ.get('STATIC_MAX_AGE', 365 * 24 * 3600)),
+    enabled=os.environ.get('STATIC_FINGERPRINTS', '1').lower() not in ('0', 'false', 'no')
+)
 
 # Add a context processor to make 'now' available in all templates
-@app.context_processor
 def inject_now():
     return {'now': datetime.now()}
 
+def configure(flask_app):
+    """Settings shared by the hub and every tool app"""
+    try:
+        os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+        flask_app.jinja_options = dict(flask_app.jinja_options, bytecode_cache=FileSystemBytecodeCache(JINJA_CACHE_DIR))
+    except OSError as e:
+        logger.warning(f"Template bytecode cache disabled: {e}")
+    flask_app.context_processor(inject_now)
+    rate_limiter.init_app(flask_app)
+
+def create_tool_app(tool):
+    """Import a tool's blueprint and mount it on an app of its own under the tool's url"""
+    module = importlib.import_module(tool['module'])
+    logger.info(f"Successfully imported {tool['module']} module")
+    blueprint = getattr(module, tool.get('blueprint', 'app'), None)
+    if blueprint is None:
+        raise AttributeError(f"{tool['module']} module does not have an '{tool.get('blueprint', 'app')}' blueprint")
+    tool_app = Flask(tool['module'], static_folder=None)
+    configure(tool_app)
+    tool_app.register_blueprint(blueprint, url_prefix=tool['url'])
+    # After registering so the blueprint's static folder is included
+    static_assets.init_app(tool_app)
+    logger.info(f"Successfully registered {blueprint.name} blueprint")
+    return tool_app
+
+class LazyToolDispatcher:
+    """
+    WSGI middleware that sends requests under a tool's url to that tool's
+    app, creating it on first use, and everything else to the hub.
+    """
+    
+    def __init__(self, hub, tools, factory=create_tool_app, retry_seconds=TOOL_RETRY_SECONDS):
+        self.hub = hub
+        self.tools = sorted(tools, key=lambda tool: len(tool['url']), reverse=True)
+        self.factory = factory
+        self.retry_seconds = retry_seconds
+        self.apps = {}
+        self.failures = {}
+        self._lock = threading.Lock()
+    
+    def tool_for(self, path):
+        for tool in self.tools:
+            if path.startswith(tool['url'] + '/'):
+                return tool
+        return None
+    
+    def load(self, tool):
+        """The tool's app, importing it if this is the first request for it"""
+        tool_app = self.apps.get(tool['url'])
+        if tool_app is None:
+            with self._lock:
+                tool_app = self.apps.get(tool['url'])
+                if tool_app is None:
+                    failure = self.failures.get(tool['url'])
+                    # Retrying right away would re-run a half-finished import on every request
+                    if failure and time.monotonic() - failure[0] < self.retry_seconds:
+                        raise failure[1]
+                    try:
+                        tool_app = self.factory(tool)
+                    except Exception as e:
+                        self.failures[tool['url']] = (time.monotonic(), e)
+                        logger.error(f"Error loading {tool['module']}: {e}")
+                        logger.error(f"Traceback: {traceback.format_exc()}")
+                        raise
+                    self.failures.pop(tool['url'], None)
+                    self.apps[tool['url']] = tool_app
+        return tool_app
+    
+    def __call__(self, environ, start_response):
+        tool = self.tool_for(environ.get('PATH_INFO', ''))
+        if tool is None:
+            return self.hub(environ, start_response)
+        try:
+            tool_app = self.load(tool)
+        except Exception:
+            response = Response(f"{tool['name']} is unavailable right now. Please try again later.",
+                                status=503, mimetype='text/plain')
+            return response(environ, start_response)
+        return tool_app(environ, start_response)
+
+app = Flask(__name__)
+configure(app)
+static_assets.init_app(app)
+tool_dispatcher = LazyToolDispatcher(app.wsgi_app, TOOLS)
+app.wsgi_app = tool_dispatcher
+
+def load_tools():
+    """Import every tool now instead of on its first request, e.g. before forking workers"""
+    for tool in TOOLS:
+        try:
+            tool_dispatcher.load(tool)
+        except Exception:
+            # Already logged; the tool answers 503 until a later attempt succeeds
+            continue
+
 @app.route('/')
 def index():
     """Main landing page that shows all available tools"""
-    tools = [
-        {
-            'name': 'Medical Report Helper',
-            'description': 'Turns medical reports into simple language anyone can understand',
-            'url': '/radiology',
-            'icon': 'medical.svg'
-        },
-        {
-            'name': 'Lab Value Helper',
-            'description': 'Clinical significance engine that reduces alert fatigue by showing what lab values actually matter',
-            'url': '/lab-value-helper',
-            'icon': 'flask'
-        }
-        # Add more tools here as they become available
-    ]
-    return render_template('index.html', tools=tools)
+    return render_template('index.html', tools=TOOLS)
 
 @app.route('/radiology')
 def radiology_redirect():
@@ -53,35 +182,8 @@ def lab_helper_redirect():
 @app.route('/debug')
 def debug():
     """Debug endpoint to verify the application is running"""
-    return "App is running. Registered blueprints: " + ", ".join([bp.name for bp in app.blueprints.values()])
-
-# Register radiologytool blueprint
-try:
-    import radiologytool.app
-    logger.info("Successfully imported radiologytool.app module")
-    
-    if not hasattr(radiologytool.app, 'app'):
-        logger.error("radiologytool.app module does not have an 'app' blueprint")
-        raise AttributeError("radiologytool.app module does not have an 'app' blueprint")
-        
-    app.register_blueprint(radiologytool.app.app, url_prefix='/radiology')
-    logger.info("Successfully registered radiologytool blueprint")
-except Exception as e:
-    logger.error(f"Error registering radiologytool blueprint: {e}")
-    import traceback
-    logger.error(f"Traceback: {traceback.format_exc()}")
-
-# Register lab value helper blueprint
-try:
-    import lab_value_helper.app
-    logger.info("Successfully imported lab_value_helper.app module")
-    
-    app.register_blueprint(lab_value_helper.app.app, url_prefix='/lab-value-helper')
-    logger.info("Successfully registered lab_value_helper blueprint")
-except Exception as e:
-    logger.error(f"Error registering lab_value_helper blueprint: {e}")
-    import traceback
-    logger.error(f"Traceback: {traceback.format_exc()}")
+    loaded = [blueprint.name for tool_app in tool_dispatcher.apps.values() for blueprint in tool_app.blueprints.values()]
+    return "App is running. Loaded blueprints: " + ", ".join(loaded)
 
 if __name__ == '__main__':
     try:
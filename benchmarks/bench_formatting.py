@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the radiology formatting pipeline
+
+Times format_translation, format_single_paragraph and identify_medical_terms
+over a synthetic corpus at several sizes and reports latency percentiles and
+throughput. With a stored baseline it exits non-zero when a median gets
+slower than the baseline allows. Runs offline; no OpenAI key is needed.
+
+    python benchmarks/bench_formatting.py                    # compare with the baseline
+    python benchmarks/bench_formatting.py --update-baseline  # record a new baseline
+
+Baselines are machine specific. To make them portable across machines of
+similar speed, every run also times a fixed pure-Python calibration loop
+and scales the stored numbers by the ratio of the two calibration times.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import build_corpus
+from radiologytool.formatting import format_single_paragraph, format_translation
+from radiologytool.utils import identify_medical_terms
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_formatting.json')
+
+FUNCTIONS = {
+    'format_translation': format_translation,
+    'format_single_paragraph': format_single_paragraph,
+    'identify_medical_terms': identify_medical_terms,
+}
+
+
+def calibrate(rounds=7):
+    """Fastest time in microseconds of a fixed string and dict workload"""
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        counts = {}
+        for i in range(20000):
+            word = f"term{i % 97}"
+            counts[word] = counts.get(word, 0) + len(word.upper())
+        samples.append((time.perf_counter() - started) * 1e6)
+    return min(samples)
+
+
+def percentile(sorted_samples, pct):
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def measure(func, texts, repeat):
+    """Time each call separately; returns per-call microseconds and total bytes processed"""
+    samples = []
+    total_bytes = 0
+    for _ in range(repeat):
+        for text in texts:
+            started = time.perf_counter()
+            func(text)
+            samples.append((time.perf_counter() - started) * 1e6)
+            total_bytes += len(text.encode('utf-8'))
+    samples.sort()
+    elapsed = sum(samples) / 1e6
+    return {
+        'calls': len(samples),
+        'p50_us': percentile(samples, 50),
+        'p90_us': percentile(samples, 90),
+        'p99_us': percentile(samples, 99),
+        'max_us': samples[-1],
+        'calls_per_s': len(samples) / elapsed if elapsed else 0,
+        'kb_per_s': total_bytes / 1024 / elapsed if elapsed else 0,
+    }
+
+
+def run(repeat, count, seed, only=None):
+    corpus = build_corpus(seed=seed, count=count)
+    results = {}
+    for name, func in FUNCTIONS.items():
+        if only and name not in only:
+            continue
+        # Warm up regex caches and lazily built tables before timing
+        for texts in corpus.values():
+            func(texts[0])
+        results[name] = {size: measure(func, texts, repeat) for size, texts in corpus.items()}
+    return results
+
+
+def print_report(results):
+    header = f"{'function':<26}{'corpus':<13}{'calls':>7}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'calls/s':>11}{'KB/s':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, sizes in results.items():
+        for size, r in sizes.items():
+            print(f"{name:<26}{size:<13}{r['calls']:>7}{r['p50_us']:>10.1f}{r['p90_us']:>10.1f}"
+                  f"{r['p99_us']:>10.1f}{r['calls_per_s']:>11.0f}{r['kb_per_s']:>10.0f}")
+
+
+def compare(results, baseline, calibration, tolerance):
+    """Returns a list of human-readable regressions against the baseline"""
+    scale = calibration / baseline['calibration_us'] if baseline.get('calibration_us') else 1.0
+    regressions = []
+    for name, sizes in baseline['results'].items():
+        for size, expected in sizes.items():
+            current = results.get(name, {}).get(size)
+            if current is None:
+                continue
+            allowed = expected['p50_us'] * scale * (1 + tolerance)
+            if current['p50_us'] > allowed:
+                regressions.append(
+                    f"{name}/{size}: p50 {current['p50_us']:.1f} us > allowed {allowed:.1f} us "
+                    f"(baseline {expected['p50_us']:.1f} us, machine scale {scale:.2f})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the radiology formatting functions')
+    parser.add_argument('--repeat', type=int, default=5, help='passes over the corpus per function')
+    parser.add_argument('--count', type=int, default=50, help='texts per corpus size')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--function', action='append', choices=sorted(FUNCTIONS),
+                        help='only benchmark this function (may be repeated)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help='store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed slowdown of a median over the baseline (0.5 = 50%%)')
+    parser.add_argument('--json', help='also write the full results to this file')
+    args = parser.parse_args()
+
+    calibration = calibrate()
+    results = run(args.repeat, args.count, args.seed, args.function)
+    # Calibrate again once the CPU is warm and keep the faster of the two
+    calibration = min(calibration, calibrate())
+    print_report(results)
+    print(f"\ncalibration loop: {calibration:.0f} us")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'calibration_us': calibration, 'results': results}, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {
+            'calibration_us': calibration,
+            'repeat': args.repeat,
+            'count': args.count,
+            'seed': args.seed,
+            'results': {name: {size: {'p50_us': round(r['p50_us'], 2), 'p90_us': round(r['p90_us'], 2)}
+                               for size, r in sizes.items()}
+                        for name, sizes in results.items()},
+        }
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, calibration, args.tolerance)
+    if regressions:
+        print("\nRegressions against the baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the hub
+
+Imports the hub (`import app`) in fresh interpreters and reports how long
+the import took. Exits non-zero when the median goes over the budget, so a
+change that makes the hub import a tool, openai or another heavy module at
+startup again is caught before it slows down cold starts. Runs offline; no
+OpenAI key is needed.
+
+    python benchmarks/bench_startup.py                  # 5 runs against the default budget
+    python benchmarks/bench_startup.py --budget-ms 300
+    python benchmarks/bench_startup.py --importtime 15  # also list the slowest modules
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BUDGET_MS = 500
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import app; "
+    "print((time.perf_counter() - started) * 1000)"
+)
+
+
+def run_once(env, importtime=False):
+    """Milliseconds to import the hub in a new interpreter, and the -X importtime report"""
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', IMPORT_SNIPPET]
+    result = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_modules(report, top):
+    """(cumulative microseconds, module) for the slowest top-level imports in an importtime report"""
+    rows = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        # Nested imports are indented under the module that imported them
+        if not name.startswith(' '):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark how long importing the hub takes')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to time')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='fail when the median import time is over this')
+    parser.add_argument('--importtime', type=int, metavar='N', default=0,
+                        help='list the N slowest top-level imports of one extra run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Keep the databases and template cache the hub creates at import out of the tree
+        env = dict(os.environ,
+                   RATE_LIMIT_DB=os.path.join(workdir, 'rate_limits.db'),
+                   JINJA_CACHE_DIR=os.path.join(workdir, 'jinja'))
+        # The first run warms the file system cache and writes .pyc files
+        run_once(env)
+        times = [run_once(env)[0] for _ in range(args.runs)]
+        report = run_once(env, importtime=True)[1] if args.importtime else ''
+
+    median = statistics.median(times)
+    print(f"hub import over {args.runs} runs: median {median:.1f} ms, "
+          f"min {min(times):.1f} ms, max {max(times):.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if report:
+        print("\nslowest top-level imports (cumulative):")
+        for cumulative, name in slowest_modules(report, args.importtime):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    if median > args.budget_ms:
+        print(f"\nHub import is over budget by {median - args.budget_ms:.1f} ms")
+        return 1
+    print("\nHub import is within budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
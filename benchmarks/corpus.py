@@ -0,0 +1,101 @@
+"""
+Synthetic radiology text for benchmarks and load tests.
+
+Everything is generated from a fixed seed so two runs measure the same
+input. Texts look like model output (lead-ins, glossary terms, vertebral
+levels, symptom sentences) rather than real reports; no patient data is
+involved.
+"""
+
+import random
+
+from radiologytool.utils import COMMON_MEDICAL_TERMS
+
+LEAD_INS = ["Sure! ", "Absolutely, ", "In simple terms, ", "The findings show that ", "", "", ""]
+LEVELS = ["L4-L5", "L5-S1", "C5-C6", "T11-T12", "L3", "L4", "C6", "T12", "S1"]
+ANATOMY = ["kidney", "spleen", "aorta", "bronchi", "gallbladder", "frontal lobe", "cerebellum"]
+FILLER = ["there is", "mild", "moderate", "small", "no evidence of", "seen at", "near the",
+          "on the left", "on the right", "which is", "stable since the prior study",
+          "measuring 1.2 cm", "unchanged", "compared with before"]
+# Short impressions like the ones users paste into the translator
+IMPRESSIONS = [
+    "No acute intracranial abnormality.",
+    "Mild degenerative disc disease at L4-L5 with small disc bulge. No spinal stenosis.",
+    "Small right pleural effusion. No pneumothorax. Heart size normal.",
+    "Stable 4 mm pulmonary nodule in the right upper lobe. No new nodules.",
+    "Bilateral renal cysts, likely benign. No hydronephrosis.",
+    "Acute fracture of the distal radius with mild dorsal angulation.",
+    "Chronic small vessel ischemic changes. No acute infarction or hemorrhage.",
+    "Hepatic steatosis. Gallbladder is unremarkable. Spleen normal in size.",
+]
+SYMPTOMS = ["This can cause back pain.", "You might feel some stiffness.",
+            "Treatment options include physical therapy.", "Risk factors include age."]
+
+
+def _sentence(rng):
+    words = []
+    for _ in range(rng.randint(6, 16)):
+        roll = rng.random()
+        if roll < 0.25:
+            words.append(rng.choice(list(COMMON_MEDICAL_TERMS)))
+        elif roll < 0.35:
+            words.append(rng.choice(LEVELS))
+        elif roll < 0.45:
+            words.append(rng.choice(ANATOMY))
+        else:
+            words.append(rng.choice(FILLER))
+    sentence = ' '.join(words)
+    return sentence[0].upper() + sentence[1:] + '.'
+
+
+def _paragraph(rng, sentences):
+    text = rng.choice(LEAD_INS) + ' '.join(_sentence(rng) for _ in range(sentences))
+    if rng.random() < 0.3:
+        text += ' ' + rng.choice(SYMPTOMS)
+    return text
+
+
+def _adversarial(rng):
+    """Deeply nested, unbalanced parentheses, bullets and asterisks"""
+    parts = []
+    for _ in range(rng.randint(20, 40)):
+        roll = rng.random()
+        if roll < 0.3:
+            parts.append('(' * rng.randint(1, 4) + rng.choice(list(COMMON_MEDICAL_TERMS)))
+        elif roll < 0.5:
+            parts.append(')' * rng.randint(1, 4))
+        elif roll < 0.65:
+            parts.append('\n- ' + rng.choice(FILLER))
+        elif roll < 0.75:
+            parts.append('\n* **' + rng.choice(ANATOMY) + '**')
+        elif roll < 0.85:
+            parts.append('• ' + rng.choice(LEVELS))
+        else:
+            parts.append(rng.choice(FILLER))
+    return ' '.join(parts)
+
+
+def translation_text(rng, sentences):
+    """A plain-language translation like the model would return"""
+    return _paragraph(rng, sentences)
+
+
+def build_corpus(seed=1234, count=50):
+    """
+    Returns a dict of corpus name -> list of texts:
+    one_line (a single short sentence), typical (a few sentences),
+    report_5kb (about 5 KB of text) and adversarial.
+    """
+    rng = random.Random(seed)
+    corpus = {
+        'one_line': [_sentence(rng) for _ in range(count)],
+        'typical': [_paragraph(rng, rng.randint(3, 6)) for _ in range(count)],
+        'report_5kb': [],
+        'adversarial': [_adversarial(rng) for _ in range(count)],
+    }
+    for _ in range(max(count // 5, 1)):
+        text = ''
+        while len(text) < 5000:
+            text += _paragraph(rng, 5) + '\n'
+        corpus['report_5kb'].append(text)
+    return corpus
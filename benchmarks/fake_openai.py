@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions API
+
+Answers POST /v1/chat/completions (plain and stream=True) with synthetic
+plain-language translations, after a delay drawn from a configurable
+latency distribution, and fails a configurable share of requests. Point the
+hub at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 and any
+OPENAI_API_KEY.
+
+    python benchmarks/fake_openai.py --port 8089 --latency lognormal --latency-median 1.5 \\
+        --error-rate 0.02 --rate-limit-rate 0.01 --sentences 3-8
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import translation_text
+
+LATENCY_DISTRIBUTIONS = ('constant', 'uniform', 'exponential', 'lognormal')
+
+
+class FakeOpenAIProfile:
+    """How the fake API behaves: latency, failure rates and response size"""
+
+    def __init__(self, latency='lognormal', latency_median=1.0, latency_spread=0.5,
+                 error_rate=0.0, rate_limit_rate=0.0, sentences=(3, 8), seed=None):
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency}")
+        self.latency = latency
+        self.latency_median = latency_median
+        self.latency_spread = latency_spread
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.sentences = sentences
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def draw(self):
+        """Returns (delay in seconds, status code, sentence count, content seed) for one request"""
+        with self._lock:
+            self.requests += 1
+            rng = self._rng
+            if self.latency == 'constant':
+                delay = self.latency_median
+            elif self.latency == 'uniform':
+                delay = rng.uniform(max(self.latency_median - self.latency_spread, 0),
+                                    self.latency_median + self.latency_spread)
+            elif self.latency == 'exponential':
+                delay = rng.expovariate(math.log(2) / self.latency_median) if self.latency_median else 0
+            else:
+                delay = rng.lognormvariate(math.log(self.latency_median), self.latency_spread) \
+                    if self.latency_median else 0
+
+            roll = rng.random()
+            if roll < self.error_rate:
+                status = 500
+            elif roll < self.error_rate + self.rate_limit_rate:
+                status = 429
+            else:
+                status = 200
+            return delay, status, rng.randint(*self.sentences), rng.random()
+
+
+def completion_body(model, content, prompt_chars):
+    return {
+        'id': f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': content},
+            'finish_reason': 'stop',
+        }],
+        'usage': usage_body(content, prompt_chars),
+    }
+
+
+def usage_body(content, prompt_chars):
+    completion_tokens = max(len(content) // 4, 1)
+    prompt_tokens = max(prompt_chars // 4, 1)
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+    }
+
+
+def chunk_body(completion_id, model, delta, finish_reason=None):
+    return {
+        'id': completion_id,
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+    }
+
+
+def make_handler(profile):
+    class FakeOpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            if status == 429:
+                self.send_header('Retry-After', '1')
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path.rstrip('/') in ('/health', '/v1/models'):
+                self._send_json(200, {'status': 'ok', 'requests': profile.requests})
+            else:
+                self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                request = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._send_json(400, {'error': {'message': 'Invalid JSON', 'type': 'invalid_request_error'}})
+                return
+            if self.path.rstrip('/') != '/v1/chat/completions':
+                self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+                return
+
+            delay, status, sentences, seed = profile.draw()
+            model = request.get('model', 'gpt-3.5-turbo')
+            if status != 200:
+                time.sleep(delay)
+                kind = 'rate_limit_exceeded' if status == 429 else 'server_error'
+                self._send_json(status, {'error': {'message': f"Simulated {kind}", 'type': kind}})
+                return
+
+            content = translation_text(random.Random(seed), sentences)
+            prompt_chars = sum(len(m.get('content') or '') for m in request.get('messages', []))
+            if not request.get('stream'):
+                time.sleep(delay)
+                self._send_json(200, completion_body(model, content, prompt_chars))
+                return
+
+            # Spread the delay over the stream: a quarter before the first token,
+            # the rest between chunks, roughly like a real completion
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            words = content.split(' ')
+            time.sleep(delay / 4)
+            first = True
+            for i, word in enumerate(words):
+                delta = {'content': word if i == 0 else ' ' + word}
+                if first:
+                    delta['role'] = 'assistant'
+                    first = False
+                self.wfile.write(f"data: {json.dumps(chunk_body(completion_id, model, delta))}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(delay * 3 / 4 / len(words))
+            self.wfile.write(f"data: {json.dumps(chunk_body(completion_id, model, {}, 'stop'))}\n\n".encode('utf-8'))
+            if (request.get('stream_options') or {}).get('include_usage'):
+                usage_chunk = dict(chunk_body(completion_id, model, {}), choices=[],
+                                   usage=usage_body(content, prompt_chars))
+                self.wfile.write(f"data: {json.dumps(usage_chunk)}\n\n".encode('utf-8'))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return FakeOpenAIHandler
+
+
+def make_server(profile, host='127.0.0.1', port=8089):
+    """Create (but do not start) a threaded HTTP server for the profile"""
+    server = ThreadingHTTPServer((host, port), make_handler(profile))
+    server.daemon_threads = True
+    return server
+
+
+def parse_range(value):
+    low, _, high = value.partition('-')
+    return int(low), int(high or low)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the OpenAI chat completions API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--latency-median', type=float, default=1.0, help='median delay in seconds')
+    parser.add_argument('--latency-spread', type=float, default=0.5,
+                        help='sigma for lognormal, +/- seconds for uniform')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share of requests answered with 429')
+    parser.add_argument('--sentences', type=parse_range, default=(3, 8),
+                        help='response size as a sentence count or range, e.g. 3-8')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    profile = FakeOpenAIProfile(args.latency, args.latency_median, args.latency_spread,
+                                args.error_rate, args.rate_limit_rate, args.sentences, args.seed)
+    server = make_server(profile, args.host, args.port)
+    print(f"Fake OpenAI API listening on http://{args.host}:{args.port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
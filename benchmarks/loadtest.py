@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Load test for the MicroApps Hub
+
+Sends a mix of radiology translate/feedback and lab evaluate/bulk_evaluate
+requests at a target rate and reports throughput, latency percentiles and
+error rates per endpoint. Requests are scheduled open-loop: latency is
+measured from the moment a request was due, so a slow server shows up as
+latency rather than as a lower send rate.
+
+Run against a hub that is already up (pointed at the fake OpenAI server):
+
+    python benchmarks/loadtest.py --base-url http://127.0.0.1:5000 --scenario mixed
+
+or let the script start the fake API and the hub itself, with throwaway
+cache, job and feedback files:
+
+    python benchmarks/loadtest.py --start --scenario mixed --rps 30 --duration 60
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.corpus import IMPRESSIONS, translation_text
+
+# Share of requests per endpoint, plus default rate and duration
+SCENARIOS = {
+    'mixed': {
+        'weights': {'translate': 0.35, 'feedback': 0.15, 'evaluate': 0.35, 'bulk_evaluate': 0.15},
+        'rps': 20, 'duration': 60,
+    },
+    'translate_heavy': {
+        'weights': {'translate': 0.8, 'feedback': 0.2},
+        'rps': 10, 'duration': 60,
+    },
+    'lab_only': {
+        'weights': {'evaluate': 0.7, 'bulk_evaluate': 0.3},
+        'rps': 100, 'duration': 30,
+    },
+}
+
+LAB_VALUES = {
+    'hemoglobin': (6.0, 18.0),
+    'potassium': (2.5, 6.8),
+    'creatinine': (0.4, 4.0),
+    'glucose': (40, 450),
+    'tsh': (0.01, 12.0),
+}
+
+
+class RequestFactory:
+    """Builds the (method, path, kwargs) for one request to each endpoint"""
+
+    def __init__(self, seed=None, unique_ratio=0.2):
+        self.rng = random.Random(seed)
+        self.unique_ratio = unique_ratio
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def _impression(self):
+        self._counter += 1
+        impression = self.rng.choice(IMPRESSIONS)
+        # A share of impressions is made unique so they miss the translation cache
+        if self.rng.random() < self.unique_ratio:
+            impression += f" Comparison study {self._counter}."
+        return impression
+
+    def _lab(self):
+        test_name = self.rng.choice(list(LAB_VALUES))
+        low, high = LAB_VALUES[test_name]
+        return {'test_name': test_name, 'value': str(round(self.rng.uniform(low, high), 2))}
+
+    def _context(self):
+        return {'age': self.rng.randint(18, 90), 'sex': self.rng.choice(['male', 'female']),
+                'fasting': self.rng.random() < 0.5}
+
+    def build(self, endpoint):
+        with self._lock:
+            if endpoint == 'translate':
+                return 'POST', '/radiology/translate', {'data': {'impression': self._impression()}}
+            if endpoint == 'feedback':
+                impression = self._impression()
+                return 'POST', '/radiology/feedback', {'json': {
+                    'translation_id': f"load_{self._counter}",
+                    'original': impression,
+                    'translation': translation_text(self.rng, 3),
+                    'rating': self.rng.choice(['thumbs_up', 'thumbs_down']),
+                    'comment': 'load test',
+                }}
+            if endpoint == 'evaluate':
+                body = self._lab()
+                body['patient_context'] = self._context()
+                return 'POST', '/lab-value-helper/evaluate', {'json': body}
+            if endpoint == 'bulk_evaluate':
+                return 'POST', '/lab-value-helper/bulk_evaluate', {'json': {
+                    'lab_values': [self._lab() for _ in range(self.rng.randint(3, 20))],
+                    'patient_context': self._context(),
+                }}
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+class Recorder:
+    """Collects per-endpoint latencies and outcomes from worker threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, latency, status):
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            self.statuses[endpoint][str(status)] += 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[endpoint] += 1
+
+    def summary(self, elapsed):
+        def pct(samples, p):
+            return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+        report = {}
+        with self._lock:
+            for endpoint, samples in sorted(self.latencies.items()):
+                samples = sorted(samples)
+                count = len(samples)
+                errors = self.errors[endpoint]
+                report[endpoint] = {
+                    'requests': count,
+                    'errors': errors,
+                    'error_rate': errors / count if count else 0,
+                    'throughput_rps': (count - errors) / elapsed if elapsed else 0,
+                    'p50_ms': pct(samples, 50) * 1000,
+                    'p90_ms': pct(samples, 90) * 1000,
+                    'p99_ms': pct(samples, 99) * 1000,
+                    'max_ms': samples[-1] * 1000,
+                    'statuses': dict(self.statuses[endpoint]),
+                }
+        return report
+
+
+def run_load(base_url, weights, rps, duration, concurrency, timeout, seed=None, unique_ratio=0.2,
+             poisson=True):
+    """Drive the hub for duration seconds and return (report, elapsed seconds)"""
+    rng = random.Random(seed)
+    factory = RequestFactory(seed, unique_ratio)
+    recorder = Recorder()
+    endpoints = list(weights)
+    cumulative = [sum(list(weights.values())[:i + 1]) for i in range(len(endpoints))]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    with httpx.Client(base_url=base_url, timeout=timeout, limits=limits) as client, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load') as pool:
+
+        def send(endpoint, due):
+            method, path, kwargs = factory.build(endpoint)
+            try:
+                status = client.request(method, path, **kwargs).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            recorder.record(endpoint, time.monotonic() - due, status)
+
+        started = time.monotonic()
+        due = started
+        while due < started + duration:
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            roll = rng.random() * cumulative[-1]
+            endpoint = next(e for e, c in zip(endpoints, cumulative) if roll <= c)
+            pool.submit(send, endpoint, due)
+            due += rng.expovariate(rps) if poisson else 1 / rps
+        pool.shutdown(wait=True)
+        elapsed = time.monotonic() - started
+    return recorder.summary(elapsed), elapsed
+
+
+def print_report(report, elapsed):
+    header = (f"{'endpoint':<16}{'requests':>9}{'errors':>8}{'err %':>8}{'ok/s':>8}"
+              f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    print(header)
+    print('-' * len(header))
+    for endpoint, r in report.items():
+        print(f"{endpoint:<16}{r['requests']:>9}{r['errors']:>8}{r['error_rate'] * 100:>8.1f}"
+              f"{r['throughput_rps']:>8.1f}{r['p50_ms']:>10.0f}{r['p90_ms']:>10.0f}"
+              f"{r['p99_ms']:>10.0f}{r['max_ms']:>10.0f}")
+    print(f"\n{sum(r['requests'] for r in report.values())} requests in {elapsed:.1f}s")
+    for endpoint, r in report.items():
+        if r['errors']:
+            print(f"  {endpoint} statuses: {r['statuses']}")
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_stack(args, workdir):
+    """Start the fake OpenAI server and the hub as subprocesses"""
+    fake_cmd = [sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_openai.py'),
+                '--port', str(args.fake_port), '--latency', args.latency,
+                '--latency-median', str(args.latency_median), '--latency-spread', str(args.latency_spread),
+                '--error-rate', str(args.error_rate), '--rate-limit-rate', str(args.rate_limit_rate),
+                '--sentences', args.sentences]
+    env = dict(os.environ,
+               OPENAI_API_KEY='load-test',
+               OPENAI_BASE_URL=f"http://127.0.0.1:{args.fake_port}/v1",
+               TRANSLATION_CACHE_DB=os.path.join(workdir, 'translation_cache.db'),
+               TRANSLATION_JOBS_DB=os.path.join(workdir, 'translation_jobs.db'),
+               FEEDBACK_FILE=os.path.join(workdir, 'feedback_data.json'),
+               FEEDBACK_DB=os.path.join(workdir, 'feedback.db'),
+               LLM_METRICS_DB=os.path.join(workdir, 'llm_metrics.db'),
+               TRANSLATION_LOG_FILE=os.path.join(workdir, 'translations_log.jsonl'),
+               ACTIVITY_LOG_FILE=os.path.join(workdir, 'translations_log.txt'),
+               RATE_LIMIT_DB=os.path.join(workdir, 'rate_limits.db'),
+               # One load generator is one client; per-client limits would cap the offered load
+               RATE_LIMIT_ENABLED='0')
+    hub_cmd = args.hub_cmd.split() if args.hub_cmd else [
+        sys.executable, '-m', 'flask', '--app', 'app', 'run',
+        '--port', str(args.hub_port), '--with-threads', '--no-reload', '--no-debugger']
+    processes = [
+        subprocess.Popen(fake_cmd, cwd=ROOT, stdout=subprocess.DEVNULL),
+        subprocess.Popen(hub_cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+    ]
+    try:
+        wait_until_up(f"http://127.0.0.1:{args.fake_port}/health")
+        wait_until_up(f"{args.base_url}/debug")
+    except Exception:
+        stop_stack(processes)
+        raise
+    return processes
+
+
+def stop_stack(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def parse_weights(value):
+    weights = {}
+    for part in value.split(','):
+        endpoint, _, weight = part.partition('=')
+        weights[endpoint.strip()] = float(weight)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the MicroApps Hub')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--weights', type=parse_weights,
+                        help='override the scenario mix, e.g. translate=0.5,evaluate=0.5')
+    parser.add_argument('--rps', type=float, help='target requests per second')
+    parser.add_argument('--duration', type=float, help='seconds of load')
+    parser.add_argument('--concurrency', type=int, default=64, help='maximum requests in flight')
+    parser.add_argument('--timeout', type=float, default=120, help='client timeout per request')
+    parser.add_argument('--unique-ratio', type=float, default=0.2,
+                        help='share of impressions made unique so they miss the cache')
+    parser.add_argument('--fixed-rate', action='store_true', help='evenly spaced instead of Poisson arrivals')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--base-url', default=None, help='hub URL (default http://127.0.0.1:<hub-port>)')
+    parser.add_argument('--json', help='also write the report to this file')
+
+    stack = parser.add_argument_group('--start: run the fake OpenAI API and the hub locally')
+    stack.add_argument('--start', action='store_true')
+    stack.add_argument('--hub-port', type=int, default=5055)
+    stack.add_argument('--hub-cmd', help='command that serves the hub instead of flask run, e.g. gunicorn ...')
+    stack.add_argument('--fake-port', type=int, default=8089)
+    stack.add_argument('--latency', default='lognormal')
+    stack.add_argument('--latency-median', type=float, default=1.0)
+    stack.add_argument('--latency-spread', type=float, default=0.5)
+    stack.add_argument('--error-rate', type=float, default=0.0)
+    stack.add_argument('--rate-limit-rate', type=float, default=0.0)
+    stack.add_argument('--sentences', default='3-8')
+    args = parser.parse_args()
+
+    scenario = SCENARIOS[args.scenario]
+    weights = args.weights or scenario['weights']
+    rps = args.rps or scenario['rps']
+    duration = args.duration or scenario['duration']
+    args.base_url = (args.base_url or f"http://127.0.0.1:{args.hub_port}").rstrip('/')
+
+    processes = []
+    with tempfile.TemporaryDirectory(prefix='hub-load-') as workdir:
+        if args.start:
+            processes = start_stack(args, workdir)
+        try:
+            print(f"Scenario {args.scenario}: {rps:g} req/s for {duration:g}s against {args.base_url}\n")
+            report, elapsed = run_load(args.base_url, weights, rps, duration, args.concurrency,
+                                       args.timeout, args.seed, args.unique_ratio, not args.fixed_rate)
+        finally:
+            stop_stack(processes)
+
+    print_report(report, elapsed)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'scenario': args.scenario, 'rps': rps, 'duration': duration,
+                       'elapsed': elapsed, 'endpoints': report}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Gunicorn settings for serving the hub in production
+
+    gunicorn -c gunicorn.conf.py production:app
+
+The app and every tool are imported once in the master (preload_app) and
+the workers are forked from it, so the lab engine, the glossary and the
+compiled patterns are built once and their memory pages are shared. Objects
+that exist at fork time are moved out of the garbage collector's reach with
+gc.freeze(); otherwise the first collection in each worker would write to
+every one of them and copy the shared pages. Workers are replaced after
+max_requests so slow growth in one never builds up.
+
+Thread pools, log listeners and OpenAI clients are created lazily in each
+worker (they check the pid), so nothing started in the master leaks into a
+worker. Every setting can be overridden with the environment variables below.
+"""
+
+import gc
+import os
+import sys
+
+
+def _cpu_count():
+    # The CPUs this process may run on, which is less than the host's in a container
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+
+# Requests mostly wait on the OpenAI API, so each worker serves several at once on
+# threads. gevent workers would need the app imported after monkey patching,
+# which rules out preloading it.
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', min(2 * _cpu_count() + 1, 8)))
+# Matches LLM_MAX_IN_FLIGHT, the OpenAI calls each worker lets through at a time
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+preload_app = True
+
+# Recycle workers after this many requests (0 never does); the jitter keeps them from all restarting
+# together. A retiring gthread worker closes connections it accepted but has not read yet, so a
+# client can rarely see an empty reply at the moment a worker is replaced.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+# Time a recycled or stopped worker gets to finish its requests and background jobs
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def when_ready(server):
+    """Import every tool in the master, then freeze what it built before the workers are forked"""
+    hub = sys.modules.get('app')
+    if hub is not None:
+        hub.load_tools()
+    radiology = sys.modules.get('radiologytool.app')
+    if radiology is not None:
+        # Write out and stop the master's log listener so no thread is running at fork time
+        radiology.log_queue_handler.stop()
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Preloaded tools; {gc.get_freeze_count()} objects frozen before forking "
+                    f"{server.num_workers} {worker_class} workers x {threads} threads")
+
+
+def worker_exit(server, worker):
+    """Let translation jobs already running in a retiring worker finish"""
+    radiology = sys.modules.get('radiologytool.app')
+    if radiology is not None:
+        radiology.job_queue.shutdown(wait=True)
@@ -18,13 +18,20 @@ app = Blueprint('lab_value_helper', __name__,
 # Add CORS and error handling middleware
 @app.after_request
 def after_request(response):
-    """Add CORS headers and ensure proper connection handling"""
+    """Add CORS headers and keep API responses out of caches"""
     response.headers.add('Access-Control-Allow-Origin', '*')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Cache-Control')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-    response.headers.add('Cache-Control', 'no-cache, no-store, must-revalidate')
-    response.headers.add('Pragma', 'no-cache')
-    response.headers.add('Expires', '0')
+    if (request.endpoint or '').endswith('.static'):
+        # Static files set their own caching
+        return response
+    if response.mimetype == 'text/html':
+        # The page may be cached but is checked on every load, so it picks up new asset URLs
+        response.headers['Cache-Control'] = 'no-cache'
+    else:
+        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '0'
     return response
 
 @app.errorhandler(Exception)
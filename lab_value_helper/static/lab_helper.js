@@ -0,0 +1,961 @@
+let allResults = [];
+let showingActionableOnly = false;
+let isEvaluating = false;
+let currentRequest = null; // Track current request for cleanup
+let debounceTimer = null; // Debounce timer for rapid clicks
+let requestQueue = []; // Queue for managing multiple requests
+
+// Helper functions for safe DOM manipulation
+function safeGetElement(id) {
+    const element = document.getElementById(id);
+    if (!element) {
+        console.warn(`Element with ID '${id}' not found`);
+    }
+    return element;
+}
+
+function safeAddClass(elementId, className) {
+    const element = safeGetElement(elementId);
+    if (element && element.classList) {
+        element.classList.add(className);
+        return true;
+    }
+    return false;
+}
+
+function safeRemoveClass(elementId, className) {
+    const element = safeGetElement(elementId);
+    if (element && element.classList) {
+        element.classList.remove(className);
+        return true;
+    }
+    return false;
+}
+
+function safeToggleClass(elementId, className, force) {
+    const element = safeGetElement(elementId);
+    if (element && element.classList) {
+        if (force !== undefined) {
+            element.classList.toggle(className, force);
+        } else {
+            element.classList.toggle(className);
+        }
+        return true;
+    }
+    return false;
+}
+
+function safeClassListOperation(elementId, operation, ...args) {
+    const element = safeGetElement(elementId);
+    if (element && element.classList && typeof element.classList[operation] === 'function') {
+        try {
+            element.classList[operation](...args);
+            return true;
+        } catch (error) {
+            console.error(`Error performing classList.${operation} on element ${elementId}:`, error);
+        }
+    }
+    return false;
+}
+
+// Initialize
+document.addEventListener('DOMContentLoaded', function() {
+    setupEventListeners();
+    console.log('Lab Value Helper initialized - Network debugging enabled');
+});
+
+function setupEventListeners() {
+    const evaluateSingleBtn = document.getElementById('evaluate-single');
+    const evaluateBulkBtn = document.getElementById('evaluate-bulk');
+    const clearResultsBtn = document.getElementById('clear-results');
+    const showAllBtn = document.getElementById('show-all-btn');
+    const actionableOnlyBtn = document.getElementById('actionable-only-btn');
+    const testValueInput = document.getElementById('test-value');
+    const testNameInput = document.getElementById('test-name');
+    const resultsContainer = document.getElementById('results-container');
+
+    if (evaluateSingleBtn) {
+        evaluateSingleBtn.addEventListener('click', handleSingleEvaluation);
+    }
+    if (evaluateBulkBtn) {
+        evaluateBulkBtn.addEventListener('click', handleBulkEvaluation);
+    }
+    if (clearResultsBtn) {
+        clearResultsBtn.addEventListener('click', handleClearAllResults);
+    }
+    if (showAllBtn) {
+        showAllBtn.addEventListener('click', () => toggleView(false));
+    }
+    if (actionableOnlyBtn) {
+        actionableOnlyBtn.addEventListener('click', () => toggleView(true));
+    }
+
+    // Event delegation for remove buttons
+    if (resultsContainer) {
+        resultsContainer.addEventListener('click', function(e) {
+            const removeBtn = e.target.closest('.remove-result-btn');
+            if (removeBtn) {
+                e.preventDefault();
+                e.stopPropagation();
+                const timestamp = removeBtn.getAttribute('data-timestamp');
+                if (timestamp) {
+                    removeResult(timestamp);
+                }
+            }
+        });
+    }
+
+    // Enter key support with debouncing
+    if (testValueInput) {
+        testValueInput.addEventListener('keypress', function(e) {
+            if (e.key === 'Enter' && !isEvaluating) {
+                e.preventDefault();
+                handleSingleEvaluation();
+            }
+        });
+    }
+
+    // Form validation
+    if (testNameInput) {
+        testNameInput.addEventListener('input', validateForm);
+    }
+    if (testValueInput) {
+        testValueInput.addEventListener('input', validateForm);
+    }
+}
+
+// Debounced evaluation handlers
+function handleSingleEvaluation() {
+    console.log('Single evaluation requested, isEvaluating:', isEvaluating);
+
+    if (isEvaluating) {
+        console.log('Request blocked - already evaluating');
+        return;
+    }
+
+    // Clear any existing debounce timer
+    if (debounceTimer) {
+        clearTimeout(debounceTimer);
+    }
+
+    // Debounce rapid clicks (300ms delay)
+    debounceTimer = setTimeout(() => {
+        evaluateSingleLab();
+    }, 300);
+}
+
+function handleBulkEvaluation() {
+    console.log('Bulk evaluation requested, isEvaluating:', isEvaluating);
+
+    if (isEvaluating) {
+        console.log('Request blocked - already evaluating');
+        return;
+    }
+
+    // Clear any existing debounce timer
+    if (debounceTimer) {
+        clearTimeout(debounceTimer);
+    }
+
+    // Debounce rapid clicks (300ms delay)
+    debounceTimer = setTimeout(() => {
+        evaluateBulkLabs();
+    }, 300);
+}
+
+function validateForm() {
+    const testNameEl = document.getElementById('test-name');
+    const testValueEl = document.getElementById('test-value');
+    const evaluateBtn = document.getElementById('evaluate-single');
+
+    if (!testNameEl || !testValueEl || !evaluateBtn) {
+        console.warn('Form validation skipped - missing elements');
+        return;
+    }
+
+    const testName = testNameEl.value.trim();
+    const testValue = testValueEl.value.trim();
+
+    evaluateBtn.disabled = !testName || !testValue || isEvaluating;
+}
+
+function getPatientContext() {
+    const ageEl = document.getElementById('patient-age');
+    const sexEl = document.getElementById('patient-sex');
+    const fastingEl = document.getElementById('fasting-status');
+
+    return {
+        age: ageEl ? parseInt(ageEl.value) || 30 : 30,
+        sex: sexEl ? sexEl.value : '',
+        fasting: fastingEl ? fastingEl.checked : false
+    };
+}
+
+async function evaluateSingleLab() {
+    const testNameEl = document.getElementById('test-name');
+    const testValueEl = document.getElementById('test-value');
+
+    if (!testNameEl || !testValueEl) {
+        showError('Form elements not found');
+        return;
+    }
+
+    const testName = testNameEl.value.trim();
+    const testValue = testValueEl.value.trim();
+
+    if (!testName || !testValue) {
+        showError('Please enter both test name and value');
+        return;
+    }
+
+    if (isEvaluating) {
+        console.log('Evaluation already in progress, skipping');
+        return;
+    }
+
+    console.log('Starting single lab evaluation:', { testName, testValue });
+    setEvaluatingState(true);
+
+    // Cancel any pending request
+    if (currentRequest) {
+        console.log('Cancelling previous request');
+        currentRequest.abort();
+        currentRequest = null;
+    }
+
+    // Create AbortController for request cancellation
+    const controller = new AbortController();
+    currentRequest = controller;
+
+    try {
+        console.log('Making API request to /lab-value-helper/evaluate');
+
+        const response = await fetch('/lab-value-helper/evaluate', {
+            method: 'POST',
+            headers: { 
+                'Content-Type': 'application/json',
+                'Cache-Control': 'no-cache'
+            },
+            body: JSON.stringify({
+                test_name: testName,
+                value: parseFloat(testValue),
+                patient_context: getPatientContext()
+            }),
+            signal: controller.signal,
+            timeout: 10000 // 10 second timeout
+        });
+
+        console.log('API response received:', response.status, response.statusText);
+
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+
+        const result = await response.json();
+        console.log('API result parsed:', result);
+
+        if (result.error) {
+            showError(result.error);
+        } else {
+            addResult(result);
+            clearSingleInputs();
+            console.log('Single lab evaluation completed successfully');
+        }
+    } catch (error) {
+        console.error('Single lab evaluation error:', error);
+
+        if (error.name === 'AbortError') {
+            console.log('Request was cancelled');
+            return;
+        }
+
+        // Enhanced error handling with retry logic
+        handleNetworkError(error, () => evaluateSingleLab());
+    } finally {
+        currentRequest = null;
+        setEvaluatingState(false);
+        console.log('Single lab evaluation cleanup completed');
+    }
+}
+
+async function evaluateBulkLabs() {
+    const bulkInputEl = document.getElementById('bulk-input');
+
+    if (!bulkInputEl) {
+        showError('Bulk input element not found');
+        return;
+    }
+
+    const bulkText = bulkInputEl.value.trim();
+    if (!bulkText) {
+        showError('Please enter lab values');
+        return;
+    }
+
+    if (isEvaluating) {
+        console.log('Bulk evaluation already in progress, skipping');
+        return;
+    }
+
+    // Parse bulk input
+    const labValues = parseBulkInput(bulkText);
+    if (labValues.length === 0) {
+        showError('No valid lab values found in input');
+        return;
+    }
+
+    console.log('Starting bulk lab evaluation:', labValues.length, 'tests');
+    setEvaluatingState(true, true);
+
+    // Cancel any pending request
+    if (currentRequest) {
+        console.log('Cancelling previous request');
+        currentRequest.abort();
+        currentRequest = null;
+    }
+
+    // Create AbortController for request cancellation
+    const controller = new AbortController();
+    currentRequest = controller;
+
+    try {
+        console.log('Making API request to /lab-value-helper/bulk_evaluate');
+
+        const response = await fetch('/lab-value-helper/bulk_evaluate', {
+            method: 'POST',
+            headers: { 
+                'Content-Type': 'application/json',
+                'Cache-Control': 'no-cache'
+            },
+            body: JSON.stringify({
+                lab_values: labValues,
+                patient_context: getPatientContext()
+            }),
+            signal: controller.signal,
+            timeout: 15000 // 15 second timeout for bulk operations
+        });
+
+        console.log('Bulk API response received:', response.status, response.statusText);
+
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+
+        const data = await response.json();
+        console.log('Bulk API result parsed:', data.results.length, 'results');
+
+        // Add all results
+        data.results.forEach((result, index) => {
+            if (!result.error) {
+                addResult(result);
+            } else {
+                console.warn(`Result ${index} had error:`, result.error);
+            }
+        });
+
+        // Update summary
+        updateSummary(data.summary);
+        bulkInputEl.value = '';
+        console.log('Bulk lab evaluation completed successfully');
+
+    } catch (error) {
+        console.error('Bulk lab evaluation error:', error);
+
+        if (error.name === 'AbortError') {
+            console.log('Bulk request was cancelled');
+            return;
+        }
+
+        // Enhanced error handling with retry logic
+        handleNetworkError(error, () => evaluateBulkLabs());
+    } finally {
+        currentRequest = null;
+        setEvaluatingState(false, true);
+        console.log('Bulk lab evaluation cleanup completed');
+    }
+}
+
+function handleNetworkError(error, retryFunction) {
+    console.error('Network error details:', {
+        name: error.name,
+        message: error.message,
+        stack: error.stack
+    });
+
+    let errorMessage = 'Network error occurred. ';
+    let showRetry = false;
+
+    if (error.name === 'TypeError' && error.message.includes('fetch')) {
+        errorMessage += 'Unable to connect to server. Check your connection.';
+        showRetry = true;
+    } else if (error.message.includes('timeout')) {
+        errorMessage += 'Request timed out. Server may be busy.';
+        showRetry = true;
+    } else if (error.message.includes('HTTP 5')) {
+        errorMessage += 'Server error. Please try again.';
+        showRetry = true;
+    } else {
+        errorMessage += error.message || 'Please try again.';
+        showRetry = true;
+    }
+
+    showErrorWithRetry(errorMessage, showRetry ? retryFunction : null);
+}
+
+function setEvaluatingState(evaluating, isBulk = false) {
+    console.log('Setting evaluating state:', evaluating, 'isBulk:', isBulk);
+    isEvaluating = evaluating;
+
+    const singleBtn = document.getElementById('evaluate-single');
+    const bulkBtn = document.getElementById('evaluate-bulk');
+    const singleText = document.getElementById('evaluate-btn-text');
+    const bulkText = document.getElementById('bulk-btn-text');
+
+    if (evaluating) {
+        // Disable all buttons during evaluation
+        if (singleBtn) singleBtn.disabled = true;
+        if (bulkBtn) bulkBtn.disabled = true;
+        showLoading(true);
+
+        if (isBulk) {
+            if (bulkText) bulkText.innerHTML = '<i class="fas fa-spinner fa-spin mr-2"></i>Analyzing...';
+        } else {
+            if (singleText) singleText.innerHTML = '<i class="fas fa-spinner fa-spin mr-2"></i>Analyzing...';
+        }
+    } else {
+        showLoading(false);
+        if (singleText) singleText.innerHTML = 'Evaluate Lab Value';
+        if (bulkText) bulkText.innerHTML = 'Evaluate Panel';
+
+        // Re-enable buttons based on form state
+        validateForm(); // This will properly enable/disable single button
+        if (bulkBtn) bulkBtn.disabled = false;
+    }
+}
+
+function parseBulkInput(text) {
+    const lines = text.split('\n');
+    const labValues = [];
+
+    for (const line of lines) {
+        const match = line.match(/^(.+?)[:=]\s*(.+)$/);
+        if (match) {
+            const testName = match[1].trim();
+            const value = parseFloat(match[2].trim());
+            if (!isNaN(value)) {
+                labValues.push({ test_name: testName, value: value });
+            }
+        }
+    }
+
+    return labValues;
+}
+
+function addResult(result) {
+    allResults.push(result);
+    renderResults();
+    updateSummaryFromResults();
+}
+
+function renderResults() {
+    const container = document.getElementById('results-container');
+    const welcome = document.getElementById('welcome-message');
+
+    if (!container) {
+        console.error('Results container not found');
+        return;
+    }
+
+    if (allResults.length === 0) {
+        if (welcome && welcome.classList) {
+            welcome.classList.remove('hidden');
+        }
+        return;
+    }
+
+    if (welcome && welcome.classList) {
+        welcome.classList.add('hidden');
+    }
+
+    // Sort results by significance level (Critical first)
+    const sortedResults = [...allResults].sort((a, b) => (b.level || 1) - (a.level || 1));
+
+    const resultsToShow = showingActionableOnly 
+        ? sortedResults.filter(r => r.level >= 3)
+        : sortedResults;
+
+    container.innerHTML = resultsToShow.map(result => createResultCard(result)).join('');
+}
+
+function createResultCard(result) {
+    const significance = result.significance || 'normal';
+    const icon = getSignificanceIcon(significance);
+    const rangeIndicator = createRangeIndicator(result);
+
+    // Ensure timestamp exists for removal
+    if (!result.timestamp) {
+        console.warn('Result missing timestamp, generating one:', result);
+        result.timestamp = new Date().toISOString() + '_' + Math.random().toString(36).substr(2, 9);
+    }
+
+    return `
+        <div class="significance-${significance} ${result.bg || ''} p-4 rounded-lg" data-timestamp="${result.timestamp}">
+            <div class="flex items-start justify-between">
+                <div class="flex-1">
+                    <div class="flex items-center mb-2">
+                        ${icon}
+                        <h3 class="font-semibold text-gray-900 ml-2">${result.test_name}</h3>
+                        <span class="ml-2 px-2 py-1 text-xs font-medium rounded ${result.color || 'text-gray-600'} ${result.bg || ''}">
+                            ${result.label || 'Normal'}
+                        </span>
+                    </div>
+                    <div class="text-lg font-mono mb-2">
+                        <span class="font-bold">${result.value} ${result.unit}</span>
+                    </div>
+                    <div class="text-xs text-gray-600 mb-3">
+                        <strong>Reference:</strong> ${result.reference_range || 'See clinical guidelines'}
+                    </div>
+                    ${rangeIndicator}
+                    <p class="text-sm text-gray-700 mb-2 mt-3">
+                        <strong>Clinical Pearl:</strong> ${result.clinical_pearl}
+                    </p>
+                    <p class="text-sm text-gray-600">
+                        <strong>Action:</strong> ${result.action}
+                    </p>
+                </div>
+                <button 
+                    onclick="removeResult('${result.timestamp}')" 
+                    class="remove-result-btn text-gray-400 hover:text-gray-600 ml-4 p-2 rounded hover:bg-gray-100 transition-colors touch-target"
+                    data-timestamp="${result.timestamp}"
+                    title="Remove this result"
+                    aria-label="Remove ${result.test_name} result"
+                >
+                    <i class="fas fa-times"></i>
+                </button>
+            </div>
+        </div>
+    `;
+}
+
+function getSignificanceIcon(significance) {
+    const iconMap = {
+        'normal': '<i class="fas fa-check-circle icon-normal text-xl"></i>',
+        'likely_insignificant': '<i class="fas fa-minus-circle icon-likely-insignificant text-xl"></i>',
+        'possibly_significant': '<i class="fas fa-exclamation-triangle icon-possibly-significant text-xl"></i>',
+        'clinically_significant': '<i class="fas fa-diamond icon-clinically-significant text-xl"></i>',
+        'critical': '<i class="fas fa-exclamation-circle icon-critical text-xl pulse-critical"></i>'
+    };
+    return iconMap[significance] || iconMap['normal'];
+}
+
+function createRangeIndicator(result) {
+    // Simple visual range indicator - could be enhanced with actual range parsing
+    return `
+        <div class="mb-2">
+            <div class="text-xs text-gray-500 mb-1">Value Position</div>
+            <div class="range-indicator">
+                <div class="range-marker" style="left: ${getValuePosition(result)}%"></div>
+            </div>
+        </div>
+    `;
+}
+
+function getValuePosition(result) {
+    // Simplified positioning based on significance
+    const positionMap = {
+        'critical': result.level === 5 ? (result.value > 100 ? 90 : 10) : 50,
+        'clinically_significant': result.level === 4 ? 75 : 25,
+        'possibly_significant': result.level === 3 ? 65 : 35,
+        'likely_insignificant': 45,
+        'normal': 50
+    };
+    return positionMap[result.significance] || 50;
+}
+
+function removeResult(timestamp) {
+    console.log('Removing result with timestamp:', timestamp);
+
+    // Find the result to remove for logging
+    const resultToRemove = allResults.find(r => r.timestamp === timestamp);
+    if (resultToRemove) {
+        console.log('Removing result:', resultToRemove.test_name, '=', resultToRemove.value);
+    }
+
+    // Filter out the result
+    const originalLength = allResults.length;
+    allResults = allResults.filter(r => r.timestamp !== timestamp);
+
+    // Verify removal
+    if (allResults.length === originalLength) {
+        console.warn('Result not found for removal:', timestamp);
+        return;
+    }
+
+    console.log('Results after removal:', allResults.length);
+
+    // Update display and summary
+    renderResults();
+    updateSummaryFromResults();
+
+    // If no results left, show welcome message
+    if (allResults.length === 0) {
+        const welcome = document.getElementById('welcome-message');
+        if (welcome && welcome.classList) {
+            welcome.classList.remove('hidden');
+        }
+    }
+}
+
+function clearAllResults() {
+    console.log('Clearing all results and resetting form state');
+
+    // Cancel any pending requests
+    if (currentRequest) {
+        console.log('Cancelling pending request during clear');
+        currentRequest.abort();
+        currentRequest = null;
+    }
+
+    // Clear debounce timer
+    if (debounceTimer) {
+        clearTimeout(debounceTimer);
+        debounceTimer = null;
+    }
+
+    // Reset evaluation state
+    isEvaluating = false;
+
+    // Clear all results
+    const previousCount = allResults.length;
+    allResults = [];
+    console.log('Cleared', previousCount, 'results');
+
+    // Reset all form fields
+    const testNameEl = document.getElementById('test-name');
+    const testValueEl = document.getElementById('test-value');
+    const bulkInputEl = document.getElementById('bulk-input');
+    const patientAgeEl = document.getElementById('patient-age');
+    const patientSexEl = document.getElementById('patient-sex');
+    const fastingStatusEl = document.getElementById('fasting-status');
+
+    if (testNameEl) testNameEl.value = '';
+    if (testValueEl) testValueEl.value = '';
+    if (bulkInputEl) bulkInputEl.value = '';
+    if (patientAgeEl) patientAgeEl.value = '';
+    if (patientSexEl) patientSexEl.value = '';
+    if (fastingStatusEl) fastingStatusEl.checked = false;
+
+    // Reset view filter to show all
+    showingActionableOnly = false;
+
+    // Update button states for view filter
+    const showAllBtn = document.getElementById('show-all-btn');
+    const actionableBtn = document.getElementById('actionable-only-btn');
+
+    if (showAllBtn && showAllBtn.classList) {
+        showAllBtn.classList.remove('bg-gray-100');
+        showAllBtn.classList.add('bg-gray-200');
+    }
+    if (actionableBtn && actionableBtn.classList) {
+        actionableBtn.classList.remove('bg-orange-200');
+        actionableBtn.classList.add('bg-orange-100');
+    }
+
+    // Clear the results display and show welcome message
+    renderResults();
+
+    // Explicitly show welcome message
+    const welcome = document.getElementById('welcome-message');
+    if (welcome && welcome.classList) {
+        welcome.classList.remove('hidden');
+    }
+
+    // Hide summary banner safely
+    safeAddClass('summary-banner', 'hidden');
+
+    // Reset summary counts to 0
+    const totalTestsEl = document.getElementById('total-tests');
+    const needAttentionCountEl = document.getElementById('need-attention-count');
+    const normalCountEl = document.getElementById('normal-count');
+    const criticalCountEl = document.getElementById('critical-count');
+    const clinicallySignificantCountEl = document.getElementById('clinically-significant-count');
+    const possiblySignificantCountEl = document.getElementById('possibly-significant-count');
+    const likelyInsignificantCountEl = document.getElementById('likely-insignificant-count');
+    const normalCountDetailEl = document.getElementById('normal-count-detail');
+
+    if (totalTestsEl) totalTestsEl.textContent = '0';
+    if (needAttentionCountEl) needAttentionCountEl.textContent = '0';
+    if (normalCountEl) normalCountEl.textContent = '0';
+    if (criticalCountEl) criticalCountEl.textContent = '0';
+    if (clinicallySignificantCountEl) clinicallySignificantCountEl.textContent = '0';
+    if (possiblySignificantCountEl) possiblySignificantCountEl.textContent = '0';
+    if (likelyInsignificantCountEl) likelyInsignificantCountEl.textContent = '0';
+    if (normalCountDetailEl) normalCountDetailEl.textContent = '0';
+
+    // Reset form validation and button states
+    validateForm();
+    setEvaluatingState(false);
+
+    console.log('Clear all completed - all state reset');
+}
+
+function clearSingleInputs() {
+    const testNameEl = document.getElementById('test-name');
+    const testValueEl = document.getElementById('test-value');
+
+    if (testNameEl) testNameEl.value = '';
+    if (testValueEl) testValueEl.value = '';
+    validateForm();
+}
+
+function updateSummary(summary) {
+    safeRemoveClass('summary-banner', 'hidden');
+
+    const totalTestsEl = document.getElementById('total-tests');
+    const needAttentionCountEl = document.getElementById('need-attention-count');
+    const normalCountEl = document.getElementById('normal-count');
+    const summaryMessageEl = document.getElementById('summary-message');
+
+    if (totalTestsEl) totalTestsEl.textContent = summary.total_tests;
+    if (needAttentionCountEl) needAttentionCountEl.textContent = summary.need_attention_count;
+    if (normalCountEl) normalCountEl.textContent = summary.normal_count;
+
+    // Update detailed breakdown
+    const criticalCountEl = document.getElementById('critical-count');
+    const clinicallySignificantCountEl = document.getElementById('clinically-significant-count');
+    const possiblySignificantCountEl = document.getElementById('possibly-significant-count');
+    const likelyInsignificantCountEl = document.getElementById('likely-insignificant-count');
+    const normalCountDetailEl = document.getElementById('normal-count-detail');
+
+    if (criticalCountEl) criticalCountEl.textContent = summary.critical_count || 0;
+    if (clinicallySignificantCountEl) clinicallySignificantCountEl.textContent = summary.clinically_significant_count || 0;
+    if (possiblySignificantCountEl) possiblySignificantCountEl.textContent = summary.possibly_significant_count || 0;
+    if (likelyInsignificantCountEl) likelyInsignificantCountEl.textContent = summary.likely_insignificant_count || 0;
+    if (normalCountDetailEl) normalCountDetailEl.textContent = summary.normal_count || 0;
+
+    // Update summary message
+    const message = `${summary.need_attention_count} result${summary.need_attention_count !== 1 ? 's' : ''} need attention, ${summary.normal_count} normal`;
+    if (summaryMessageEl) summaryMessageEl.textContent = message;
+}
+
+function updateSummaryFromResults() {
+    if (allResults.length === 0) {
+        safeAddClass('summary-banner', 'hidden');
+        return;
+    }
+
+    // Count each significance level
+    const criticalCount = allResults.filter(r => r.significance === 'critical').length;
+    const clinicallySignificantCount = allResults.filter(r => r.significance === 'clinically_significant').length;
+    const possiblySignificantCount = allResults.filter(r => r.significance === 'possibly_significant').length;
+    const likelyInsignificantCount = allResults.filter(r => r.significance === 'likely_insignificant').length;
+    const normalCount = allResults.filter(r => r.significance === 'normal').length;
+
+    // "Need attention" includes all non-normal categories
+    const needAttentionCount = criticalCount + clinicallySignificantCount + possiblySignificantCount + likelyInsignificantCount;
+
+    updateSummary({
+        total_tests: allResults.length,
+        need_attention_count: needAttentionCount,
+        normal_count: normalCount,
+        critical_count: criticalCount,
+        clinically_significant_count: clinicallySignificantCount,
+        possibly_significant_count: possiblySignificantCount,
+        likely_insignificant_count: likelyInsignificantCount
+    });
+}
+
+function toggleView(actionableOnly) {
+    showingActionableOnly = actionableOnly;
+
+    // Update button states safely
+    const showAllBtn = document.getElementById('show-all-btn');
+    const actionableBtn = document.getElementById('actionable-only-btn');
+
+    if (actionableOnly) {
+        if (showAllBtn && showAllBtn.classList) {
+            showAllBtn.classList.remove('bg-gray-200');
+            showAllBtn.classList.add('bg-gray-100');
+        }
+        if (actionableBtn && actionableBtn.classList) {
+            actionableBtn.classList.remove('bg-orange-100');
+            actionableBtn.classList.add('bg-orange-200');
+        }
+    } else {
+        if (showAllBtn && showAllBtn.classList) {
+            showAllBtn.classList.remove('bg-gray-100');
+            showAllBtn.classList.add('bg-gray-200');
+        }
+        if (actionableBtn && actionableBtn.classList) {
+            actionableBtn.classList.remove('bg-orange-200');
+            actionableBtn.classList.add('bg-orange-100');
+        }
+    }
+
+    renderResults();
+}
+
+function showLoading(show) {
+    safeToggleClass('loading-spinner', 'hidden', !show);
+}
+
+function showError(message) {
+    showErrorWithRetry(message, null);
+}
+
+function showErrorWithRetry(message, retryFunction) {
+    console.log('Showing error:', message, 'with retry:', !!retryFunction);
+
+    try {
+        // Remove any existing error messages
+        const existingErrors = document.querySelectorAll('.error-notification');
+        existingErrors.forEach(error => {
+            try {
+                error.remove();
+            } catch (e) {
+                console.warn('Error removing existing error notification:', e);
+            }
+        });
+
+        // Enhanced error display with better UX and retry option
+        const errorDiv = document.createElement('div');
+        errorDiv.className = 'error-notification fixed top-4 right-4 bg-red-100 border border-red-400 text-red-700 px-4 py-3 rounded z-50 max-w-md';
+
+        let retryButton = '';
+        if (retryFunction) {
+            retryButton = `
+                <button onclick="handleRetry()" class="ml-2 px-2 py-1 bg-red-200 text-red-800 rounded text-sm hover:bg-red-300 transition-colors">
+                    Retry
+                </button>
+            `;
+            // Store retry function globally for the button
+            window.currentRetryFunction = retryFunction;
+        }
+
+        errorDiv.innerHTML = `
+            <div class="flex items-start">
+                <i class="fas fa-exclamation-triangle mr-2 mt-0.5"></i>
+                <div class="flex-1">
+                    <div class="text-sm">${message}</div>
+                    <div class="mt-2 flex items-center">
+                        ${retryButton}
+                        <button onclick="this.closest('.error-notification').remove()" class="ml-2 text-red-500 hover:text-red-700 text-sm">
+                            <i class="fas fa-times"></i> Dismiss
+                        </button>
+                    </div>
+                </div>
+            </div>
+        `;
+
+        // Safely append to body
+        if (document.body) {
+            document.body.appendChild(errorDiv);
+
+            // Auto-remove after timeout (longer for retry errors)
+            setTimeout(() => {
+                try {
+                    if (errorDiv.parentElement) {
+                        errorDiv.remove();
+                    }
+                } catch (e) {
+                    console.warn('Error auto-removing error notification:', e);
+                }
+            }, retryFunction ? 8000 : 5000);
+        } else {
+            console.error('Cannot show error notification - document.body not available');
+        }
+
+    } catch (error) {
+        console.error('Error showing error notification:', error);
+        // Fallback to alert if DOM manipulation fails
+        alert(`Error: ${message}`);
+    }
+}
+
+// Global retry handler
+function handleRetry() {
+    console.log('Retry button clicked');
+    try {
+        if (window.currentRetryFunction) {
+            // Remove error message safely
+            const errorDiv = document.querySelector('.error-notification');
+            if (errorDiv) {
+                try {
+                    errorDiv.remove();
+                } catch (e) {
+                    console.warn('Error removing error notification during retry:', e);
+                }
+            }
+
+            // Execute retry
+            const retryFn = window.currentRetryFunction;
+            window.currentRetryFunction = null;
+            retryFn();
+        }
+    } catch (error) {
+        console.error('Error during retry:', error);
+        showError('Retry failed. Please try again manually.');
+    }
+}
+
+// Cleanup function to prevent memory leaks
+function cleanup() {
+    console.log('Performing cleanup...');
+
+    // Cancel any pending requests
+    if (currentRequest) {
+        console.log('Cancelling pending request during cleanup');
+        currentRequest.abort();
+        currentRequest = null;
+    }
+
+    // Clear any active timers
+    if (debounceTimer) {
+        clearTimeout(debounceTimer);
+        debounceTimer = null;
+    }
+
+    // Clear retry function reference
+    if (window.currentRetryFunction) {
+        window.currentRetryFunction = null;
+    }
+
+    // Reset state
+    isEvaluating = false;
+
+    console.log('Cleanup completed');
+}
+
+// Enhanced cleanup on page unload
+window.addEventListener('beforeunload', function() {
+    cleanup();
+});
+
+// Also cleanup on page hide (for mobile browsers)
+window.addEventListener('pagehide', function() {
+    cleanup();
+});
+
+// Cleanup on visibility change (when tab becomes hidden)
+document.addEventListener('visibilitychange', function() {
+    if (document.hidden && (currentRequest || debounceTimer)) {
+        console.log('Page hidden, performing cleanup');
+        cleanup();
+    }
+});
+
+// Handle Clear All with optional confirmation
+function handleClearAllResults() {
+    console.log('Clear All button clicked, current results count:', allResults.length);
+
+    // Optional confirmation for large number of results
+    if (allResults.length > 5) {
+        if (!confirm(`Are you sure you want to clear all ${allResults.length} results?`)) {
+            console.log('User cancelled clear all operation');
+            return;
+        }
+    }
+
+    // Always call clearAllResults - let it handle the empty state
+    clearAllResults();
+}
@@ -0,0 +1,13 @@
+tailwind.config = {
+    theme: {
+        extend: {
+            colors: {
+                medical: {
+                    blue: '#1e40af',
+                    green: '#059669',
+                    gray: '#6b7280'
+                }
+            }
+        }
+    }
+}
@@ -63,6 +63,8 @@ if __name__ == "__main__":
     try:
         port = int(os.environ.get("PORT", 10000))
         logger.info(f"Starting application on port {port}")
+        logger.warning("This is Flask's development server; serve production traffic with "
+                       "'gunicorn -c gunicorn.conf.py production:app'")
         app.run(host="0.0.0.0", port=port)
     except Exception as e:
         logger.error(f"Error starting application: {e}")
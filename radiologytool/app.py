@@ -1,36 +1,74 @@
 import os
+import html
 import json
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, Blueprint
+import contextvars
+from datetime import datetime, timezone
+from flask import Flask, render_template, request, jsonify, Blueprint, Response, stream_with_context, url_for
 from dotenv import load_dotenv
 import openai
-import re
 import logging
+import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from logging.handlers import RotatingFileHandler
+from radiologytool.chunking import split_findings
+from radiologytool.formatting import StreamingFormatter, format_single_paragraph, format_translation, strip_lead_in
+from radiologytool.fast_path import FastPath
+from radiologytool.feedback_store import FeedbackStore
+from radiologytool.jobs import QueueFullError, TranslationJobQueue, raise_if_cancelled
+from radiologytool.llm_metrics import LLMMetrics, load_prices
+from radiologytool.log_reader import JSON_ENTRY_START, read_log_page
+from radiologytool.near_duplicate import NearDuplicateIndex
+from radiologytool.resilience import (CircuitBreaker, CircuitOpenError, ConcurrencyLimiter, OverloadedError,
+                                      call_with_retries)
+from radiologytool.single_flight import SingleFlight
+from radiologytool.structured_log import BackgroundLogHandler, EventLogger, JsonLinesFormatter
+from radiologytool.translation_cache import TranslationCache, fingerprint, normalize_impression
+from radiologytool.utils import GLOSSARY_VERSION
 
 # Set up logging with a file handler to ensure logs are written to the file
-log_file = os.path.join(os.path.dirname(__file__), 'translations_log.txt')
+log_file = os.environ.get('ACTIVITY_LOG_FILE', os.path.join(os.path.dirname(__file__), 'translations_log.txt'))
+LOG_MAX_BYTES = 10485760
+LOG_BACKUP_COUNT = 3
+# Entries per page on /view-logs
+LOG_PAGE_SIZE = 200
+MAX_LOG_PAGE_SIZE = 1000
 
 # Configure root logger
 logger = logging.getLogger('radiologytool.app')
 logger.setLevel(logging.INFO)
 
 # Create file handler
-file_handler = RotatingFileHandler(log_file, maxBytes=10485760, backupCount=3)
+file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
 file_handler.setLevel(logging.INFO)
 
 # Create formatter
 formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 file_handler.setFormatter(formatter)
 
-# Add handlers to logger
-logger.addHandler(file_handler)
-
 # Load environment variables from the correct path
 dotenv_path = os.path.join(os.path.dirname(__file__), 'key.env')
 load_dotenv(dotenv_path)
 
+# Translation and feedback events, one JSON object per line
+translation_log_file = os.environ.get('TRANSLATION_LOG_FILE',
+                                      os.path.join(os.path.dirname(__file__), 'translations_log.jsonl'))
+record_handler = RotatingFileHandler(translation_log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+record_handler.setFormatter(JsonLinesFormatter(max_field_chars=int(os.environ.get('LOG_MAX_FIELD_CHARS', 2000))))
+
+# Both files are written by one background thread so logging never blocks a request
+log_queue_handler = BackgroundLogHandler(file_handler, record_handler,
+                                         max_queue=int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+logger.addHandler(log_queue_handler)
+record_logger = logging.getLogger('radiologytool.records')
+record_logger.setLevel(logging.INFO)
+record_logger.propagate = False
+record_logger.addHandler(log_queue_handler)
+file_handler.addFilter(lambda record: record.name != record_logger.name)
+record_handler.addFilter(lambda record: record.name == record_logger.name)
+events = EventLogger(record_logger, debug_sample_rate=float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.01)))
+
 # Initialize Flask Blueprint instead of app
 app = Blueprint('radiology', __name__, 
                 template_folder='templates',
@@ -58,234 +96,204 @@ https_proxy = os.environ.get('HTTPS_PROXY') or os.environ.get('https_proxy')
 if http_proxy or https_proxy:
     logger.warning("HTTP_PROXY or HTTPS_PROXY environment variables are set.")
 
-# Store feedback data
-FEEDBACK_FILE = os.path.join(os.path.dirname(__file__), 'feedback_data.json')
+# Connection settings for the shared OpenAI client. Point OPENAI_BASE_URL at a
+# local stand-in to measure latency without touching the real API.
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None
+OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 20))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 10))
+OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY', 60))
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', 5))
+OPENAI_READ_TIMEOUT = float(os.environ.get('OPENAI_READ_TIMEOUT', 60))
 
-def load_feedback():
-    """Load feedback from file"""
-    if os.path.exists(FEEDBACK_FILE):
-        try:
-            with open(FEEDBACK_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+# Retries for transient OpenAI failures, with exponential backoff and full jitter
+OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 2))
+OPENAI_RETRY_BASE_DELAY = float(os.environ.get('OPENAI_RETRY_BASE_DELAY', 0.5))
+OPENAI_RETRY_MAX_DELAY = float(os.environ.get('OPENAI_RETRY_MAX_DELAY', 8))
+OPENAI_RETRY_DEADLINE = float(os.environ.get('OPENAI_RETRY_DEADLINE', 30))
+
+def is_transient_openai_error(error):
+    """Timeouts, dropped connections, rate limits and server errors are worth retrying"""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError,
+                          TimeoutError, ConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+# Stops calling OpenAI for a while once too many recent calls have failed
+openai_breaker = CircuitBreaker(
+    'The translation service',
+    failure_rate=float(os.environ.get('OPENAI_BREAKER_FAILURE_RATE', 0.5)),
+    min_calls=int(os.environ.get('OPENAI_BREAKER_MIN_CALLS', 10)),
+    window=float(os.environ.get('OPENAI_BREAKER_WINDOW', 60)),
+    open_seconds=float(os.environ.get('OPENAI_BREAKER_OPEN_SECONDS', 30)),
+    is_failure=is_transient_openai_error
+)
+
+# Caps OpenAI calls in flight in this worker; callers over the cap wait briefly, then are shed
+LLM_MAX_IN_FLIGHT = int(os.environ.get('LLM_MAX_IN_FLIGHT', 8))
+llm_gate = ConcurrencyLimiter(
+    'The translation service',
+    max_in_flight=LLM_MAX_IN_FLIGHT,
+    max_waiting=int(os.environ.get('LLM_MAX_WAITING', 16)),
+    max_wait=float(os.environ.get('LLM_QUEUE_TIMEOUT', 10))
+)
 
-def save_feedback(feedback_data):
-    """Save feedback to file"""
-    with open(FEEDBACK_FILE, 'w') as f:
-        json.dump(feedback_data, f, indent=2)
+def call_openai(request):
+    """Run one OpenAI request through the circuit breaker, retrying transient failures"""
+    return retry_openai(lambda: openai_breaker.call(request))
 
-def format_translation(text):
+def retry_openai(attempt):
+    """Run attempt(), retrying transient OpenAI failures; a timed-out job stops before each try"""
+    def checked_attempt():
+        raise_if_cancelled()
+        return attempt()
+    return call_with_retries(
+        checked_attempt,
+        retries=OPENAI_MAX_RETRIES,
+        base_delay=OPENAI_RETRY_BASE_DELAY,
+        max_delay=OPENAI_RETRY_MAX_DELAY,
+        deadline=OPENAI_RETRY_DEADLINE,
+        retryable=is_transient_openai_error
+    )
+
+_openai_client = None
+_openai_client_pid = None
+_openai_client_lock = threading.Lock()
+
+def get_openai_client():
     """
-    Format the translation by adding proper HTML tags and styling.
-    Also removes any remaining conversational lead-ins and ensures
-    technical terms have explanations in parentheses.
+    Return this worker's OpenAI client, creating it on first use.
+    The client owns a keep-alive connection pool, so it is reused across
+    requests and rebuilt only when running in a freshly forked process.
     """
-    # Remove common conversational lead-ins
-    lead_ins = [
-        "sure!", "sure,", "absolutely!", "absolutely,", "here's", "i can help", "i'll explain",
-        "let me explain", "let's break this down", "to put it simply", "in simple terms",
-        "the report shows", "this means that", "this indicates that", "based on the report",
-        "the radiology report indicates", "the findings show", "the findings indicate",
-    ]
-    
-    # Clean up text by removing conversational starts
-    lower_text = text.lower()
-    first_sentence_end = lower_text.find('.')
-    if first_sentence_end > 0:
-        first_sentence = lower_text[:first_sentence_end]
-        for lead_in in lead_ins:
-            if lead_in in first_sentence:
-                # Remove the lead-in phrase and any text before it
-                start_pos = text.lower().find(lead_in)
-                end_pos = start_pos + len(lead_in)
-                # Skip to the next non-space character after the lead-in
-                while end_pos < len(text) and (text[end_pos].isspace() or text[end_pos] in ',:;'):
-                    end_pos += 1
-                text = text[end_pos:]
-                # Capitalize the first letter
-                if text:
-                    text = text[0].upper() + text[1:]
-                break
-    
-    # First, clean up any problematic or nested explanations that might already exist
-    # This pattern looks for text like "L4 (whiL5 (which is..." and fixes it
-    nested_pattern = r'([A-Z][0-9])(\s*\(\s*whi[A-Z][0-9]\s*\()'
-    text = re.sub(nested_pattern, r'\1 (', text)
-    
-    # Add a general cleanup for any incorrectly nested parentheses
-    while re.search(r'\([^()]*\([^()]*\)[^()]*\)', text):
-        text = re.sub(r'\(([^()]*)\(([^()]*)\)([^()]*)\)', r'(\1\2\3)', text)
-    
-    # Special case for vertebral levels that appear together (like "L4-L5")
-    # Replace them with a combined explanation instead of individual ones
-    for pattern, replacement in [
-        (r'L([1-5])[- ]L([1-5])', r'L\1-L\2 (the area in your lower back)'),
-        (r'T([1-9][0-2]?)[- ]T([1-9][0-2]?)', r'T\1-T\2 (the area in your middle back)'),
-        (r'C([1-7])[- ]C([1-7])', r'C\1-C\2 (the area in your neck)')
-    ]:
-        # Only replace if not already followed by an explanation
-        combined_pattern = pattern + r'(?!\s*\()'
-        text = re.sub(combined_pattern, replacement, text)
-    
-    # Fix standalone vertebrae before applying the general rules
-    # This addresses the issue with patterns like L4 (part of your lower back)
-    vertebrae_patterns = {
-        r'\bL([1-5])\b(?!\s*[-–—]\s*L[1-5])(?!\s*\()': r'L\1 (a vertebra in your lower back)',
-        r'\bT([1-9][0-2]?)\b(?!\s*[-–—]\s*T[1-9])(?!\s*\()': r'T\1 (a vertebra in your middle back)',
-        r'\bC([1-7])\b(?!\s*[-–—]\s*C[1-7])(?!\s*\()': r'C\1 (a vertebra in your neck)',
-        r'\bS([1-5])\b(?!\s*[-–—]\s*S[1-5])(?!\s*\()': r'S\1 (a vertebra at the base of your spine)'
-    }
-    
-    for pattern, replacement in vertebrae_patterns.items():
-        text = re.sub(pattern, replacement, text)
-    
-    # Import the medical terms dictionary from utils
-    from radiologytool.utils import COMMON_MEDICAL_TERMS
-    
-    # Create a helper function to check if a term already has an explanation
-    def has_explanation(term, text):
-        # This regex looks for the term followed by an opening parenthesis within a reasonable distance
-        pattern = re.escape(term) + r'\s*\([^)]*\)'
-        return bool(re.search(pattern, text, re.IGNORECASE))
-    
-    # Ensure every medical term has an explanation in parentheses if not already present
-    for term, explanation in COMMON_MEDICAL_TERMS.items():
-        # Check if the term is a standalone word and doesn't already have an explanation
-        term_pattern = r'\b' + re.escape(term) + r'\b(?!\s*[\(\{])'
-        if re.search(term_pattern, text, re.IGNORECASE) and not has_explanation(term, text):
-            # The term exists without an explanation in parentheses
-            replacement = f"{term} ({explanation})"
-            text = re.sub(term_pattern, replacement, text, flags=re.IGNORECASE)
-    
-    # Common anatomical locations and terms dictionary
-    anatomical_terms = {
-        # Spine - these are handled separately above for the combined cases
-        r'\bL[1-5]\b': 'a vertebra in the lower back',
-        r'\bT[1-9][0-2]?\b': 'a vertebra in the middle back',
-        r'\bC[1-7]\b': 'a vertebra in the neck',
-        r'\bS[1-5]\b': 'part of the sacrum (base of the spine)',
-        
-        # Brain
-        r'\bfrontal lobe\b': 'the front part of the brain that controls thinking and movement',
-        r'\btemporal lobe\b': 'the side part of the brain that helps with hearing and memory',
-        r'\bparietal lobe\b': 'the top part of the brain that processes sensations',
-        r'\boccipital lobe\b': 'the back part of the brain that processes vision',
-        r'\bcerebellum\b': 'the lower back part of the brain that controls balance and coordination',
-        r'\bbrainstem\b': 'the part that connects the brain to the spinal cord and controls basic functions like breathing',
-        
-        # Chest
-        r'\bpulmonary\b': 'related to the lungs',
-        r'\baorta\b': 'the main blood vessel carrying blood from your heart',
-        r'\bventricle\b': 'a chamber of the heart',
-        r'\batrium\b': 'an upper chamber of the heart',
-        r'\bbronch(i|us)\b': 'the airways in the lungs',
-        
-        # Abdomen
-        r'\bhepatobiliary\b': 'related to the liver and bile ducts',
-        r'\bpancreas\b': 'an organ behind your stomach that helps with digestion',
-        r'\bspleen\b': 'an organ near your stomach that helps fight infection',
-        r'\bkidney\b': 'an organ that filters waste from your blood',
-        r'\bgallbladder\b': 'an organ that stores bile from your liver to help with digestion',
-        r'\bcolon\b': 'the large intestine',
-        
-        # Common conditions
-        r'\batrophy\b': 'shrinkage',
-        r'\bhypertrophy\b': 'enlargement',
-        r'\bstenosis\b': 'narrowing',
-        r'\binfarct\b': 'an area of damaged tissue due to lack of blood flow',
-        r'\blesion\b': 'an abnormal area of tissue',
-        r'\bnodule\b': 'a small rounded lump',
-        r'\beffusion\b': 'a buildup of fluid',
-        r'\bedema\b': 'swelling due to excess fluid',
-        r'\bhemorrhage\b': 'bleeding',
-        r'\bischemia\b': 'reduced blood flow'
-    }
-    
-    # Add explanations to anatomical terms not already explained
-    for term_pattern, explanation in anatomical_terms.items():
-        # Only match if not followed by parentheses and not already explained elsewhere
-        matches = re.finditer(term_pattern + r'(?!\s*[\(\{])', text, re.IGNORECASE)
-        for match in matches:
-            term = match.group(0)
-            if not has_explanation(term, text):
-                replacement = f"{term} ({explanation})"
-                # Replace only this exact instance
-                text = text[:match.start()] + replacement + text[match.end():]
-    
-    # Special handling for example: "L4-L5 resulting in" pattern
-    # Make sure the vertebrae with ranges are properly explained
-    disc_level_pattern = r'\b(L[1-5]\s*-\s*L[1-5]|T[1-9][0-2]?\s*-\s*T[1-9][0-2]?|C[1-7]\s*-\s*C[1-7])\b(?!\s*\()'
-    if re.search(disc_level_pattern, text):
-        for match in re.finditer(disc_level_pattern, text):
-            level = match.group(1)
-            if 'L' in level:
-                replacement = f"{level} (the area between these two bones in your lower back)"
-            elif 'T' in level:
-                replacement = f"{level} (the area between these two bones in your middle back)"
-            elif 'C' in level:
-                replacement = f"{level} (the area between these two bones in your neck)"
-            else:
-                continue
-                
-            # Replace only this instance
-            text = text[:match.start()] + replacement + text[match.end():]
-    
-    # Do multiple passes to fix any nested parentheses
-    for _ in range(3):  # Try up to 3 times to fix nested parentheses
-        if re.search(r'\([^()]*\([^()]*\)[^()]*\)', text):
-            text = re.sub(r'\(([^()]*)\(([^()]*)\)([^()]*)\)', r'(\1\2\3)', text)
-        else:
-            break
-    
-    # Handle any unclosed parentheses
-    open_count = text.count('(')
-    close_count = text.count(')')
-    if open_count > close_count:
-        text += ')' * (open_count - close_count)
-    elif close_count > open_count:
-        text = text.replace(')', '', close_count - open_count)
-    
-    # Clean up any asterisks, stars, or bullet points
-    text = re.sub(r'\*+', '', text)       # Remove asterisks
-    text = re.sub(r'•', '', text)         # Remove bullet points
-    text = re.sub(r'^\s*-\s*', '', text)  # Remove hyphens used as bullets
-    
-    # Remove any mention of symptoms, causes, treatments, or risk factors
-    symptom_patterns = [
-        r'(?i)related symptoms[:\s]*.*$',
-        r'(?i)this can cause[^\.]*\.',
-        r'(?i)symptoms may include[^\.]*\.',
-        r'(?i)you might (feel|experience)[^\.]*\.',
-        r'(?i)this (may|might|can) lead to[^\.]*\.',
-        r'(?i)common symptoms[^\.]*\.',
-        r'(?i)you (may|might|can) feel[^\.]*\.',
-        r'(?i)you (may|might|can) notice[^\.]*\.',
-        r'(?i)this could result in[^\.]*\.',
-        r'(?i)this is (often|sometimes|usually) associated with[^\.]*\.',
-        r'(?i)patients (often|sometimes|usually) experience[^\.]*\.',
-        r'(?i)treatment (options|may|might|includes|involves)[^\.]*\.',
-        r'(?i)risk factors[^\.]*\.',
-        r'(?i)causes (of|for|include)[^\.]*\.'
+    global _openai_client, _openai_client_pid
+    
+    pid = os.getpid()
+    if _openai_client is not None and _openai_client_pid == pid:
+        return _openai_client
+    
+    with _openai_client_lock:
+        if _openai_client is None or _openai_client_pid != pid:
+            import httpx
+            
+            timeout = httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+                ),
+                timeout=timeout
+            )
+            _openai_client = openai.OpenAI(
+                api_key=os.environ.get("OPENAI_API_KEY"),
+                base_url=OPENAI_BASE_URL,
+                timeout=timeout,
+                http_client=http_client,
+                # Retries are done by call_openai so they pass through the circuit breaker
+                max_retries=0
+            )
+            _openai_client_pid = pid
+            logger.info(f"Created OpenAI client for worker {pid}"
+                        + (f" using base URL {OPENAI_BASE_URL}" if OPENAI_BASE_URL else ""))
+    return _openai_client
+
+# Store feedback data
+FEEDBACK_FILE = os.environ.get('FEEDBACK_FILE',
+                               os.path.join(os.path.dirname(__file__), 'feedback_data.json'))
+
+# Model and prompts for the translation call. Anything that changes the
+# generated text also changes the translation cache version below.
+OPENAI_MODEL = "gpt-3.5-turbo"
+
+SYSTEM_PROMPT = (
+    "You explain radiology results in simple, clear language for patients with no medical background. "
+    "Your job is to translate complex medical impressions into one cohesive, easily understandable explanation.\n\n"
+    "CRITICAL REQUIREMENTS:\n"
+    "1. Create ONE SINGLE PARAGRAPH that explains ONLY the medical impression.\n"
+    "2. DO NOT mention symptoms, causes, risk factors, or treatments - focus ONLY on what the impression means.\n"
+    "3. DO NOT use bullet points, asterisks, or any special formatting.\n"
+    "4. Start directly with the explanation - no introductory phrases.\n\n"
+    "EXAMPLE FORMAT:\n"
+    "\"There is some mild wear and tear in the disc between two bones in the lower part of your back (called L4–L5). The disc is bulging a little and making the space where your nerves pass through a bit tighter, especially on the left side.\"\n\n"
+    "GUIDELINES:\n"
+    "- Use short, clear sentences at a 6th grade reading level.\n"
+    "- DO NOT include any information about symptoms or possible symptoms.\n"
+    "- DO NOT include any information about causes, risk factors, or treatments.\n"
+    "- When mentioning technical terms, always include simple explanations in parentheses.\n"
+    "- For vertebral levels (like L4-L5), use a consistent description: \"L4-L5 (the area in your lower back)\"\n"
+    "- Keep your response concise, clear, and reassuring.\n"
+    "- Always prioritize simple, direct language for a patient with no medical background."
+)
+
+USER_PROMPT_TEMPLATE = "Explain this radiology report impression in simple terms, focusing ONLY on what the findings mean (not symptoms, causes, risk factors, or treatments): {impression}"
+
+# Used for each finding when a long impression is translated in parts; the parts are joined into one paragraph
+CHUNK_PROMPT_TEMPLATE = "Explain this finding from a longer radiology report impression in simple terms, focusing ONLY on what it means (not symptoms, causes, risk factors, or treatments). Explain only this finding, in a few sentences, without an introduction or a summary: {impression}"
+
+# Long impressions with several findings are split and the findings translated concurrently
+TRANSLATION_CHUNKING = os.environ.get('TRANSLATION_CHUNKING', '').lower() in ('1', 'true', 'yes')
+TRANSLATION_CHUNK_MIN_FINDINGS = int(os.environ.get('TRANSLATION_CHUNK_MIN_FINDINGS', 4))
+TRANSLATION_CHUNK_MAX = int(os.environ.get('TRANSLATION_CHUNK_MAX', 6))
+TRANSLATION_CHUNK_MAX_TOKENS = int(os.environ.get('TRANSLATION_CHUNK_MAX_TOKENS', 600))
+
+# Bump whenever format_single_paragraph starts producing different HTML
+FORMATTER_VERSION = 3
+
+TRANSLATION_CACHE_DB = os.environ.get('TRANSLATION_CACHE_DB',
+                                      os.path.join(os.path.dirname(__file__), 'translation_cache.db'))
+
+# Cache of formatted translations, shared by all workers through SQLite
+translation_cache = TranslationCache(
+    db_path=TRANSLATION_CACHE_DB,
+    version=fingerprint(OPENAI_MODEL, SYSTEM_PROMPT, USER_PROMPT_TEMPLATE, CHUNK_PROMPT_TEMPLATE,
+                        FORMATTER_VERSION, GLOSSARY_VERSION),
+    max_entries=int(os.environ.get('TRANSLATION_CACHE_SIZE', 1000)),
+    ttl=int(os.environ.get('TRANSLATION_CACHE_TTL', 30 * 24 * 3600)),
+    max_disk_entries=int(os.environ.get('TRANSLATION_CACHE_DISK_SIZE', 50000)),
+    sync_interval=float(os.environ.get('TRANSLATION_CACHE_SYNC_INTERVAL', 1.0)),
+    purge_interval=float(os.environ.get('TRANSLATION_CACHE_PURGE_INTERVAL', 300))
+)
+
+# Translations of earlier impressions that differ only in wording noise are reused; off unless enabled
+near_duplicates = NearDuplicateIndex(
+    db_path=TRANSLATION_CACHE_DB,
+    version=translation_cache.version,
+    threshold=float(os.environ.get('TRANSLATION_NEAR_DUPLICATE_THRESHOLD', 0.9)),
+    ttl=translation_cache.ttl,
+    enabled=os.environ.get('TRANSLATION_NEAR_DUPLICATES', '0').lower() not in ('0', 'false', 'no')
+)
+
+# Stock normal impressions are answered locally without calling OpenAI
+fast_path = FastPath(enabled=os.environ.get('TRANSLATION_FAST_PATH', '1').lower() not in ('0', 'false', 'no'))
+
+# Collapses concurrent requests for the same impression into one OpenAI call.
+# Claims live next to the cache so other workers can find the shared result.
+single_flight = SingleFlight(
+    db_path=TRANSLATION_CACHE_DB,
+    claim_timeout=OPENAI_RETRY_DEADLINE + OPENAI_CONNECT_TIMEOUT + OPENAI_READ_TIMEOUT
+)
+
+# OpenAI call latency, token and cost counters, shared by all workers through SQLite
+llm_metrics = LLMMetrics(
+    db_path=os.environ.get('LLM_METRICS_DB', os.path.join(os.path.dirname(__file__), 'llm_metrics.db')),
+    prices=load_prices(os.environ.get('LLM_PRICES')),
+    timeout_errors=(openai.APITimeoutError, TimeoutError)
+)
+
+feedback_store = FeedbackStore(
+    db_path=os.environ.get('FEEDBACK_DB', os.path.join(os.path.dirname(__file__), 'feedback.db')),
+    legacy_path=FEEDBACK_FILE,
+    write_behind=os.environ.get('FEEDBACK_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes'),
+    batch_size=int(os.environ.get('FEEDBACK_BATCH_SIZE', 50)),
+    flush_interval=float(os.environ.get('FEEDBACK_FLUSH_INTERVAL', 1.0))
+)
+
+def build_messages(impression, template=USER_PROMPT_TEMPLATE):
+    """Chat messages asking the model to translate one impression"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": template.format(impression=impression)}
     ]
-    
-    for pattern in symptom_patterns:
-        text = re.sub(pattern, '', text)
-    
-    # Remove any bullet list sections that might appear in the text
-    bullet_list_pattern = r'(?:\s*[•\*-]\s*[^\n]+\n?)+'
-    text = re.sub(bullet_list_pattern, ' ', text)
-    
-    # Clean up multiple spaces and ensure proper sentence spacing
-    text = re.sub(r' +', ' ', text)
-    text = re.sub(r'\.\s+', '. ', text)
-    
-    # Final check for any trailing symbols
-    text = text.rstrip('*• \t\n-')
-    
-    # Wrap in paragraph tags
-    return f"<p>{text}</p>"
 
 def translate_radiology_impression(impression):
     """
@@ -293,185 +301,212 @@ def translate_radiology_impression(impression):
     at a 6th grade reading level, without mentioning symptoms.
     """
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You explain radiology results in simple, clear language for patients with no medical background. "
-                                            "Your job is to translate complex medical impressions into one cohesive, easily understandable explanation.\n\n"
-                                            "CRITICAL REQUIREMENTS:\n"
-                                            "1. Create ONE SINGLE PARAGRAPH that explains ONLY the medical impression.\n"
-                                            "2. DO NOT mention symptoms, causes, risk factors, or treatments - focus ONLY on what the impression means.\n"
-                                            "3. DO NOT use bullet points, asterisks, or any special formatting.\n"
-                                            "4. Start directly with the explanation - no introductory phrases.\n\n"
-                                            "EXAMPLE FORMAT:\n"
-                                            "\"There is some mild wear and tear in the disc between two bones in the lower part of your back (called L4–L5). The disc is bulging a little and making the space where your nerves pass through a bit tighter, especially on the left side.\"\n\n"
-                                            "GUIDELINES:\n"
-                                            "- Use short, clear sentences at a 6th grade reading level.\n"
-                                            "- DO NOT include any information about symptoms or possible symptoms.\n"
-                                            "- DO NOT include any information about causes, risk factors, or treatments.\n"
-                                            "- When mentioning technical terms, always include simple explanations in parentheses.\n"
-                                            "- For vertebral levels (like L4-L5), use a consistent description: \"L4-L5 (the area in your lower back)\"\n"
-                                            "- Keep your response concise, clear, and reassuring.\n"
-                                            "- Always prioritize simple, direct language for a patient with no medical background."
-                },
-                {"role": "user", "content": f"Explain this radiology report impression in simple terms, focusing ONLY on what the findings mean (not symptoms, causes, risk factors, or treatments): {impression}"}
-            ],
-            temperature=0.3,
-            max_tokens=2000
-        )
-        
-        # Log the full response to help with debugging
-        try:
-            logger.info(f"OpenAI API raw response: {response}")
-        except:
-            logger.info("Could not log the full OpenAI API response")
-        
-        # Get the response text from the new API structure
-        raw_text = response.choices[0].message.content
-        
-        # Log the raw text to debug any issues
-        logger.info(f"Raw translation text: {raw_text}")
-        
-        # Always use format_single_paragraph rather than format_translation
-        formatted_text = format_single_paragraph(raw_text)
-        
-        # Log the formatted text
-        logger.info(f"Formatted translation text: {formatted_text}")
-        
-        return formatted_text
+        return _translate(impression)
     except Exception as e:
         logger.error(f"Error in translation: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         return f"<p>Error in translation: {str(e)}</p>"
 
-def format_single_paragraph(text):
+def _translate(impression):
+    """Translate an impression, raising instead of returning an error paragraph"""
+    trivial = fast_path.translate(impression)
+    if trivial is not None:
+        logger.info("Translation served by the fast path")
+        return trivial
+    
+    cached = translation_cache.get(impression)
+    if cached is not None:
+        logger.info("Translation served from cache")
+        return cached
+    
+    similar = near_duplicates.get(impression)
+    if similar is not None:
+        logger.info("Translation served from a near-duplicate impression")
+        return similar
+    
+    try:
+        return single_flight.do(
+            translation_cache.make_key(impression),
+            lambda: _translate_uncached(impression),
+            recheck=lambda: translation_cache.get(impression, count_miss=False)
+        )
+    except (CircuitOpenError, OverloadedError) as e:
+        stale = translation_cache.get_stale(impression)
+        if stale is None:
+            raise
+        logger.warning(f"{e} Serving an expired cached translation")
+        return stale
+
+def complete(messages, max_tokens=2000):
+    """One chat completion through the in-flight cap, retries and circuit breaker; returns the raw text"""
+    client = get_openai_client()
+    
+    def request():
+        with llm_metrics.observe(OPENAI_MODEL) as call:
+            response = client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=max_tokens
+            )
+            call.usage = getattr(response, 'usage', None)
+        return response
+    
+    started = time.monotonic()
+    with llm_gate.slot():
+        response = call_openai(request)
+    
+    # Get the response text from the new API structure
+    raw_text = response.choices[0].message.content
+    
+    usage = getattr(response, 'usage', None)
+    events.log('openai_call', model=OPENAI_MODEL, stream=False,
+               latency_ms=round((time.monotonic() - started) * 1000),
+               prompt_tokens=getattr(usage, 'prompt_tokens', None),
+               completion_tokens=getattr(usage, 'completion_tokens', None),
+               finish_reason=getattr(response.choices[0], 'finish_reason', None),
+               debug={'response_id': getattr(response, 'id', None), 'raw_text': raw_text})
+    return raw_text
+
+def translate_chunks(chunks):
+    """Translate findings concurrently and join the explanations in report order"""
+    with ThreadPoolExecutor(max_workers=len(chunks), thread_name_prefix='translation-chunk') as executor:
+        # Each chunk runs in a copy of the caller's context so it sees whether the job timed out
+        futures = [executor.submit(contextvars.copy_context().run, complete,
+                                   build_messages(chunk, CHUNK_PROMPT_TEMPLATE), TRANSLATION_CHUNK_MAX_TOKENS)
+                   for chunk in chunks]
+        raw_texts = [future.result() for future in futures]
+    # Each explanation may open with its own lead-in, which only the first would lose otherwise
+    return ' '.join(' '.join(strip_lead_in(text.strip()).split()) for text in raw_texts)
+
+def _translate_uncached(impression):
+    """Call OpenAI for an impression and cache the formatted result"""
+    chunks = split_findings(impression, min_findings=TRANSLATION_CHUNK_MIN_FINDINGS,
+                            max_chunks=TRANSLATION_CHUNK_MAX) if TRANSLATION_CHUNKING else None
+    if chunks:
+        logger.info(f"Translating {len(chunks)} findings concurrently")
+        raw_text = translate_chunks(chunks)
+    else:
+        raw_text = complete(build_messages(impression))
+    
+    # Always use format_single_paragraph rather than format_translation
+    formatted_text = format_single_paragraph(raw_text)
+    
+    translation_cache.set(impression, formatted_text)
+    near_duplicates.add(impression, formatted_text)
+    
+    return formatted_text
+
+def stream_translation(impression):
     """
-    Format the translation as a single paragraph with HTML tags.
-    Also removes any remaining conversational lead-ins and ensures
-    technical terms have explanations in parentheses.
+    Yield ('chunk', html) pairs as formatted sentences arrive from the model,
+    then one ('done', html) pair with the same HTML a non-streaming
+    translation would return.
     """
-    # Remove common conversational lead-ins
-    lead_ins = [
-        "sure!", "sure,", "absolutely!", "absolutely,", "here's", "i can help", "i'll explain",
-        "let me explain", "let's break this down", "to put it simply", "in simple terms",
-        "the report shows", "this means that", "this indicates that", "based on the report",
-        "the radiology report indicates", "the findings show", "the findings indicate",
-    ]
-    
-    # Clean up text by removing conversational starts
-    lower_text = text.lower()
-    first_sentence_end = lower_text.find('.')
-    if first_sentence_end > 0:
-        first_sentence = lower_text[:first_sentence_end]
-        for lead_in in lead_ins:
-            if lead_in in first_sentence:
-                # Remove the lead-in phrase and any text before it
-                start_pos = text.lower().find(lead_in)
-                end_pos = start_pos + len(lead_in)
-                # Skip to the next non-space character after the lead-in
-                while end_pos < len(text) and (text[end_pos].isspace() or text[end_pos] in ',:;'):
-                    end_pos += 1
-                text = text[end_pos:]
-                # Capitalize the first letter
-                if text:
-                    text = text[0].upper() + text[1:]
-                break
-    
-    # Keep track of vertebrae we've already processed - to avoid double-explanation
-    processed_vertebrae = set()
-    
-    # First pass - mark all vertebrae ranges for protection
-    # This pattern will mark things like "L4-L5" to protect them
-    vertebrae_range_pattern = r'(L[1-5])\s*[-–—]\s*(L[1-5])'
-    vertebrae_ranges = re.findall(vertebrae_range_pattern, text)
-    
-    for v_range in vertebrae_ranges:
-        # Add each vertebra in the range to our processed set
-        processed_vertebrae.add(v_range[0])  # First vertebra (e.g., L4)
-        processed_vertebrae.add(v_range[1])  # Second vertebra (e.g., L5)
-    
-    # Handle any vertebrae patterns that already have parentheses
-    for match in re.finditer(r'([TLC][1-9][0-2]?)\s*\(', text):
-        processed_vertebrae.add(match.group(1))
-    
-    # Special case for vertebral levels that appear together (like "L4-L5")
-    # Replace them with a combined explanation instead of individual ones
-    for pattern, replacement in [
-        (r'(L[1-5])\s*[-–—]\s*(L[1-5])', r'\1-\2 (the area in your lower back)'),
-        (r'(T[1-9][0-2]?)\s*[-–—]\s*(T[1-9][0-2]?)', r'\1-\2 (the area in your middle back)'),
-        (r'(C[1-7])\s*[-–—]\s*(C[1-7])', r'\1-\2 (the area in your neck)')
-    ]:
-        text = re.sub(pattern, replacement, text)
-    
-    # Fix standalone vertebrae that are not part of a range and don't already have explanations
-    vertebrae_patterns = {
-        r'\b(L[1-5])\b(?!\s*[-–—]\s*[TLC][0-9])(?!\s*\()': r'\1 (a vertebra in your lower back)',
-        r'\b(T[1-9][0-2]?)\b(?!\s*[-–—]\s*[TLC][0-9])(?!\s*\()': r'\1 (a vertebra in your middle back)',
-        r'\b(C[1-7])\b(?!\s*[-–—]\s*[TLC][0-9])(?!\s*\()': r'\1 (a vertebra in your neck)',
-        r'\b(S[1-5])\b(?!\s*[-–—]\s*[TLC][0-9])(?!\s*\()': r'\1 (a vertebra at the base of your spine)'
-    }
-    
-    for pattern, replacement in vertebrae_patterns.items():
-        for match in re.finditer(pattern, text):
-            vertebra = match.group(1)
-            # Only replace if not already processed
-            if vertebra not in processed_vertebrae:
-                processed_vertebrae.add(vertebra)
-                text = text[:match.start()] + vertebra + " (a vertebra in your lower back)" + text[match.end():]
-    
-    # Import the medical terms dictionary from utils
-    from radiologytool.utils import COMMON_MEDICAL_TERMS
-    
-    # Create a helper function to check if a term already has an explanation
-    def has_explanation(term, text):
-        # This regex looks for the term followed by an opening parenthesis within a reasonable distance
-        pattern = re.escape(term) + r'\s*\([^)]*\)'
-        return bool(re.search(pattern, text, re.IGNORECASE))
-    
-    # Ensure every medical term has an explanation in parentheses if not already present
-    for term, explanation in COMMON_MEDICAL_TERMS.items():
-        # Check if the term is a standalone word and doesn't already have an explanation
-        term_pattern = r'\b' + re.escape(term) + r'\b(?!\s*[\(\{])'
-        if re.search(term_pattern, text, re.IGNORECASE) and not has_explanation(term, text):
-            # The term exists without an explanation in parentheses
-            replacement = f"{term} ({explanation})"
-            text = re.sub(term_pattern, replacement, text, flags=re.IGNORECASE)
-    
-    # Check for unbalanced parentheses at this point
-    open_count = text.count('(')
-    close_count = text.count(')')
-    
-    # If there are unbalanced parentheses, let's remove all explanations and simplify
-    if open_count != close_count:
-        # Instead of complex fixes, just pass through the original text with basic cleanup
-        return f"<p>{text}</p>"
-    
-    # Remove any mention of symptoms, causes, treatments, or risk factors
-    symptom_patterns = [
-        r'(?i)related symptoms[:\s]*.*$',
-        r'(?i)this can cause[^\.]*\.',
-        r'(?i)symptoms may include[^\.]*\.',
-        r'(?i)you might (feel|experience)[^\.]*\.',
-        r'(?i)this (may|might|can) lead to[^\.]*\.',
-        r'(?i)common symptoms[^\.]*\.',
-        r'(?i)you (may|might|can) feel[^\.]*\.',
-        r'(?i)you (may|might|can) notice[^\.]*\.',
-        r'(?i)this could result in[^\.]*\.',
-        r'(?i)this is (often|sometimes|usually) associated with[^\.]*\.',
-        r'(?i)patients (often|sometimes|usually) experience[^\.]*\.',
-        r'(?i)treatment (options|may|might|includes|involves)[^\.]*\.',
-        r'(?i)risk factors[^\.]*\.',
-        r'(?i)causes (of|for|include)[^\.]*\.'
-    ]
-    
-    for pattern in symptom_patterns:
-        text = re.sub(pattern, '', text)
+    trivial = fast_path.translate(impression)
+    if trivial is not None:
+        logger.info("Translation served by the fast path")
+        yield 'done', trivial
+        return
+    
+    cached = translation_cache.get(impression)
+    if cached is not None:
+        logger.info("Translation served from cache")
+        yield 'done', cached
+        return
+    
+    similar = near_duplicates.get(impression)
+    if similar is not None:
+        logger.info("Translation served from a near-duplicate impression")
+        yield 'done', similar
+        return
+    
+    client = get_openai_client()
+    started = time.monotonic()
+    formatter = StreamingFormatter()
+    
+    def open_stream():
+        # Each attempt is one call in the metrics, as in complete(). The breaker hears
+        # how the call went once the stream has been read, since streams can break midway.
+        openai_breaker.before_call()
+        opened = time.monotonic()
+        try:
+            stream = client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=build_messages(impression),
+                temperature=0.3,
+                max_tokens=2000,
+                stream=True,
+                stream_options={'include_usage': True}
+            )
+        except Exception as e:
+            openai_breaker.record(openai_breaker.is_failure(e))
+            llm_metrics.record_error(OPENAI_MODEL, time.monotonic() - opened, e)
+            raise
+        return stream, time.monotonic() - opened
     
-    # Wrap in paragraph tags
-    return f"<p>{text}</p>"
+    try:
+        with llm_gate.slot():
+            # Only opening the stream is retried, before anything is sent to the browser
+            stream, upstream_seconds = retry_openai(open_stream)
+            usage = None
+            chunks = iter(stream)
+            try:
+                while True:
+                    # Only reads from OpenAI are timed, not the browser taking each chunk
+                    read_started = time.monotonic()
+                    try:
+                        chunk = next(chunks, None)
+                    finally:
+                        upstream_seconds += time.monotonic() - read_started
+                    if chunk is None:
+                        break
+                    # With include_usage the last chunk has no choices, only the token counts
+                    if getattr(chunk, 'usage', None):
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        html = formatter.feed(delta)
+                        if html:
+                            yield 'chunk', html
+            except GeneratorExit:
+                # The browser went away before the translation finished
+                close = getattr(stream, 'close', None)
+                if close is not None:
+                    close()
+                # Nothing failed upstream, and a half-open breaker must still hear back from its trial
+                openai_breaker.record(False)
+                llm_metrics.record(OPENAI_MODEL, upstream_seconds, 'cancelled')
+                raise
+            except Exception as e:
+                openai_breaker.record(openai_breaker.is_failure(e))
+                llm_metrics.record_error(OPENAI_MODEL, upstream_seconds, e)
+                raise
+            openai_breaker.record(False)
+            llm_metrics.record(OPENAI_MODEL, upstream_seconds, 'success',
+                               prompt_tokens=getattr(usage, 'prompt_tokens', None),
+                               completion_tokens=getattr(usage, 'completion_tokens', None))
+    except (CircuitOpenError, OverloadedError) as e:
+        stale = translation_cache.get_stale(impression)
+        if stale is None:
+            raise
+        logger.warning(f"{e} Serving an expired cached translation")
+        yield 'done', stale
+        return
+    
+    tail = formatter.finish()
+    if tail:
+        yield 'chunk', tail
+    
+    events.log('openai_call', model=OPENAI_MODEL, stream=True,
+               latency_ms=round((time.monotonic() - started) * 1000),
+               debug={'raw_text': formatter.raw_text})
+    formatted_text = format_single_paragraph(formatter.raw_text)
+    translation_cache.set(impression, formatted_text)
+    near_duplicates.add(impression, formatted_text)
+    yield 'done', formatted_text
 
 @app.route('/')
 def index():
@@ -479,9 +514,69 @@ def index():
 
 @app.route('/health')
 def health():
-    """Health check to verify the blueprint is working"""
+    """Health check to verify the blueprint is working, with the OpenAI circuit state"""
     api_key_status = "Available" if os.environ.get("OPENAI_API_KEY") else "Missing"
-    return f"Radiology Tool Blueprint is healthy. OpenAI API Key: {api_key_status}"
+    breaker = openai_breaker.snapshot()
+    if request.args.get('format') == 'json':
+        return jsonify({'status': 'ok', 'openai_api_key': api_key_status, 'openai_circuit': breaker,
+                        'openai_in_flight': llm_gate.snapshot()})
+    return (f"Radiology Tool Blueprint is healthy. OpenAI API Key: {api_key_status}. "
+            f"OpenAI circuit: {breaker['state']} ({breaker['recent_failures']} of "
+            f"{breaker['recent_calls']} recent calls failed)")
+
+def new_translation_id():
+    """Create a unique ID for a translation"""
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    return f"trans_{timestamp}"
+
+def log_translation(translation_id, impression, translation):
+    """Record an impression and its translation in the translations log"""
+    events.log('translation', translation_id=translation_id, impression=impression, translation=translation)
+
+def run_translation_job(impression, translation_id):
+    """Job handler: translate an impression and log the outcome"""
+    try:
+        translation = _translate(impression)
+    except Exception as e:
+        log_translation(translation_id, impression, f"<p>Error in translation: {str(e)}</p>")
+        raise
+    log_translation(translation_id, impression, translation)
+    return translation
+
+# Worker pool that runs every translation, whether requested synchronously or as a job. It has as
+# many threads as OpenAI calls may be in flight, so the pool is never the narrower limit.
+job_queue = TranslationJobQueue(
+    handler=run_translation_job,
+    db_path=os.environ.get('TRANSLATION_JOBS_DB',
+                           os.path.join(os.path.dirname(__file__), 'translation_jobs.db')),
+    max_workers=int(os.environ.get('TRANSLATION_WORKERS', LLM_MAX_IN_FLIGHT)),
+    max_pending=int(os.environ.get('TRANSLATION_QUEUE_DEPTH', 50)),
+    job_timeout=float(os.environ.get('TRANSLATION_JOB_TIMEOUT', 90)),
+    result_ttl=float(os.environ.get('TRANSLATION_JOB_RESULT_TTL', 600))
+)
+
+# Limits for /translate/batch
+TRANSLATION_BATCH_MAX = int(os.environ.get('TRANSLATION_BATCH_MAX', 20))
+TRANSLATION_BATCH_CONCURRENCY = int(os.environ.get('TRANSLATION_BATCH_CONCURRENCY', 8))
+
+def get_impression():
+    """Read the impression from either a form post or a JSON body"""
+    if request.is_json:
+        return ((request.get_json(silent=True) or {}).get('impression') or '').strip()
+    return request.form.get('impression', '').strip()
+
+def shed_if_overloaded():
+    """503 when every OpenAI slot in this worker is busy and the waiting line is full"""
+    if llm_gate.saturated():
+        return queue_full_response(OverloadedError(llm_gate.name, llm_gate.max_wait))
+    return None
+
+def queue_full_response(error):
+    """503 telling the client to retry once the queue has drained"""
+    logger.warning(str(error))
+    response = jsonify({'error': 'The translation service is busy. Please try again shortly.'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
 
 @app.route('/translate', methods=['POST'])
 def translate():
@@ -491,33 +586,158 @@ def translate():
         if not impression:
             return jsonify({'error': 'No impression provided'}), 400
         
-        # Create a unique ID for this translation
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        translation_id = f"trans_{timestamp}"
+        translation_id = new_translation_id()
+        
+        try:
+            job_id = job_queue.submit(impression, translation_id)
+        except QueueFullError as e:
+            return queue_full_response(e)
         
-        translation = translate_radiology_impression(impression)
+        job = job_queue.wait(job_id)
         
-        # Log the impression and translation
-        logger.info(f"TRANSLATION ID: {translation_id}")
-        logger.info(f"ORIGINAL: {impression}")
-        logger.info(f"TRANSLATION: {translation}")
-        logger.info("-" * 80)
+        if job is None or job['status'] == 'timed_out':
+            return jsonify({
+                'error': 'The translation took too long. Please try again.',
+                'translation_id': translation_id
+            }), 504
         
-        # Also directly write to the log file as a backup
-        try:
-            with open(log_file, 'a') as f:
-                f.write(f"\n{datetime.now()} - TRANSLATION ID: {translation_id}\n")
-                f.write(f"ORIGINAL: {impression}\n")
-                f.write(f"TRANSLATION: {translation}\n")
-                f.write("-" * 80 + "\n")
-        except Exception as e:
-            logger.error(f"Error writing to log file: {e}")
+        if job['status'] == 'succeeded':
+            translation = job['translation']
+        else:
+            translation = f"<p>Error in translation: {job.get('error', 'unknown error')}</p>"
         
         return jsonify({
             'translation': translation,
             'translation_id': translation_id
         })
 
+def sse_event(event, data):
+    """Encode one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/translate/stream', methods=['POST'])
+def translate_stream():
+    """Stream a translation to the browser as Server-Sent Events"""
+    impression = get_impression()
+    
+    if not impression:
+        return jsonify({'error': 'No impression provided'}), 400
+    
+    overloaded = shed_if_overloaded()
+    if overloaded:
+        return overloaded
+    
+    translation_id = new_translation_id()
+    
+    def generate():
+        try:
+            for event, html in stream_translation(impression):
+                if event == 'done':
+                    log_translation(translation_id, impression, html)
+                    yield sse_event('done', {'translation': html, 'translation_id': translation_id})
+                else:
+                    yield sse_event('chunk', {'html': html})
+        except Exception as e:
+            logger.error(f"Error in streaming translation: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            translation = f"<p>Error in translation: {str(e)}</p>"
+            log_translation(translation_id, impression, translation)
+            yield sse_event('error', {'translation': translation, 'translation_id': translation_id})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/translate/batch', methods=['POST'])
+def translate_batch():
+    """
+    Translate several impressions at once. Duplicates are translated once,
+    distinct impressions run concurrently, and results come back in input order.
+    """
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('impressions'), list):
+        return jsonify({'error': 'A JSON body with an "impressions" list is required'}), 400
+    
+    impressions = data['impressions']
+    if not impressions:
+        return jsonify({'error': 'No impressions provided'}), 400
+    if len(impressions) > TRANSLATION_BATCH_MAX:
+        return jsonify({'error': f'Maximum {TRANSLATION_BATCH_MAX} impressions allowed per request'}), 400
+    
+    overloaded = shed_if_overloaded()
+    if overloaded:
+        return overloaded
+    
+    # Group the input positions of each distinct impression
+    batch_id = new_translation_id()
+    unique = {}
+    results = [None] * len(impressions)
+    for i, impression in enumerate(impressions):
+        if not isinstance(impression, str) or not impression.strip():
+            results[i] = {'index': i, 'error': f'Impression {i+1}: No impression provided'}
+            continue
+        key = normalize_impression(impression)
+        if key not in unique:
+            unique[key] = {'impression': impression.strip(),
+                           'translation_id': f"{batch_id}_{len(unique) + 1}",
+                           'indexes': []}
+        unique[key]['indexes'].append(i)
+    
+    logger.info(f"[{batch_id}] Translating {len(unique)} distinct impressions out of {len(impressions)}")
+    
+    if unique:
+        workers = min(TRANSLATION_BATCH_CONCURRENCY, len(unique))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='translation-batch') as executor:
+            futures = [(item, executor.submit(run_translation_job, item['impression'], item['translation_id']))
+                       for item in unique.values()]
+            for item, future in futures:
+                try:
+                    outcome = {'translation': future.result(), 'translation_id': item['translation_id']}
+                except Exception as e:
+                    outcome = {'error': f"Error in translation: {str(e)}", 'translation_id': item['translation_id']}
+                for i in item['indexes']:
+                    results[i] = dict(outcome, index=i)
+    
+    failed = sum(1 for result in results if 'error' in result)
+    return jsonify({
+        'results': results,
+        'summary': {
+            'total': len(impressions),
+            'distinct': len(unique),
+            'succeeded': len(impressions) - failed,
+            'failed': failed
+        }
+    })
+
+@app.route('/translate/jobs', methods=['POST'])
+def submit_translation_job():
+    """Queue a translation and return immediately with a job ID to poll"""
+    impression = get_impression()
+    
+    if not impression:
+        return jsonify({'error': 'No impression provided'}), 400
+    
+    translation_id = new_translation_id()
+    
+    try:
+        job_id = job_queue.submit(impression, translation_id)
+    except QueueFullError as e:
+        return queue_full_response(e)
+    
+    return jsonify({
+        'job_id': job_id,
+        'translation_id': translation_id,
+        'status': 'queued',
+        'status_url': url_for('radiology.translation_job_status', job_id=job_id)
+    }), 202
+
+@app.route('/translate/jobs/<job_id>', methods=['GET'])
+def translation_job_status(job_id):
+    """Report the status of a translation job, including the result once done"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job)
+
 @app.route('/feedback', methods=['POST'])
 def submit_feedback():
     """Handle user feedback submission"""
@@ -528,9 +748,6 @@ def submit_feedback():
         if not all(key in data for key in ['translation_id', 'original', 'translation', 'rating']):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        # Get existing feedback data
-        feedback_data = load_feedback()
-        
         # Add new feedback with timestamp
         feedback_entry = {
             'id': data['translation_id'],
@@ -541,54 +758,104 @@ def submit_feedback():
             'comment': data.get('comment', '')
         }
         
-        feedback_data.append(feedback_entry)
-        
-        # Save updated feedback data
-        save_feedback(feedback_data)
+        feedback_store.append(feedback_entry)
         
-        # Log the feedback to the text file
-        rating_text = "👍 THUMBS UP" if data['rating'] == 'thumbs_up' else "👎 THUMBS DOWN"
-        logger.info(f"FEEDBACK FOR: {data['translation_id']}")
-        logger.info(f"RATING: {rating_text}")
-        if data.get('comment'):
-            logger.info(f"COMMENT: {data.get('comment')}")
-        logger.info("-" * 80)
-        
-        # Also directly write to the log file as a backup
-        try:
-            with open(log_file, 'a') as f:
-                f.write(f"\n{datetime.now()} - FEEDBACK FOR: {data['translation_id']}\n")
-                f.write(f"RATING: {rating_text}\n")
-                if data.get('comment'):
-                    f.write(f"COMMENT: {data.get('comment')}\n")
-                f.write("-" * 80 + "\n")
-        except Exception as e:
-            logger.error(f"Error writing to log file: {e}")
+        events.log('feedback', translation_id=data['translation_id'], rating=data['rating'],
+                   comment=data.get('comment', ''))
         
         return jsonify({'success': True, 'message': 'Feedback submitted successfully'})
 
+def parse_time_param(name):
+    """Read a query parameter given as epoch seconds or an ISO date/datetime (UTC unless it has an offset)"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"'{name}' must be epoch seconds or an ISO date, got {value!r}")
+    # The rollup buckets are UTC, so a date without an offset means a UTC date
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
 @app.route('/feedback/stats', methods=['GET'])
 def feedback_stats():
-    """Get feedback statistics - for admin use"""
-    feedback_data = load_feedback()
-    
-    total = len(feedback_data)
-    thumbs_up = sum(1 for item in feedback_data if item['rating'] == 'thumbs_up')
-    thumbs_down = sum(1 for item in feedback_data if item['rating'] == 'thumbs_down')
-    
-    return jsonify({
-        'total_feedback': total,
-        'thumbs_up': thumbs_up,
-        'thumbs_down': thumbs_down,
-        'approval_rate': (thumbs_up / total) * 100 if total > 0 else 0
-    })
+    """
+    Get feedback statistics - for admin use. Optional since/until restrict the
+    range and bucket=hour|day adds a per-bucket breakdown.
+    """
+    try:
+        since = parse_time_param('since')
+        until = parse_time_param('until')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    bucket = request.args.get('bucket')
+    if bucket and bucket not in ('hour', 'day'):
+        return jsonify({'error': "'bucket' must be 'hour' or 'day'"}), 400
+    
+    def utc(ts):
+        return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+    
+    stats = feedback_store.stats(since, until)
+    if since is not None:
+        stats['since'] = utc(since)
+    if until is not None:
+        stats['until'] = utc(until)
+    if bucket:
+        stats['buckets'] = [
+            dict(item, start=utc(item['start']))
+            for item in feedback_store.buckets(bucket, since, until)
+        ]
+    return jsonify(stats)
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Get translation cache, request coalescing, near-duplicate and fast path statistics - for admin use"""
+    stats = translation_cache.stats()
+    stats['single_flight'] = single_flight.stats()
+    stats['near_duplicates'] = near_duplicates.stats()
+    stats['fast_path'] = fast_path.stats()
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """OpenAI call metrics for all workers in the Prometheus text format"""
+    return Response(llm_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/cache/clear', methods=['POST'])
+def clear_cache():
+    """Drop every cached translation - for admin use"""
+    translation_cache.invalidate()
+    near_duplicates.invalidate()
+    logger.info("Translation cache cleared")
+    return jsonify({'success': True, 'message': 'Translation cache cleared'})
 
 @app.route('/view-logs')
 def view_logs():
-    """View the translation and feedback logs"""
+    """
+    View the translation and feedback logs, newest page first. source picks
+    the translation and feedback records (default) or the activity log, limit
+    sets the page size and cursor (from the previous page) steps back to older
+    entries, including the rotated backups. format=json returns the page as JSON.
+    """
+    source = request.args.get('source', 'translations')
+    if source not in ('translations', 'activity'):
+        return jsonify({'error': "'source' must be 'translations' or 'activity'"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', LOG_PAGE_SIZE)), 1), MAX_LOG_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': "'limit' must be an integer"}), 400
+    cursor = request.args.get('cursor')
+    want_json = request.args.get('format') == 'json'
+    
     try:
         # Create log file if it doesn't exist
-        if not os.path.exists(log_file):
+        if source == 'activity' and not os.path.exists(log_file):
             try:
                 # Make sure the directory exists
                 os.makedirs(os.path.dirname(log_file), exist_ok=True)
@@ -598,28 +865,33 @@ def view_logs():
                     f.write(f"{datetime.now()} - INFO - No translations recorded yet.\n")
                 logger.info("Created new log file")
             except Exception as e:
-                return render_template('logs.html', log_content=f"<p>Error creating log file: {str(e)}</p>")
+                return render_template('logs.html', log_content=f"<p>Error creating log file: {html.escape(str(e))}</p>")
         
-        # Force a log entry to ensure the file has content
-        logger.info("Viewing logs page")
-        
-        # Read the log file - handle the case where it might be empty
-        with open(log_file, 'r') as f:
-            log_content = f.read()
+        try:
+            if source == 'activity':
+                page = read_log_page(log_file, limit=limit, cursor=cursor, backup_count=LOG_BACKUP_COUNT)
+            else:
+                page = read_log_page(translation_log_file, limit=limit, cursor=cursor,
+                                     backup_count=LOG_BACKUP_COUNT, entry_start=JSON_ENTRY_START)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
         
-        if not log_content.strip():
-            log_content = "No translations recorded yet."
-            # Try to write to the empty file
-            with open(log_file, 'w') as f:
-                f.write(f"{datetime.now()} - INFO - No translations recorded yet.\n")
+        if want_json:
+            return jsonify(page)
         
-        # Format the log content with HTML, ensuring proper escaping
-        log_content = log_content.replace('\n', '<br>')
+        # Only the page being shown is escaped, not the whole log
+        if page['entries']:
+            log_content = html.escape('\n'.join(page['entries']))
+        else:
+            log_content = "No older entries." if cursor else "No translations recorded yet."
         log_content = f'<pre style="white-space: pre-wrap; word-wrap: break-word;">{log_content}</pre>'
         
-        return render_template('logs.html', log_content=log_content)
+        older_url = url_for('.view_logs', source=source, cursor=page['cursor'], limit=limit) if page['cursor'] else None
+        newest_url = url_for('.view_logs', source=source, limit=limit) if cursor else None
+        return render_template('logs.html', log_content=log_content, older_url=older_url, newest_url=newest_url,
+                               source=source)
     except Exception as e:
-        error_message = f"<p>Error reading log file: {str(e)}</p>"
+        error_message = f"<p>Error reading log file: {html.escape(str(e))}</p>"
         # Try to log the error
         try:
             logger.error(f"Error in view_logs: {str(e)}")
@@ -0,0 +1,96 @@
+"""
+Splitting of long impressions into findings that can be translated apart.
+
+A report with many numbered findings produces a long completion, and a
+completion's latency grows with its length. Findings in an impression are
+mostly independent, so each one can be sent to the model on its own and the
+calls run at the same time; the explanations are then joined in report
+order and formatted once. The slowest finding sets the latency instead of
+the total length.
+
+Numbered findings ("1. ... 2. ...") are split at their numbers, but only
+when the numbers run 1, 2, 3 in order, so sizes such as "2. cm" or a level
+such as "L4." are never mistaken for an item. Without numbering the
+impression is split into sentences, and a sentence that refers back to the
+one before it ("This is unchanged.") stays with it. Neighbouring findings
+are merged when there are more than max_chunks of them.
+"""
+
+import re
+
+from radiologytool.utils import LEAD_IN
+
+ITEM_NUMBER = re.compile(r'(?:^|(?<=\s))(\d{1,2})[.)]\s+')
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.;])\s+(?=[A-Z0-9])')
+# Sentences starting like this depend on the previous one and are kept with it
+CONTINUATION = re.compile(r'(?:this|these|it|they|which|there has been no change|unchanged|stable|'
+                          r'again|also|otherwise|however|when|if|recommend|consider|follow-up)\b',
+                          re.IGNORECASE)
+ABBREVIATION = re.compile(r'\b(?:dr|vs|approx|e\.g|i\.e|no|fig)\.$', re.IGNORECASE)
+
+
+def _numbered_items(text):
+    """Items of a 1, 2, 3... numbered list, or None when the text is not one"""
+    starts = []
+    expected = 1
+    for match in ITEM_NUMBER.finditer(text):
+        if int(match.group(1)) == expected:
+            starts.append(match)
+            expected += 1
+    if len(starts) < 2 or text[:starts[0].start()].strip():
+        return None
+    items = []
+    for match, following in zip(starts, starts[1:] + [None]):
+        end = following.start() if following else len(text)
+        items.append(text[match.end():end].strip())
+    return [item for item in items if item]
+
+
+def _sentences(text):
+    """Sentences, with each continuation sentence joined to the one it follows"""
+    sentences = []
+    for part in SENTENCE_BOUNDARY.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        if sentences and (CONTINUATION.match(part) or ABBREVIATION.search(sentences[-1])):
+            sentences[-1] = f"{sentences[-1]} {part}"
+        else:
+            sentences.append(part)
+    return sentences
+
+
+def _merge(findings, max_chunks):
+    """Merge neighbouring findings into at most max_chunks groups of similar length"""
+    if len(findings) <= max_chunks:
+        return findings
+    target = sum(len(finding) for finding in findings) / max_chunks
+    chunks = []
+    current = []
+    size = 0
+    for i, finding in enumerate(findings):
+        current.append(finding)
+        size += len(finding)
+        # Close the group at the target size, or when the rest must each get their own
+        remaining_findings = len(findings) - i - 1
+        remaining_chunks = max_chunks - len(chunks) - 1
+        if remaining_chunks and (size >= target or remaining_findings == remaining_chunks):
+            chunks.append(' '.join(current))
+            current = []
+            size = 0
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def split_findings(impression, min_findings=3, max_chunks=6):
+    """
+    Independent findings of an impression, merged into at most max_chunks
+    chunks, or None when there are fewer than min_findings and the
+    impression should be translated in one call.
+    """
+    text = ' '.join(LEAD_IN.sub('', impression).split())
+    findings = _numbered_items(text) or _sentences(text)
+    if len(findings) < max(min_findings, 2):
+        return None
+    return _merge(findings, max_chunks)
@@ -0,0 +1,208 @@
+"""
+Local translations for trivial normal impressions.
+
+Stock negatives such as "No acute intracranial abnormality" or "Unremarkable
+study" make up a large share of impressions, and an LLM call for them is
+slow and wasteful. Here each sentence of an impression is matched in full
+against a small set of compiled phrase patterns, and when every sentence
+matches, a vetted plain-language sentence is produced for each one. Findings
+named in these sentences are explained from COMMON_MEDICAL_TERMS by the
+usual formatting step.
+
+Anything that is not fully understood, including any extra word, number or
+qualifier, returns None so that the impression goes to the model instead.
+"""
+
+import re
+import threading
+from functools import lru_cache
+
+from radiologytool.formatting import format_single_paragraph
+from radiologytool.utils import COMMON_MEDICAL_TERMS, LEAD_IN, NUMBERING
+
+# Region adjectives in "no acute <region> abnormality"
+REGIONS = {
+    'intracranial': 'inside the head',
+    'cardiopulmonary': 'in the heart or lungs',
+    'cardiac': 'in the heart',
+    'pulmonary': 'in the lungs',
+    'intrathoracic': 'in the chest',
+    'thoracic': 'in the chest',
+    'abdominal': 'in the belly',
+    'intra-abdominal': 'in the belly',
+    'abdominopelvic': 'in the belly or pelvis',
+    'pelvic': 'in the pelvis',
+    'osseous': 'in the bones',
+    'bony': 'in the bones',
+}
+
+# Body parts in "normal MRI of the <part>"
+BODY_PARTS = {
+    'brain': 'brain',
+    'head': 'head',
+    'chest': 'chest',
+    'abdomen': 'belly',
+    'pelvis': 'pelvis',
+    'abdomen and pelvis': 'belly and pelvis',
+    'cervical spine': 'neck',
+    'thoracic spine': 'upper back',
+    'lumbar spine': 'lower back',
+    'spine': 'spine',
+    'shoulder': 'shoulder',
+    'elbow': 'elbow',
+    'wrist': 'wrist',
+    'hand': 'hand',
+    'hip': 'hip',
+    'knee': 'knee',
+    'ankle': 'ankle',
+    'foot': 'foot',
+}
+
+# Findings that may be negated. Glossary terms are left as-is so the
+# formatter explains them; the rest carry their own explanation.
+NEGATABLE_GLOSSARY_TERMS = ('fracture', 'dislocation', 'hemorrhage', 'infarction', 'edema',
+                            'effusion', 'pneumonia', 'lesion', 'aneurysm', 'stenosis')
+EXTRA_FINDINGS = {
+    'pleural effusion': 'pleural effusion',
+    'pneumothorax': 'collapsed lung (pneumothorax)',
+    'focal consolidation': 'area of the lung filled with fluid or infection (consolidation)',
+    'consolidation': 'area of the lung filled with fluid or infection (consolidation)',
+    'mass': 'abnormal lump or growth (mass)',
+    'mass effect': 'pressure on nearby tissue (mass effect)',
+    'midline shift': 'shifting of the brain to one side (midline shift)',
+    'hydrocephalus': 'extra fluid around the brain (hydrocephalus)',
+}
+FINDINGS = {**{term: term for term in NEGATABLE_GLOSSARY_TERMS if term in COMMON_MEDICAL_TERMS}, **EXTRA_FINDINGS}
+
+STUDY = r'(?:study|exam|examination|scan|imaging|radiographs?|x-rays?|ct|cta|mri|mra|ultrasound)'
+NORMAL = r'(?:unremarkable|normal|negative|within normal limits)'
+PROBLEM = r'(?:abnormality|abnormalities|process|processes|finding|findings|pathology|disease)'
+
+
+def _alternation(words):
+    # Longest first so "pleural effusion" wins over "effusion"
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+REGION = f"(?P<region>{_alternation(REGIONS)})"
+PART = f"(?P<part>{_alternation(BODY_PARTS)})"
+FINDING = f"(?:{_alternation(FINDINGS)})"
+FINDING_PATTERN = re.compile(FINDING)
+
+
+def _region(match):
+    acute = 'acute ' if match.group('acute') else ''
+    return f"There are no signs of any {acute}problems {REGIONS[match.group('region')]}."
+
+
+def _normal_study(match):
+    part = match.groupdict().get('part')
+    if part:
+        return f"This scan of your {BODY_PARTS[part]} looks normal."
+    return "This scan looks normal."
+
+
+def _negated_findings(match):
+    findings = []
+    for finding in FINDING_PATTERN.findall(match.group('findings')):
+        text = FINDINGS[finding]
+        if text not in findings:
+            findings.append(text)
+    listed = findings[0] if len(findings) == 1 else f"{', '.join(findings[:-1])} or {findings[-1]}"
+    acute = 'acute ' if match.group('acute') else ''
+    return f"There is no sign of any {acute}{listed}."
+
+
+def _unchanged(match):
+    return "Nothing has changed since your last scan."
+
+
+def _mild_degeneration(match):
+    part = match.group('part')
+    where = f" in your {BODY_PARTS[part]}" if part else ''
+    return f"There are some mild degenerative changes{where}."
+
+
+def _boilerplate(match):
+    return ''
+
+
+# (compiled full-sentence pattern, renderer); sentences are lowercase with single spaces
+PHRASES = [
+    (re.compile(f"(?:there is )?no (?P<acute>acute )?{REGION} {PROBLEM}"), _region),
+    (re.compile(f"(?:the )?{STUDY}(?: of(?: the)? {PART})? (?:is |are )?{NORMAL}"), _normal_study),
+    (re.compile(f"{NORMAL} {STUDY}(?: of(?: the)? {PART})?"), _normal_study),
+    (re.compile(f"{NORMAL} {PART} {STUDY}"), _normal_study),
+    (re.compile(f"(?:there is )?no (?:evidence of |signs? of )?(?P<acute>acute )?"
+                f"(?P<findings>{FINDING}(?:(?:,|, or|, and| or| and) (?:acute )?{FINDING})*)"), _negated_findings),
+    (re.compile(r"(?:no (?:significant )?(?:interval )?change|unchanged|stable) "
+                r"(?:from|since|compared (?:to|with)) (?:the )?prior(?: " + STUDY + ")?"
+                r"|stable (?:exam|examination|study|appearance)"), _unchanged),
+    (re.compile(f"mild degenerative (?:change|changes)(?: (?:of|in) the {PART})?"), _mild_degeneration),
+    (re.compile(r"(?:clinical correlation (?:is )?recommended|correlate clinically|please correlate clinically)"),
+     _boilerplate),
+]
+
+SENTENCE_SPLIT = re.compile(r'[.;\n]+')
+
+
+def split_sentences(impression):
+    """Lowercased sentences with numbering, lead-in and extra spaces removed"""
+    text = NUMBERING.sub(' ', LEAD_IN.sub('', impression))
+    sentences = []
+    for part in SENTENCE_SPLIT.split(text):
+        sentence = ' '.join(part.lower().split()).strip(' ,')
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+
+@lru_cache(maxsize=1024)
+def _render(sentences):
+    output = []
+    for sentence in sentences:
+        for pattern, render in PHRASES:
+            match = pattern.fullmatch(sentence)
+            if match:
+                text = render(match)
+                if text and text not in output:
+                    output.append(text)
+                break
+        else:
+            return None
+    if not output:
+        return None
+    return format_single_paragraph(' '.join(output))
+
+
+class FastPath:
+    """Answers trivial impressions locally and counts how often it could"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def translate(self, impression):
+        """Return the HTML translation, or None when the impression needs the model"""
+        if not self.enabled:
+            return None
+        sentences = tuple(split_sentences(impression))
+        result = _render(sentences) if sentences else None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) * 100 if total > 0 else 0,
+        }
+
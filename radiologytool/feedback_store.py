@@ -0,0 +1,308 @@
+"""
+Append-only storage for translation feedback.
+
+Feedback is kept in a SQLite table in WAL mode, so adding an entry is a
+single INSERT no matter how much feedback already exists, and several worker
+processes can write at once without losing each other's entries. Entries
+from the old feedback_data.json file are imported once on first start.
+
+Counts are rolled up as entries are written: one running total plus hourly
+and daily buckets (UTC), updated in the same transaction as the insert, so
+the stats stay exact with any number of writers and a query touches at most
+a few dozen rows whatever the range.
+
+With write-behind enabled, entries are buffered in memory and written in
+batches by a background thread, which keeps bursts of feedback off the
+database lock at the cost of losing the buffered entries if the process is
+killed before the next flush.
+"""
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger('radiologytool.app')
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+HOUR = 3600
+DAY = 24 * HOUR
+BUCKET_SIZES = {'hour': HOUR, 'day': DAY}
+
+
+class FeedbackStore:
+    """SQLite-backed feedback log with optional write-behind batching"""
+
+    def __init__(self, db_path, legacy_path=None, write_behind=False, batch_size=50, flush_interval=1.0):
+        self.db_path = db_path
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._wake = threading.Event()
+        self._flusher = None
+        self._flusher_pid = None
+        self._init_db()
+        if legacy_path:
+            self._migrate(legacy_path)
+        if write_behind:
+            atexit.register(self.flush)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS feedback ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL, timestamp TEXT NOT NULL, "
+                "created_at REAL NOT NULL, original_text TEXT, translation TEXT, "
+                "rating TEXT NOT NULL, comment TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS feedback_created_at ON feedback (created_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY, applied_at REAL NOT NULL)")
+            # kind is 'all' (a single row at bucket 0), 'hour' or 'day'
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS feedback_rollups ("
+                "kind TEXT NOT NULL, bucket INTEGER NOT NULL, total INTEGER NOT NULL DEFAULT 0, "
+                "thumbs_up INTEGER NOT NULL DEFAULT 0, thumbs_down INTEGER NOT NULL DEFAULT 0, "
+                "comments INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (kind, bucket))"
+            )
+        finally:
+            conn.close()
+        self._backfill_rollups()
+
+    def _migrate_once(self, name, apply):
+        """Run apply(conn) inside a transaction unless the named migration already ran"""
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE makes concurrent workers take turns, so only one applies it
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone():
+                    conn.execute("COMMIT")
+                    return False
+                apply(conn)
+                conn.execute("INSERT INTO migrations (name, applied_at) VALUES (?, ?)", (name, time.time()))
+                conn.execute("COMMIT")
+                return True
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def _backfill_rollups(self):
+        """Build the rollups from feedback written before they existed"""
+        def apply(conn):
+            conn.execute("DELETE FROM feedback_rollups")
+            for kind, size in [('all', None)] + list(BUCKET_SIZES.items()):
+                bucket = f"CAST(created_at / {size} AS INTEGER) * {size}" if size else "0"
+                conn.execute(
+                    "INSERT INTO feedback_rollups (kind, bucket, total, thumbs_up, thumbs_down, comments) "
+                    f"SELECT ?, {bucket} AS b, COUNT(*), "
+                    "SUM(rating = 'thumbs_up'), SUM(rating = 'thumbs_down'), "
+                    "SUM(COALESCE(TRIM(comment), '') != '') "
+                    "FROM feedback GROUP BY b", (kind,)
+                )
+        self._migrate_once('feedback_rollups', apply)
+
+    @staticmethod
+    def _row(entry):
+        timestamp = entry.get('timestamp') or datetime.now().strftime(TIMESTAMP_FORMAT)
+        try:
+            created_at = datetime.strptime(timestamp, TIMESTAMP_FORMAT).timestamp()
+        except (TypeError, ValueError):
+            created_at = time.time()
+        return (entry['id'], timestamp, created_at, entry.get('original_text'),
+                entry.get('translation'), entry['rating'], entry.get('comment', ''))
+
+    def _insert(self, rows):
+        conn = self._connect()
+        try:
+            with conn:
+                self._insert_rows(conn, rows)
+        finally:
+            conn.close()
+
+    def _insert_rows(self, conn, rows):
+        """Insert rows and update the rollups inside the caller's transaction"""
+        conn.executemany(
+            "INSERT INTO feedback (id, timestamp, created_at, original_text, translation, rating, comment) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        increments = {}
+        for _, _, created_at, _, _, rating, comment in rows:
+            delta = (1, rating == 'thumbs_up', rating == 'thumbs_down', bool((comment or '').strip()))
+            keys = [('all', 0)] + [(kind, int(created_at // size) * size) for kind, size in BUCKET_SIZES.items()]
+            for key in keys:
+                current = increments.get(key, (0, 0, 0, 0))
+                increments[key] = tuple(a + b for a, b in zip(current, delta))
+        conn.executemany(
+            "INSERT INTO feedback_rollups (kind, bucket, total, thumbs_up, thumbs_down, comments) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (kind, bucket) DO UPDATE SET "
+            "total = total + excluded.total, thumbs_up = thumbs_up + excluded.thumbs_up, "
+            "thumbs_down = thumbs_down + excluded.thumbs_down, comments = comments + excluded.comments",
+            [key + counts for key, counts in increments.items()]
+        )
+
+    def _migrate(self, legacy_path):
+        """Import feedback_data.json once, then rename it so it is not mistaken for live data"""
+        if not os.path.exists(legacy_path):
+            return
+        imported = []
+
+        def apply(conn):
+            try:
+                with open(legacy_path, 'r') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not read {legacy_path} for migration: {e}")
+                entries = []
+            imported.extend(self._row(entry) for entry in entries if 'id' in entry and 'rating' in entry)
+            self._insert_rows(conn, imported)
+
+        if not self._migrate_once('feedback_json', apply):
+            return
+        logger.info(f"Migrated {len(imported)} feedback entries from {legacy_path}")
+        try:
+            os.replace(legacy_path, legacy_path + '.migrated')
+        except OSError as e:
+            logger.warning(f"Could not rename {legacy_path} after migration: {e}")
+
+    def _ensure_flusher(self):
+        """Start the flush thread lazily so forked workers get their own (call with the lock held)"""
+        pid = os.getpid()
+        if self._flusher_pid != pid:
+            # Entries buffered by the parent before a fork belong to the parent
+            self._buffer = []
+            self._flusher = None
+            self._flusher_pid = pid
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name='feedback-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Feedback flush failed, will retry: {e}")
+
+    def append(self, entry):
+        """Add one feedback entry (a dict in the feedback_data.json shape)"""
+        row = self._row(entry)
+        if not self.write_behind:
+            self._insert([row])
+            return
+        with self._lock:
+            self._ensure_flusher()
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write any buffered entries now, including a batch the flush thread is writing"""
+        with self._flush_lock:
+            with self._lock:
+                if self._flusher_pid != os.getpid():
+                    self._buffer = []
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            try:
+                self._insert(rows)
+            except sqlite3.Error:
+                with self._lock:
+                    self._buffer[:0] = rows
+                raise
+
+    def all(self):
+        """Every entry in the order it was written, in the feedback_data.json shape"""
+        self.flush()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, timestamp, original_text, translation, rating, comment FROM feedback ORDER BY seq"
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {'id': id_, 'timestamp': timestamp, 'original_text': original_text,
+             'translation': translation, 'rating': rating, 'comment': comment}
+            for id_, timestamp, original_text, translation, rating, comment in rows
+        ]
+
+    @staticmethod
+    def _summarize(total, thumbs_up, thumbs_down, comments):
+        return {
+            'total_feedback': total,
+            'thumbs_up': thumbs_up,
+            'thumbs_down': thumbs_down,
+            'comments': comments,
+            'approval_rate': (thumbs_up / total) * 100 if total > 0 else 0,
+        }
+
+    def stats(self, since=None, until=None):
+        """
+        Feedback counts, overall or for [since, until) given as epoch seconds.
+        Ranges are widened to whole hours; whole days inside the range are read
+        from the daily buckets and only the ragged ends from the hourly ones.
+        """
+        self.flush()
+        conn = self._connect()
+        try:
+            if since is None and until is None:
+                row = conn.execute("SELECT total, thumbs_up, thumbs_down, comments FROM feedback_rollups "
+                                   "WHERE kind = 'all'").fetchone()
+                return self._summarize(*(row or (0, 0, 0, 0)))
+
+            start = int(since // HOUR) * HOUR if since is not None else 0
+            end = -int(-until // HOUR) * HOUR if until is not None else 2 ** 62
+            day_start = -(-start // DAY) * DAY
+            day_end = end // DAY * DAY
+            if day_start < day_end:
+                ranges = [('hour', start, day_start), ('day', day_start, day_end), ('hour', day_end, end)]
+            else:
+                ranges = [('hour', start, end)]
+            totals = [0, 0, 0, 0]
+            for kind, low, high in ranges:
+                row = conn.execute(
+                    "SELECT COALESCE(SUM(total), 0), COALESCE(SUM(thumbs_up), 0), COALESCE(SUM(thumbs_down), 0), "
+                    "COALESCE(SUM(comments), 0) FROM feedback_rollups WHERE kind = ? AND bucket >= ? AND bucket < ?",
+                    (kind, low, high)
+                ).fetchone()
+                totals = [a + b for a, b in zip(totals, row)]
+            return self._summarize(*totals)
+        finally:
+            conn.close()
+
+    def buckets(self, kind, since=None, until=None, limit=1000):
+        """Per-hour or per-day counts in [since, until), oldest first, at most limit buckets"""
+        size = BUCKET_SIZES[kind]
+        start = int(since // size) * size if since is not None else 0
+        end = until if until is not None else 2 ** 62
+        self.flush()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT bucket, total, thumbs_up, thumbs_down, comments FROM feedback_rollups "
+                "WHERE kind = ? AND bucket >= ? AND bucket < ? ORDER BY bucket DESC LIMIT ?",
+                (kind, start, end, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(self._summarize(*counts), start=bucket) for bucket, *counts in reversed(rows)]
@@ -0,0 +1,626 @@
+"""
+Formatting of model output for the Radiology Translator.
+
+format_single_paragraph is built from small steps (lead-in stripping,
+vertebra annotation, glossary annotation and symptom removal) so that
+StreamingFormatter can apply the same steps to a completion while it is
+still arriving.
+"""
+
+import bisect
+import re
+from functools import lru_cache
+
+from radiologytool.glossary import MappedGlossary
+from radiologytool.utils import COMMON_MEDICAL_TERMS, GLOSSARY, MedicalTermIndex
+
+# Common conversational lead-ins
+LEAD_INS = [
+    "sure!", "sure,", "absolutely!", "absolutely,", "here's", "i can help", "i'll explain",
+    "let me explain", "let's break this down", "to put it simply", "in simple terms",
+    "the report shows", "this means that", "this indicates that", "based on the report",
+    "the radiology report indicates", "the findings show", "the findings indicate",
+]
+
+# Mentions of symptoms, causes, treatments, or risk factors
+SYMPTOM_PATTERNS = [
+    r'(?i)related symptoms[:\s]*.*$',
+    r'(?i)this can cause[^\.]*\.',
+    r'(?i)symptoms may include[^\.]*\.',
+    r'(?i)you might (feel|experience)[^\.]*\.',
+    r'(?i)this (may|might|can) lead to[^\.]*\.',
+    r'(?i)common symptoms[^\.]*\.',
+    r'(?i)you (may|might|can) feel[^\.]*\.',
+    r'(?i)you (may|might|can) notice[^\.]*\.',
+    r'(?i)this could result in[^\.]*\.',
+    r'(?i)this is (often|sometimes|usually) associated with[^\.]*\.',
+    r'(?i)patients (often|sometimes|usually) experience[^\.]*\.',
+    r'(?i)treatment (options|may|might|includes|involves)[^\.]*\.',
+    r'(?i)risk factors[^\.]*\.',
+    r'(?i)causes (of|for|include)[^\.]*\.'
+]
+
+SYMPTOM_REGEXES = [re.compile(pattern) for pattern in SYMPTOM_PATTERNS]
+
+# A sentence is complete once its closing punctuation is followed by whitespace
+SENTENCE_END_PATTERN = re.compile(r'[.!?]\s')
+
+
+def strip_lead_in(text):
+    """Remove a conversational lead-in from the first sentence"""
+    lower_text = text.lower()
+    first_sentence_end = lower_text.find('.')
+    if first_sentence_end > 0:
+        first_sentence = lower_text[:first_sentence_end]
+        for lead_in in LEAD_INS:
+            if lead_in in first_sentence:
+                # Remove the lead-in phrase and any text before it
+                start_pos = text.lower().find(lead_in)
+                end_pos = start_pos + len(lead_in)
+                # Skip to the next non-space character after the lead-in
+                while end_pos < len(text) and (text[end_pos].isspace() or text[end_pos] in ',:;'):
+                    end_pos += 1
+                text = text[end_pos:]
+                # Capitalize the first letter
+                if text:
+                    text = text[0].upper() + text[1:]
+                break
+    return text
+
+
+LUMBAR_RANGE_PATTERN = re.compile(r'(L[1-5])\s*[-–—]\s*(L[1-5])')
+EXPLAINED_VERTEBRA_PATTERN = re.compile(r'([TLC][1-9][0-2]?)\s*\(')
+VERTEBRA_RANGE_ANNOTATIONS = [
+    (LUMBAR_RANGE_PATTERN, r'\1-\2 (the area in your lower back)'),
+    (re.compile(r'(T[1-9][0-2]?)\s*[-–—]\s*(T[1-9][0-2]?)'), r'\1-\2 (the area in your middle back)'),
+    (re.compile(r'(C[1-7])\s*[-–—]\s*(C[1-7])'), r'\1-\2 (the area in your neck)'),
+]
+# Every standalone vertebra is explained as "lower back"; format_single_paragraph
+# output is cached, so that wording is kept until FORMATTER_VERSION changes
+STANDALONE_VERTEBRA_PATTERNS = [
+    re.compile(r'\b(L[1-5])\b(?!\s*[-–—]\s*[TLC][0-9])(?!\s*\()'),
+    re.compile(r'\b(T[1-9][0-2]?)\b(?!\s*[-–—]\s*[TLC][0-9])(?!\s*\()'),
+    re.compile(r'\b(C[1-7])\b(?!\s*[-–—]\s*[TLC][0-9])(?!\s*\()'),
+    re.compile(r'\b(S[1-5])\b(?!\s*[-–—]\s*[TLC][0-9])(?!\s*\()'),
+]
+
+
+def annotate_vertebrae(text, processed_vertebrae=None):
+    """
+    Explain vertebral levels and ranges. processed_vertebrae tracks the
+    levels already explained and may be shared across calls.
+    """
+    # Keep track of vertebrae we've already processed - to avoid double-explanation
+    if processed_vertebrae is None:
+        processed_vertebrae = set()
+    
+    # First pass - mark all vertebrae ranges for protection
+    # This pattern will mark things like "L4-L5" to protect them
+    vertebrae_ranges = LUMBAR_RANGE_PATTERN.findall(text)
+    
+    for v_range in vertebrae_ranges:
+        # Add each vertebra in the range to our processed set
+        processed_vertebrae.add(v_range[0])  # First vertebra (e.g., L4)
+        processed_vertebrae.add(v_range[1])  # Second vertebra (e.g., L5)
+    
+    # Handle any vertebrae patterns that already have parentheses
+    for match in EXPLAINED_VERTEBRA_PATTERN.finditer(text):
+        processed_vertebrae.add(match.group(1))
+    
+    # Ranges and standalone levels are collected as spans against the same text,
+    # so an inserted explanation cannot shift the offsets of a later match
+    rewriter = SpanRewriter(text)
+    
+    # Special case for vertebral levels that appear together (like "L4-L5")
+    # Replace them with a combined explanation instead of individual ones
+    for pattern, replacement in VERTEBRA_RANGE_ANNOTATIONS:
+        for match in pattern.finditer(text):
+            rewriter.add(match.start(), match.end(), match.expand(replacement))
+    
+    # Fix standalone vertebrae that are not part of a range and don't already have explanations
+    for pattern in STANDALONE_VERTEBRA_PATTERNS:
+        for match in pattern.finditer(text):
+            vertebra = match.group(1)
+            # Only replace if not already processed
+            if vertebra not in processed_vertebrae and rewriter.add(
+                    match.start(), match.end(), f"{vertebra} (a vertebra in your lower back)"):
+                processed_vertebrae.add(vertebra)
+    
+    return rewriter.apply()
+
+
+@lru_cache(maxsize=4096)
+def explanation_pattern(term):
+    """The term followed by an explanation in parentheses, compiled once per term"""
+    return re.compile(re.escape(term) + r'\s*\([^)]*\)', re.IGNORECASE)
+
+
+def has_explanation(term, text):
+    """Check whether a term is already followed by an explanation in parentheses"""
+    return explanation_pattern(term).search(text) is not None
+
+
+def annotate_glossary_sequential(text, explained_terms=None, glossary=COMMON_MEDICAL_TERMS):
+    """
+    Add a plain-language explanation after every glossary term that does not
+    already have one, one term at a time. This is the reference behaviour that
+    GlossaryAnnotator reproduces, and its fallback for inputs it cannot handle.
+    """
+    for term, explanation in glossary.items():
+        if has_explanation(term, text):
+            if explained_terms is not None:
+                explained_terms.add(term)
+            continue
+        if explained_terms is not None and term in explained_terms:
+            continue
+        # Check if the term is a standalone word and doesn't already have an explanation
+        term_pattern = r'\b' + re.escape(term) + r'\b(?!\s*[\(\{])'
+        if re.search(term_pattern, text, re.IGNORECASE):
+            # The term exists without an explanation in parentheses
+            replacement = f"{term} ({explanation})"
+            text = re.sub(term_pattern, replacement, text, flags=re.IGNORECASE)
+    return text
+
+
+class GlossaryAnnotator:
+    """
+    Annotates every glossary term in a single left-to-right pass.
+    
+    The text is split into words once and each word is looked up in a table
+    built at import, so the cost grows with the text rather than with
+    text x glossary. The result is identical to annotate_glossary_sequential,
+    including its quirks: a term counts as explained when it is the tail of
+    any word followed by "(" (so "bilateral (...)" also covers "lateral"),
+    and a term is left alone once an earlier term ending in it has been
+    annotated. That equivalence only holds when every term is a single
+    ASCII word, no two terms differ only in case, explanations contain no
+    brackets, backslashes or glossary terms, and every "(" in the text is
+    closed somewhere after it; anything else goes through the sequential
+    version.
+    
+    A MappedGlossary is too large to build these tables for or to scan term
+    by term, so its terms are found with a MedicalTermIndex instead (whole
+    words or their plurals, longest match first) and written as they appear
+    in the text. Every occurrence is annotated unless the term is already
+    followed by "(" or "{" somewhere in the text or is in explained_terms.
+    """
+    
+    WORD_PATTERN = re.compile(r'\w+')
+    BRACKET_AHEAD = re.compile(r'\s*[\(\{]')
+    
+    def __init__(self, glossary):
+        self.glossary = glossary
+        self.mapped = isinstance(glossary, MappedGlossary)
+        if self.mapped:
+            self.term_index = MedicalTermIndex(glossary)
+            self.single_pass = False
+            return
+        self.terms = list(glossary)
+        self.replacements = [f"{term} ({explanation})" for term, explanation in glossary.items()]
+        self.index = {term.lower(): i for i, term in enumerate(self.terms)}
+        # One capturing group per term, so lastindex identifies the term
+        self.alternation = re.compile('|'.join(f"({re.escape(term)})" for term in self.terms),
+                                      re.IGNORECASE)
+        lowered = [term.lower() for term in self.terms]
+        # Earlier terms whose annotation makes has_explanation() true for a later one
+        self.parents = [[j for j in range(i) if lowered[j].endswith(lowered[i])]
+                        for i in range(len(lowered))]
+        self.children = [[k for k in range(i + 1, len(lowered)) if lowered[i].endswith(lowered[k])]
+                         for i in range(len(lowered))]
+        self.single_pass = self._supports_single_pass()
+    
+    def _supports_single_pass(self):
+        if not self.terms or len(self.index) != len(self.terms):
+            return False
+        if not all(term.isascii() and re.fullmatch(r'\w+', term) for term in self.terms):
+            return False
+        whole_term = re.compile(r'\b(?:' + self.alternation.pattern + r')\b', re.IGNORECASE)
+        for explanation in self.glossary.values():
+            if any(c in explanation for c in '(){}\\') or whole_term.search(explanation):
+                return False
+        return True
+    
+    def _lookup(self, word):
+        """Index of the term that matches word case-insensitively, or None"""
+        if word.isascii():
+            return self.index.get(word.lower())
+        # re.IGNORECASE folds a few non-ASCII letters onto ASCII ones (e.g. the Kelvin sign)
+        match = self.alternation.fullmatch(word)
+        return match.lastindex - 1 if match else None
+    
+    def _annotate_mapped(self, text, explained_terms):
+        matches = []
+        explained = set()
+        for match in self.term_index.find(text):
+            ahead = self.BRACKET_AHEAD.match(text, match.end)
+            if ahead is None:
+                matches.append(match)
+            elif text[ahead.end() - 1] == '(':
+                explained.add(match.term)
+        if explained_terms is not None:
+            explained_terms.update(explained)
+            explained = explained | explained_terms
+        
+        pieces = []
+        last = 0
+        for match in matches:
+            if match.term in explained:
+                continue
+            pieces.append(text[last:match.end])
+            pieces.append(f" ({self.glossary[match.term]})")
+            last = match.end
+        pieces.append(text[last:])
+        return ''.join(pieces)
+    
+    def annotate(self, text, explained_terms=None):
+        """Same contract as annotate_glossary_sequential"""
+        if self.mapped:
+            return self._annotate_mapped(text, explained_terms)
+        if not self.single_pass or text.rfind('(') > text.rfind(')'):
+            return annotate_glossary_sequential(text, explained_terms, self.glossary)
+        
+        found = []
+        already_explained = set()
+        for match in self.WORD_PATTERN.finditer(text):
+            ahead = self.BRACKET_AHEAD.match(text, match.end())
+            if ahead is None:
+                index = self._lookup(match.group())
+                if index is not None:
+                    found.append((match.start(), match.end(), index))
+            elif text[ahead.end() - 1] == '(':
+                word = match.group()
+                for i in range(len(word)):
+                    index = self._lookup(word[i:])
+                    if index is not None:
+                        already_explained.add(index)
+        
+        annotated = set()
+        for index in sorted({index for _, _, index in found}):
+            if index in already_explained or any(j in annotated for j in self.parents[index]):
+                continue
+            if explained_terms is not None and self.terms[index] in explained_terms:
+                continue
+            annotated.add(index)
+        
+        if explained_terms is not None:
+            explained_terms.update(self.terms[i] for i in already_explained)
+            for index in annotated:
+                explained_terms.update(self.terms[k] for k in self.children[index])
+        
+        if not annotated:
+            return text
+        pieces = []
+        last = 0
+        for start, end, index in found:
+            if index in annotated:
+                pieces.append(text[last:start])
+                pieces.append(self.replacements[index])
+                last = end
+        pieces.append(text[last:])
+        return ''.join(pieces)
+
+
+GLOSSARY_ANNOTATOR = GlossaryAnnotator(GLOSSARY)
+
+
+def annotate_glossary(text, explained_terms=None):
+    """
+    Add a plain-language explanation after every glossary term that does not
+    already have one. explained_terms carries terms that arrived with their own
+    explanation in earlier text; those are left alone here as well.
+    """
+    return GLOSSARY_ANNOTATOR.annotate(text, explained_terms)
+
+
+def remove_symptom_mentions(text):
+    """Remove any mention of symptoms, causes, treatments, or risk factors"""
+    for pattern in SYMPTOM_REGEXES:
+        text = pattern.sub('', text)
+    return text
+
+
+def format_single_paragraph(text):
+    """
+    Format the translation as a single paragraph with HTML tags.
+    Also removes any remaining conversational lead-ins and ensures
+    technical terms have explanations in parentheses.
+    """
+    text = strip_lead_in(text)
+    text = annotate_vertebrae(text)
+    text = annotate_glossary(text)
+    
+    # If there are unbalanced parentheses, pass the text through without further cleanup
+    if text.count('(') != text.count(')'):
+        return f"<p>{text}</p>"
+    
+    text = remove_symptom_mentions(text)
+    
+    # Wrap in paragraph tags
+    return f"<p>{text}</p>"
+
+
+class StreamingFormatter:
+    """
+    Applies the format_single_paragraph steps to a completion as it streams in.
+    
+    Text is released one complete sentence at a time, because a sentence is
+    the smallest unit every step can work on safely. Nothing is released
+    before the first period, which is where lead-in stripping stops looking.
+    Vertebra and glossary state is carried from one sentence to the next.
+    The streamed text approximates the final result; callers should replace
+    it with format_single_paragraph(raw_text) once the stream ends.
+    """
+    
+    def __init__(self):
+        self.raw_text = ''
+        self._pending = ''
+        self._started = False
+        self._processed_vertebrae = set()
+        self._explained_terms = set()
+    
+    def _format(self, segment):
+        if not self._started:
+            self._started = True
+            segment = strip_lead_in(segment)
+        segment = annotate_vertebrae(segment, self._processed_vertebrae)
+        segment = annotate_glossary(segment, self._explained_terms)
+        return remove_symptom_mentions(segment)
+    
+    def feed(self, chunk):
+        """Add streamed text and return any newly completed, formatted sentences"""
+        self.raw_text += chunk
+        self._pending += chunk
+        
+        last_end = None
+        for match in SENTENCE_END_PATTERN.finditer(self._pending):
+            last_end = match.end()
+        if last_end is None:
+            return ''
+        # Lead-in stripping looks at everything before the first period
+        if not self._started and '.' not in self._pending[:last_end]:
+            return ''
+        
+        segment, self._pending = self._pending[:last_end], self._pending[last_end:]
+        return self._format(segment)
+    
+    def finish(self):
+        """Format whatever is left once the stream has ended"""
+        segment, self._pending = self._pending, ''
+        if not segment.strip():
+            return ''
+        return self._format(segment)
+
+
+# Anatomical locations and conditions explained by format_translation
+ANATOMICAL_TERMS = {
+    # Spine - these are handled separately above for the combined cases
+    r'\bL[1-5]\b': 'a vertebra in the lower back',
+    r'\bT[1-9][0-2]?\b': 'a vertebra in the middle back',
+    r'\bC[1-7]\b': 'a vertebra in the neck',
+    r'\bS[1-5]\b': 'part of the sacrum (base of the spine)',
+    
+    # Brain
+    r'\bfrontal lobe\b': 'the front part of the brain that controls thinking and movement',
+    r'\btemporal lobe\b': 'the side part of the brain that helps with hearing and memory',
+    r'\bparietal lobe\b': 'the top part of the brain that processes sensations',
+    r'\boccipital lobe\b': 'the back part of the brain that processes vision',
+    r'\bcerebellum\b': 'the lower back part of the brain that controls balance and coordination',
+    r'\bbrainstem\b': 'the part that connects the brain to the spinal cord and controls basic functions like breathing',
+    
+    # Chest
+    r'\bpulmonary\b': 'related to the lungs',
+    r'\baorta\b': 'the main blood vessel carrying blood from your heart',
+    r'\bventricle\b': 'a chamber of the heart',
+    r'\batrium\b': 'an upper chamber of the heart',
+    r'\bbronch(i|us)\b': 'the airways in the lungs',
+    
+    # Abdomen
+    r'\bhepatobiliary\b': 'related to the liver and bile ducts',
+    r'\bpancreas\b': 'an organ behind your stomach that helps with digestion',
+    r'\bspleen\b': 'an organ near your stomach that helps fight infection',
+    r'\bkidney\b': 'an organ that filters waste from your blood',
+    r'\bgallbladder\b': 'an organ that stores bile from your liver to help with digestion',
+    r'\bcolon\b': 'the large intestine',
+    
+    # Common conditions
+    r'\batrophy\b': 'shrinkage',
+    r'\bhypertrophy\b': 'enlargement',
+    r'\bstenosis\b': 'narrowing',
+    r'\binfarct\b': 'an area of damaged tissue due to lack of blood flow',
+    r'\blesion\b': 'an abnormal area of tissue',
+    r'\bnodule\b': 'a small rounded lump',
+    r'\beffusion\b': 'a buildup of fluid',
+    r'\bedema\b': 'swelling due to excess fluid',
+    r'\bhemorrhage\b': 'bleeding',
+    r'\bischemia\b': 'reduced blood flow'
+}
+
+# Disc levels between two vertebrae and how each region is described
+DISC_LEVEL_REGIONS = {'L': 'lower back', 'T': 'middle back', 'C': 'neck'}
+
+PARENTHESIS_PATTERN = re.compile(r'[()]')
+
+
+def balance_parentheses(text):
+    """
+    Repair parentheses in one left-to-right scan: nested groups are flattened
+    into their outermost pair, closing parentheses with nothing to close are
+    dropped, and a group still open at the end is closed.
+    """
+    pieces = []
+    depth = 0
+    last = 0
+    for match in PARENTHESIS_PATTERN.finditer(text):
+        pos = match.start()
+        if text[pos] == '(':
+            keep = depth == 0
+            depth += 1
+        else:
+            keep = depth == 1
+            depth = max(depth - 1, 0)
+        if not keep:
+            pieces.append(text[last:pos])
+            last = pos + 1
+    if not pieces and depth == 0:
+        return text
+    pieces.append(text[last:])
+    if depth:
+        pieces.append(')')
+    return ''.join(pieces)
+
+
+class SpanRewriter:
+    """
+    Collects replacements against one fixed text and applies them in one pass.
+    
+    Every span is expressed in offsets of the original text, so offsets never
+    go stale; a span that overlaps one added earlier is refused, which gives
+    earlier rules priority over later ones.
+    """
+    
+    def __init__(self, text):
+        self.text = text
+        self._starts = []
+        self._spans = []
+    
+    def add(self, start, end, replacement):
+        """Queue text[start:end] -> replacement; returns False if it overlaps"""
+        i = bisect.bisect_right(self._starts, start)
+        if i > 0 and self._spans[i - 1][1] > start:
+            return False
+        if i < len(self._spans) and self._spans[i][0] < end:
+            return False
+        self._starts.insert(i, start)
+        self._spans.insert(i, (start, end, replacement))
+        return True
+    
+    def apply(self):
+        """Build the rewritten text"""
+        if not self._spans:
+            return self.text
+        pieces = []
+        last = 0
+        for start, end, replacement in self._spans:
+            pieces.append(self.text[last:start])
+            pieces.append(replacement)
+            last = end
+        pieces.append(self.text[last:])
+        return ''.join(pieces)
+
+
+class TranslationFormatter:
+    """
+    The format_translation pipeline with every regex compiled once.
+    
+    Anatomical terms and disc levels are collected as spans against the same
+    text and written out in a single pass, so an explanation inserted for one
+    match can no longer shift the offsets of the next.
+    """
+    
+    def __init__(self, anatomical_terms=ANATOMICAL_TERMS):
+        # This pattern looks for text like "L4 (whiL5 (which is..." and fixes it
+        self.nested_pattern = re.compile(r'([A-Z][0-9])(\s*\(\s*whi[A-Z][0-9]\s*\()')
+        self.range_annotations = [
+            (re.compile(r'L([1-5])[- ]L([1-5])(?!\s*\()'), r'L\1-L\2 (the area in your lower back)'),
+            (re.compile(r'T([1-9][0-2]?)[- ]T([1-9][0-2]?)(?!\s*\()'), r'T\1-T\2 (the area in your middle back)'),
+            (re.compile(r'C([1-7])[- ]C([1-7])(?!\s*\()'), r'C\1-C\2 (the area in your neck)'),
+        ]
+        self.vertebra_annotations = [
+            (re.compile(r'\bL([1-5])\b(?!\s*[-–—]\s*L[1-5])(?!\s*\()'), r'L\1 (a vertebra in your lower back)'),
+            (re.compile(r'\bT([1-9][0-2]?)\b(?!\s*[-–—]\s*T[1-9])(?!\s*\()'), r'T\1 (a vertebra in your middle back)'),
+            (re.compile(r'\bC([1-7])\b(?!\s*[-–—]\s*C[1-7])(?!\s*\()'), r'C\1 (a vertebra in your neck)'),
+            (re.compile(r'\bS([1-5])\b(?!\s*[-–—]\s*S[1-5])(?!\s*\()'), r'S\1 (a vertebra at the base of your spine)'),
+        ]
+        # Only match terms that are not already followed by an explanation
+        self.anatomical_terms = [
+            (re.compile(pattern + r'(?!\s*[\(\{])', re.IGNORECASE), explanation)
+            for pattern, explanation in anatomical_terms.items()
+        ]
+        self.disc_level_pattern = re.compile(
+            r'\b(L[1-5]\s*-\s*L[1-5]|T[1-9][0-2]?\s*-\s*T[1-9][0-2]?|C[1-7]\s*-\s*C[1-7])\b(?!\s*\()'
+        )
+        self.asterisks = re.compile(r'\*+')
+        self.leading_hyphen = re.compile(r'^\s*-\s*')
+        self.bullet_list = re.compile(r'(?:\s*[•\*-]\s*[^\n]+\n?)+')
+        self.spaces = re.compile(r' +')
+        self.sentence_spacing = re.compile(r'\.\s+')
+    
+    def annotate_anatomy(self, text):
+        """Explain the first unexplained mention of each anatomical term and every bare disc level"""
+        rewriter = SpanRewriter(text)
+        annotated = set()
+        for pattern, explanation in self.anatomical_terms:
+            for match in pattern.finditer(text):
+                term = match.group(0)
+                key = term.lower()
+                if key in annotated or has_explanation(term, text):
+                    continue
+                if rewriter.add(match.start(), match.end(), f"{term} ({explanation})"):
+                    annotated.add(key)
+        
+        # Special handling for example: "L4-L5 resulting in" pattern
+        # Make sure the vertebrae with ranges are properly explained
+        for match in self.disc_level_pattern.finditer(text):
+            level = match.group(1)
+            region = DISC_LEVEL_REGIONS[level[0]]
+            rewriter.add(match.start(), match.end(),
+                         f"{level} (the area between these two bones in your {region})")
+        return rewriter.apply()
+    
+    def format(self, text):
+        """Format the translation as a paragraph; see format_translation"""
+        # Remove common conversational lead-ins
+        text = strip_lead_in(text)
+        
+        # First, clean up any problematic or nested explanations that might already exist
+        text = self.nested_pattern.sub(r'\1 (', text)
+        text = balance_parentheses(text)
+        
+        # Special case for vertebral levels that appear together (like "L4-L5")
+        # Replace them with a combined explanation instead of individual ones
+        for pattern, replacement in self.range_annotations:
+            text = pattern.sub(replacement, text)
+        
+        # Fix standalone vertebrae before applying the general rules
+        for pattern, replacement in self.vertebra_annotations:
+            text = pattern.sub(replacement, text)
+        
+        # Ensure every medical term has an explanation in parentheses if not already present
+        text = annotate_glossary(text)
+        text = self.annotate_anatomy(text)
+        
+        # Explanations added inside existing parentheses leave nested or unclosed groups
+        text = balance_parentheses(text)
+        
+        # Clean up any asterisks, stars, or bullet points
+        text = self.asterisks.sub('', text)
+        text = text.replace('•', '')
+        text = self.leading_hyphen.sub('', text)
+        
+        # Remove any mention of symptoms, causes, treatments, or risk factors
+        text = remove_symptom_mentions(text)
+        
+        # Remove any bullet list sections that might appear in the text
+        text = self.bullet_list.sub(' ', text)
+        
+        # Clean up multiple spaces and ensure proper sentence spacing
+        text = self.spaces.sub(' ', text)
+        text = self.sentence_spacing.sub('. ', text)
+        
+        # Final check for any trailing symbols
+        text = text.rstrip('*• \t\n-')
+        
+        # Wrap in paragraph tags
+        return f"<p>{text}</p>"
+
+
+TRANSLATION_FORMATTER = TranslationFormatter()
+
+
+def format_translation(text):
+    """
+    Format the translation by adding proper HTML tags and styling.
+    Also removes any remaining conversational lead-ins and ensures
+    technical terms have explanations in parentheses.
+    """
+    return TRANSLATION_FORMATTER.format(text)
@@ -0,0 +1,217 @@
+"""
+On-disk glossary for large term lists.
+
+The built-in glossary is a small dict. A glossary of tens of thousands of
+terms would cost every worker its own copy of the dict and the time to
+build it, so large glossaries are compiled into one file instead. Records
+are sorted by key and found by binary search through a table of offsets.
+The file is memory-mapped on first use, so nothing is parsed at startup and
+all workers on a host share the same pages.
+
+Keys are the lowercase word tokens of a term joined by single spaces, so
+"Disc-Bulge" and "disc bulge" are the same term. Build a glossary file from
+a TSV (term<TAB>explanation) or a JSON object with
+
+    python -m radiologytool.glossary terms.tsv glossary.bin
+
+and point RADIOLOGY_GLOSSARY at it. The built-in terms are included unless
+--no-builtin is given; terms in the input win.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+from collections.abc import Mapping
+from functools import lru_cache
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+MAGIC = b'RGLOSS1\n'
+# magic, entry count, most words in a term, sha256 of the records
+HEADER = struct.Struct('<8sII32s')
+OFFSET = struct.Struct('<Q')
+SEPARATOR = b'\x1f'
+
+
+def normalize_term(term):
+    """The lookup key of a term: lowercase word tokens joined by single spaces"""
+    return ' '.join(TOKEN_PATTERN.findall(term.lower()))
+
+
+def build_glossary(entries, path):
+    """Write (term, explanation) pairs to a glossary file; the first entry for a key wins"""
+    records = {}
+    for term, explanation in entries:
+        key = normalize_term(term)
+        if key and key not in records:
+            records[key] = (term.strip(), ' '.join(explanation.split()))
+    keys = sorted(records, key=lambda key: key.encode('utf-8'))
+
+    data = bytearray()
+    offsets = []
+    for key in keys:
+        term, explanation = records[key]
+        offsets.append(len(data))
+        data += SEPARATOR.join(part.encode('utf-8') for part in (key, term, explanation)) + b'\n'
+    offsets.append(len(data))
+    max_words = max((len(key.split()) for key in keys), default=0)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.glossary-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(keys), max_words, hashlib.sha256(data).digest()))
+            for offset in offsets:
+                f.write(OFFSET.pack(offset))
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(keys)
+
+
+class MappedGlossary(Mapping):
+    """
+    Read-only {term: explanation} mapping over a glossary file. The file is
+    opened and mapped on first access; lookups are case-insensitive.
+    """
+
+    def __init__(self, path, cache_size=65536):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mm = None
+        self._digest = None
+        self._find = lru_cache(maxsize=cache_size)(self._bisect)
+
+    def _open(self):
+        if self._mm is not None:
+            return self._mm
+        with self._lock:
+            if self._mm is None:
+                with open(self.path, 'rb') as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    count, max_words, digest = self._unpack_header(mm[:HEADER.size])
+                except ValueError:
+                    mm.close()
+                    raise
+                self._count = count
+                self._max_words = max_words
+                self._digest = digest.hex()
+                self._data_start = HEADER.size + (count + 1) * OFFSET.size
+                self._mm = mm
+        return self._mm
+
+    def _unpack_header(self, header):
+        if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a glossary file")
+        return HEADER.unpack(header)[1:]
+
+    def _offset(self, i):
+        return OFFSET.unpack_from(self._mm, HEADER.size + i * OFFSET.size)[0] + self._data_start
+
+    def _key(self, i):
+        start = self._offset(i)
+        return self._mm[start:self._mm.find(SEPARATOR, start)]
+
+    def _record(self, i):
+        start = self._offset(i)
+        end = self._offset(i + 1) - 1
+        key, term, explanation = self._mm[start:end].split(SEPARATOR)
+        return term.decode('utf-8'), explanation.decode('utf-8')
+
+    def _bisect(self, key):
+        """Position of the first record whose key is not less than key"""
+        self._open()
+        target = key.encode('utf-8')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, key):
+        """(position, term, explanation) for a normalized key, or None"""
+        position = self._find(key)
+        if position < self._count and self._key(position) == key.encode('utf-8'):
+            return (position,) + self._record(position)
+        return None
+
+    def has_prefix(self, key):
+        """Whether any key starts with the given normalized key"""
+        position = self._find(key)
+        return position < self._count and self._key(position).startswith(key.encode('utf-8'))
+
+    def position(self, term):
+        """Sort position of a term in the file, or None"""
+        found = self.lookup(normalize_term(term))
+        return found[0] if found else None
+
+    @property
+    def max_words(self):
+        self._open()
+        return self._max_words
+
+    @property
+    def digest(self):
+        """sha256 of the records, read from the header without mapping the file"""
+        if self._digest is None:
+            with open(self.path, 'rb') as f:
+                self._digest = self._unpack_header(f.read(HEADER.size))[2].hex()
+        return self._digest
+
+    def __getitem__(self, term):
+        found = self.lookup(normalize_term(term))
+        if found is None:
+            raise KeyError(term)
+        return found[2]
+
+    def __len__(self):
+        self._open()
+        return self._count
+
+    def __iter__(self):
+        self._open()
+        for i in range(self._count):
+            yield self._record(i)[0]
+
+    def __repr__(self):
+        return f"MappedGlossary(sha256={self.digest})"
+
+
+def _read_entries(path):
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            return list(json.load(f).items())
+    with open(path, encoding='utf-8', newline='') as f:
+        return [(row[0], row[1]) for row in csv.reader(f, delimiter='\t') if len(row) >= 2 and row[0].strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build a glossary file for RADIOLOGY_GLOSSARY')
+    parser.add_argument('source', help='TSV of term<TAB>explanation, or a JSON object of {term: explanation}')
+    parser.add_argument('output', help='glossary file to write')
+    parser.add_argument('--no-builtin', action='store_true', help='leave out the built-in glossary terms')
+    args = parser.parse_args(argv)
+
+    entries = _read_entries(args.source)
+    if not args.no_builtin:
+        from radiologytool.utils import COMMON_MEDICAL_TERMS
+        entries += list(COMMON_MEDICAL_TERMS.items())
+    count = build_glossary(entries, args.output)
+    print(f"Wrote {count} terms to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+Background job queue for radiology translations.
+
+Jobs run on a thread pool owned by the worker process that accepted them.
+Their state is kept in SQLite so a status poll can be answered by any
+worker, not only the one running the job.
+
+A job that times out cannot be stopped mid-call, but it is flagged: a queued
+job then finishes without running, and a running one raises JobCancelledError
+at its next raise_if_cancelled() check, which the translation code makes
+before every upstream call and retry.
+"""
+
+import contextvars
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger('radiologytool.app')
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class QueueFullError(Exception):
+    """Raised when a worker already has as many jobs as it may hold"""
+
+
+class JobCancelledError(Exception):
+    """Raised inside a job that has timed out, so it makes no further upstream calls"""
+
+
+# (deadline, cancelled event) of the job running in this context
+_current_job = contextvars.ContextVar('translation_job', default=None)
+
+
+def raise_if_cancelled():
+    """Raise JobCancelledError when called from a job that has timed out"""
+    job = _current_job.get()
+    if job is not None:
+        deadline, cancelled = job
+        if cancelled.is_set() or time.time() > deadline:
+            raise JobCancelledError('Translation job timed out')
+
+
+class TranslationJobQueue:
+    """Bounded thread pool that runs translations and records their outcome"""
+
+    def __init__(self, handler, db_path, max_workers=8, max_pending=50,
+                 job_timeout=90, result_ttl=600):
+        self.handler = handler
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_timeout = job_timeout
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._events = {}
+        self._cancelled = {}
+        self._executor = None
+        self._executor_pid = None
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, translation_id TEXT, status TEXT NOT NULL, "
+                "result TEXT, error TEXT, created_at REAL NOT NULL, started_at REAL, "
+                "finished_at REAL, deadline REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _execute(self, sql, params=()):
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, params).rowcount
+        finally:
+            conn.close()
+
+    def _get_executor(self):
+        """Create the thread pool lazily so forked workers get their own"""
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='translation-job')
+            self._executor_pid = pid
+            self._pending = 0
+            self._events = {}
+            self._cancelled = {}
+        return self._executor
+
+    def submit(self, impression, translation_id=None):
+        """Queue a translation and return its job id"""
+        with self._lock:
+            executor = self._get_executor()
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Translation queue is full ({self.max_pending} jobs pending)")
+            self._pending += 1
+
+            job_id = uuid.uuid4().hex
+            self._events[job_id] = threading.Event()
+            cancelled = self._cancelled[job_id] = threading.Event()
+
+        now = time.time()
+        deadline = now + self.job_timeout
+        try:
+            self._execute("DELETE FROM jobs WHERE expires_at <= ?", (now,))
+            self._execute(
+                "INSERT INTO jobs (id, translation_id, status, created_at, deadline, expires_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, translation_id, now, deadline, deadline + self.result_ttl)
+            )
+            executor.submit(self._run, job_id, impression, translation_id, deadline, cancelled)
+        except Exception:
+            self._release(job_id)
+            raise
+        return job_id
+
+    def _release(self, job_id):
+        with self._lock:
+            self._pending -= 1
+            event = self._events.pop(job_id, None)
+            self._cancelled.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        """Record a final state unless a poller already timed the job out"""
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ? "
+            "WHERE id = ? AND status IN ('queued', 'running')",
+            (status, result, error, now, now + self.result_ttl, job_id)
+        )
+
+    def cancel(self, job_id):
+        """Flag a job of this process so it stops before its next upstream call"""
+        with self._lock:
+            cancelled = self._cancelled.get(job_id)
+        if cancelled is not None:
+            cancelled.set()
+
+    def _run(self, job_id, impression, translation_id, deadline, cancelled):
+        token = _current_job.set((deadline, cancelled))
+        try:
+            if cancelled.is_set() or time.time() > deadline:
+                self._finish(job_id, 'timed_out', error='Job waited too long in the queue')
+                return
+            self._execute("UPDATE jobs SET status = 'running', started_at = ? "
+                          "WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+            try:
+                result = self.handler(impression, translation_id)
+            except JobCancelledError:
+                logger.info(f"Translation job {job_id} stopped after timing out")
+                self._finish(job_id, 'timed_out', error='Translation timed out')
+            except Exception as e:
+                logger.error(f"Translation job {job_id} failed: {e}", exc_info=True)
+                self._finish(job_id, 'failed', error=str(e))
+            else:
+                self._finish(job_id, 'succeeded', result=result)
+        except Exception as e:
+            logger.error(f"Could not record translation job {job_id}: {e}", exc_info=True)
+        finally:
+            _current_job.reset(token)
+            self._release(job_id)
+
+    def get(self, job_id):
+        """Return a snapshot of a job, or None if it is unknown or expired"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT status, deadline FROM jobs WHERE id = ? AND expires_at > ?",
+                (job_id, now)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] in ACTIVE_STATUSES and now > row[1]:
+                self.cancel(job_id)
+                with conn:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'timed_out', error = 'Translation timed out', "
+                        "finished_at = ?, expires_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                        (now, now + self.result_ttl, job_id)
+                    )
+            row = conn.execute(
+                "SELECT translation_id, status, result, error, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+
+        if row is None:
+            return None
+        translation_id, status, result, error, created_at, started_at, finished_at = row
+
+        def iso(ts):
+            return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+        job = {
+            'job_id': job_id,
+            'translation_id': translation_id,
+            'status': status,
+            'created_at': iso(created_at),
+            'started_at': iso(started_at),
+            'finished_at': iso(finished_at),
+        }
+        if status == 'succeeded':
+            job['translation'] = result
+        if error:
+            job['error'] = error
+        return job
+
+    def wait(self, job_id):
+        """Block until a job running in this process finishes, or flag it once it times out"""
+        with self._lock:
+            event = self._events.get(job_id)
+        if event is not None and not event.wait(self.job_timeout):
+            self.cancel(job_id)
+        return self.get(job_id)
+
+    def shutdown(self, wait=True):
+        """Stop accepting work and optionally wait for running jobs"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._executor_pid == os.getpid():
+            executor.shutdown(wait=wait)
@@ -0,0 +1,211 @@
+"""
+Telemetry for OpenAI chat-completion calls, exposed in Prometheus text format.
+
+Every call adds to a latency histogram and to request, token, cost, error
+and timeout counters, labelled by model. The counters live in a SQLite file
+shared by every worker process on the host, so a scrape that lands on any
+worker reports totals for the whole deployment instead of that worker's
+share. Each call is one small upsert transaction, which is negligible next
+to the call itself, and a failing metrics store never fails a translation.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('radiologytool.app')
+
+# Upper bounds in seconds for the latency histogram
+DEFAULT_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+# Estimated USD per 1K tokens as (prompt, completion); override with LLM_PRICES
+DEFAULT_PRICES = {
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+    'gpt-4o-mini': (0.00015, 0.0006),
+    'gpt-4o': (0.0025, 0.01),
+    'gpt-4-turbo': (0.01, 0.03),
+    'gpt-4': (0.03, 0.06),
+}
+
+PREFIX = 'radiology_llm'
+
+# name: (type, help)
+FAMILIES = {
+    f'{PREFIX}_request_duration_seconds': ('histogram', 'Duration of OpenAI chat completion calls'),
+    f'{PREFIX}_requests_total': ('counter', 'OpenAI chat completion calls by outcome'),
+    f'{PREFIX}_errors_total': ('counter', 'Failed OpenAI calls by exception type, timeouts included'),
+    f'{PREFIX}_timeouts_total': ('counter', 'OpenAI calls that timed out'),
+    f'{PREFIX}_tokens_total': ('counter', 'Tokens reported in response.usage'),
+    f'{PREFIX}_cost_usd_total': ('counter', 'Estimated cost of OpenAI calls in US dollars'),
+}
+
+
+def load_prices(value):
+    """Merge a JSON object of {model: [prompt, completion]} per-1K prices over the defaults"""
+    prices = dict(DEFAULT_PRICES)
+    if value:
+        try:
+            prices.update({model: tuple(pair) for model, pair in json.loads(value).items()})
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Ignoring invalid LLM_PRICES: {e}")
+    return prices
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_label(value)}"' for name, value in labels.items())
+
+
+def _tokens(usage, field):
+    value = getattr(usage, field, None)
+    return value if isinstance(value, int) else None
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class LLMCall:
+    """Filled in by the caller while a call is observed"""
+
+    def __init__(self):
+        self.usage = None
+
+
+class LLMMetrics:
+    """Cross-worker counters and histograms for LLM calls"""
+
+    def __init__(self, db_path, buckets=DEFAULT_BUCKETS, prices=None, timeout_errors=(TimeoutError,)):
+        self.db_path = db_path
+        self.buckets = tuple(sorted(buckets))
+        self.prices = prices if prices is not None else dict(DEFAULT_PRICES)
+        self.timeout_errors = timeout_errors
+        self._enabled = self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_metrics ("
+                    "name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, "
+                    "PRIMARY KEY (name, labels))"
+                )
+            finally:
+                conn.close()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"LLM metrics disabled: {e}")
+            return False
+
+    def estimate_cost(self, model, prompt_tokens, completion_tokens):
+        """Estimated USD for the tokens, or None for a model without a price"""
+        price = self.prices.get(model)
+        if price is None:
+            return None
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1000
+
+    def record(self, model, duration, outcome, prompt_tokens=None, completion_tokens=None, error=None):
+        """Add one call; outcome is 'success', 'error', 'timeout' or 'cancelled' (the client went away)"""
+        if not self._enabled:
+            return
+        base = _labels(model=model, outcome=outcome)
+        histogram = f'{PREFIX}_request_duration_seconds'
+        increments = [
+            (f'{PREFIX}_requests_total', base, 1),
+            (f'{histogram}_count', base, 1),
+            (f'{histogram}_sum', base, duration),
+            (f'{histogram}_bucket', f'{base},le="+Inf"', 1),
+        ]
+        increments += [(f'{histogram}_bucket', f'{base},le="{bound}"', 1)
+                       for bound in self.buckets if duration <= bound]
+        if error:
+            increments.append((f'{PREFIX}_errors_total', _labels(model=model, type=error), 1))
+        if outcome == 'timeout':
+            increments.append((f'{PREFIX}_timeouts_total', _labels(model=model), 1))
+        if prompt_tokens is not None and completion_tokens is not None:
+            increments.append((f'{PREFIX}_tokens_total', _labels(model=model, type='prompt'), prompt_tokens))
+            increments.append((f'{PREFIX}_tokens_total', _labels(model=model, type='completion'), completion_tokens))
+            cost = self.estimate_cost(model, prompt_tokens, completion_tokens)
+            if cost is not None:
+                increments.append((f'{PREFIX}_cost_usd_total', _labels(model=model), cost))
+
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO llm_metrics (name, labels, value) VALUES (?, ?, ?) "
+                        "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+                        increments
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not record LLM metrics: {e}")
+
+    def record_error(self, model, duration, error):
+        """Add one call that failed with the given exception, as a timeout or an error"""
+        outcome = 'timeout' if isinstance(error, self.timeout_errors) else 'error'
+        self.record(model, duration, outcome, error=type(error).__name__)
+
+    @contextmanager
+    def observe(self, model):
+        """
+        Time the block as one call. Set .usage on the yielded object to the
+        response's usage to count tokens and cost; exceptions are counted as
+        errors or timeouts and re-raised.
+        """
+        call = LLMCall()
+        started = time.monotonic()
+        try:
+            yield call
+        except Exception as e:
+            self.record_error(model, time.monotonic() - started, e)
+            raise
+        self.record(model, time.monotonic() - started, 'success',
+                    prompt_tokens=_tokens(call.usage, 'prompt_tokens'),
+                    completion_tokens=_tokens(call.usage, 'completion_tokens'))
+
+    def values(self):
+        """Every stored series as {(name, labels): value}"""
+        if not self._enabled:
+            return {}
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT name, labels, value FROM llm_metrics").fetchall()
+        finally:
+            conn.close()
+        return {(name, labels): value for name, labels, value in rows}
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        values = self.values()
+        lines = []
+        for family, (kind, help_text) in FAMILIES.items():
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            if kind == 'histogram':
+                label_sets = sorted(labels for name, labels in values if name == f'{family}_count')
+                for labels in label_sets:
+                    for bound in [str(bound) for bound in self.buckets] + ['+Inf']:
+                        value = values.get((f'{family}_bucket', f'{labels},le="{bound}"'), 0)
+                        lines.append(f'{family}_bucket{{{labels},le="{bound}"}} {_format_value(value)}')
+                    lines.append(f'{family}_sum{{{labels}}} {_format_value(values[(f"{family}_sum", labels)])}')
+                    lines.append(f'{family}_count{{{labels}}} {_format_value(values[(f"{family}_count", labels)])}')
+            else:
+                for (name, labels), value in sorted(values.items()):
+                    if name == family:
+                        lines.append(f'{family}{{{labels}}} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,100 @@
+"""
+Backwards, paginated reading of the translation log.
+
+The log is written by a RotatingFileHandler, so it is the live file plus up
+to backup_count rotated copies (.1 newest, .3 oldest). A page is read by
+seeking to the end of a file and reading fixed-size blocks towards the
+start until enough entries are collected, then continuing into the next
+older backup. Memory use depends on the page size, not the log size.
+
+In the activity log an entry is a line that starts with a timestamp
+together with any lines that follow it up to the next timestamp, so
+multi-line messages stay together; in the JSON lines log every line is one
+entry. The cursor names the file by inode rather than by position in the
+rotation, which keeps it valid when the files are renamed by a rollover.
+"""
+
+import os
+import re
+
+ENTRY_START = re.compile(rb'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}')
+JSON_ENTRY_START = re.compile(rb'^\{')
+BLOCK_SIZE = 64 * 1024
+
+
+def log_files(path, backup_count=3):
+    """The live log and its rotated backups that exist, newest first"""
+    candidates = [path] + [f"{path}.{i}" for i in range(1, backup_count + 1)]
+    return [candidate for candidate in candidates if os.path.exists(candidate)]
+
+
+def _reverse_lines(f, end, block_size):
+    """Yield (offset, line) from end back to the start of the file, newest first"""
+    pending = b''
+    position = end
+    while position > 0:
+        read_size = min(block_size, position)
+        position -= read_size
+        f.seek(position)
+        chunk = f.read(read_size) + pending
+        lines = chunk.split(b'\n')
+        # The first piece may be the tail of a line that starts in an earlier block
+        pending = lines[0]
+        offset = position + len(chunk)
+        for line in reversed(lines[1:]):
+            offset -= len(line) + 1
+            yield offset + 1, line
+    yield 0, pending
+
+
+def _parse_cursor(cursor):
+    inode, _, offset = cursor.partition(':')
+    return int(inode), int(offset)
+
+
+def read_log_page(path, limit=200, cursor=None, backup_count=3, block_size=BLOCK_SIZE, entry_start=ENTRY_START):
+    """
+    Return up to limit entries that end before cursor (the newest entries if
+    cursor is None), oldest first, plus the cursor for the page before them:
+    {'entries': [...], 'cursor': str or None}. entry_start matches the first
+    line of an entry. Raises ValueError for a malformed cursor.
+    """
+    files = log_files(path, backup_count)
+    inodes = [os.stat(name).st_ino for name in files]
+
+    start_index, start_offset = 0, None
+    if cursor:
+        inode, start_offset = _parse_cursor(cursor)
+        if inode not in inodes:
+            # The file the cursor points into has been rotated away
+            return {'entries': [], 'cursor': None}
+        start_index = inodes.index(inode)
+
+    entries = []
+    next_cursor = None
+    for index in range(start_index, len(files)):
+        with open(files[index], 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            end = size if index != start_index or start_offset is None else min(start_offset, size)
+            continuation = []
+            for offset, line in _reverse_lines(f, end, block_size):
+                if offset == end and not line:
+                    # The newline that ends the file (or the page) is not a line of its own
+                    continue
+                continuation.append(line)
+                if entry_start.match(line) or offset == 0:
+                    entries.append(b'\n'.join(reversed(continuation)))
+                    continuation = []
+                    if len(entries) == limit:
+                        if offset > 0:
+                            next_cursor = f"{inodes[index]}:{offset}"
+                        elif index + 1 < len(files):
+                            next_cursor = f"{inodes[index + 1]}:{os.stat(files[index + 1]).st_size}"
+                        break
+        if len(entries) == limit:
+            break
+
+    return {
+        'entries': [entry.decode('utf-8', errors='replace').rstrip() for entry in reversed(entries)],
+        'cursor': next_cursor,
+    }
@@ -0,0 +1,304 @@
+"""
+Near-duplicate lookup of earlier translations.
+
+Impressions that mean the same thing often differ in ways an exact-match
+cache cannot see: "L4-5" against "L4-L5", "right and left" against "left
+and right", "There is no fracture" against "No fracture is seen", or a
+trailing "Correlate clinically." Each impression is first canonicalized
+(case, spacing, numbering, vertebral levels, laterality order, filler words
+and boilerplate) and then summarized by a MinHash signature over its word
+shingles. Signatures are split into bands, and an impression whose band
+matches a stored one is a candidate. The band keys are indexed in SQLite,
+so a lookup is a handful of index probes however many entries are stored.
+
+Only that noise may differ. Every content word left after
+canonicalizing (anatomy, findings, laterality, levels, numbers and units,
+negations and severity words) is part of a guard that must match exactly,
+so a changed organ, a changed finding or an added sentence is never
+reused. Laterality, levels, numbers, negations and severity words are also
+guarded together with the word that follows them, so "mild stenosis,
+severe edema" does not match "severe stenosis, mild edema". The guard is
+folded into every band key, so impressions with a different guard cannot
+even become candidates. A candidate is then checked against the exact
+Jaccard similarity of the shingles, not the estimate, before its
+translation is reused.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from radiologytool.utils import LEAD_IN, NUMBERING
+
+logger = logging.getLogger('radiologytool.app')
+
+BOILERPLATE = re.compile(
+    r'\b(?:please )?(?:correlate clinically|clinical correlation(?: is)? (?:recommended|suggested|advised))'
+    r'|\brecommend clinical correlation\b'
+)
+# "L4-5", "L4 - L5", "L4/5" and "L4–L5" all become "l4-l5"
+LEVEL = re.compile(r'\b([ctls])(\d{1,2})(?:\s*[-–—/]\s*([ctls])?(\d{1,2}))?\b')
+LATERAL_PAIR = re.compile(r'\bright and left\b')
+TOKEN = re.compile(r'[a-z]\d+(?:-[a-z]\d+)?|\d+(?:\.\d+)?|[a-z]+')
+STOP_WORDS = frozenset(['a', 'an', 'the', 'there', 'is', 'are', 'was', 'were', 'be', 'been', 'seen', 'noted',
+                        'identified', 'demonstrated', 'present', 'visualized', 'also', 'again', 'evidence', 'of'])
+
+LATERALITY = frozenset(['left', 'right', 'bilateral', 'unilateral', 'ipsilateral', 'contralateral'])
+NEGATIONS = frozenset(['no', 'not', 'without', 'negative', 'absent', 'none', 'nor', 'neither', 'resolved',
+                       'unremarkable', 'normal'])
+QUALIFIERS = frozenset(['mild', 'mildly', 'moderate', 'moderately', 'severe', 'severely', 'minimal', 'trace',
+                        'small', 'tiny', 'large', 'marked', 'acute', 'subacute', 'chronic', 'new', 'old',
+                        'increased', 'decreased', 'enlarged', 'worsening', 'worsened', 'improved', 'improving',
+                        'unchanged', 'stable', 'possible', 'probable', 'likely', 'suspicious', 'concerning',
+                        'cannot', 'partial', 'complete', 'displaced', 'nondisplaced', 'malignant', 'benign'])
+UNITS = frozenset(['mm', 'cm', 'm', 'ml', 'cc', 'hu', 'percent'])
+NUMBER_OR_LEVEL = re.compile(r'\d')
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+HASH_BITS = 58
+# Added per step when an empty bin borrows a neighbour's value, so borrowed values stay distinct
+DENSIFY_OFFSET = 1 << HASH_BITS
+
+
+def _level(match):
+    first, first_number, second, second_number = match.groups()
+    if second_number is None:
+        return f"{first}{first_number}"
+    return f"{first}{first_number}-{second or first}{second_number}"
+
+
+def canonicalize(impression):
+    """Lowercase text with numbering, boilerplate and spelling differences removed"""
+    text = NUMBERING.sub(' ', LEAD_IN.sub('', impression)).lower()
+    text = BOILERPLATE.sub(' ', text)
+    text = LEVEL.sub(_level, text)
+    text = LATERAL_PAIR.sub('left and right', text)
+    text = text.replace('%', ' percent')
+    return ' '.join(token for token in TOKEN.findall(text) if token not in STOP_WORDS)
+
+
+def guard(canonical):
+    """Content words and safety tokens with the word after them, which a reused translation must share exactly"""
+    tokens = canonical.split()
+    guarded = set(tokens)
+    for i, token in enumerate(tokens):
+        if (token in LATERALITY or token in NEGATIONS or token in QUALIFIERS or token in UNITS
+                or NUMBER_OR_LEVEL.search(token)):
+            following = tokens[i + 1] if i + 1 < len(tokens) else ''
+            guarded.add(f"{token} {following}".strip())
+    return '|'.join(sorted(guarded))
+
+
+def shingles(canonical):
+    """Words and word pairs of a canonical impression"""
+    tokens = canonical.split()
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def minhash(shingle_set):
+    """
+    One-permutation MinHash: every shingle is hashed once and lands in one of
+    NUM_HASHES bins, each keeping its minimum. Empty bins borrow the value of
+    the next filled bin to their right.
+    """
+    bins = [None] * NUM_HASHES
+    for shingle in shingle_set:
+        value = _hash64(shingle)
+        slot = value % NUM_HASHES
+        value >>= 64 - HASH_BITS
+        if bins[slot] is None or value < bins[slot]:
+            bins[slot] = value
+    if all(value is None for value in bins):
+        return bins
+    for i in range(NUM_HASHES):
+        if bins[i] is None:
+            step = 1
+            while bins[(i + step) % NUM_HASHES] is None:
+                step += 1
+            bins[i] = bins[(i + step) % NUM_HASHES] + step * DENSIFY_OFFSET
+    return bins
+
+
+def band_keys(signature, guard_text):
+    """One indexed key per band, each also carrying the guard"""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        keys.append(_signed(_hash64(f"{band}:{guard_text}:{','.join(map(str, rows))}")))
+    return keys
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index of translated impressions, stored in SQLite and shared by workers"""
+
+    def __init__(self, db_path, version, threshold=0.9, ttl=30 * 24 * 3600, enabled=True):
+        self.db_path = db_path
+        self.version = version
+        self.threshold = threshold
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._disk_enabled = enabled and self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        """Create the tables and drop entries written under another version or expired"""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS near_duplicates ("
+                    "id INTEGER PRIMARY KEY, canonical_key TEXT NOT NULL UNIQUE, version TEXT NOT NULL, "
+                    "canonical TEXT NOT NULL, guard TEXT NOT NULL, html TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS near_duplicate_bands ("
+                    "band_key INTEGER NOT NULL, entry_id INTEGER NOT NULL, "
+                    "PRIMARY KEY (band_key, entry_id)) WITHOUT ROWID"
+                )
+                with conn:
+                    conn.execute("DELETE FROM near_duplicates WHERE version != ? OR expires_at <= ?",
+                                 (self.version, time.time()))
+                    conn.execute("DELETE FROM near_duplicate_bands "
+                                 "WHERE entry_id NOT IN (SELECT id FROM near_duplicates)")
+            finally:
+                conn.close()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Near-duplicate translation lookup disabled: {e}")
+            return False
+
+    def _canonical_key(self, canonical):
+        return hashlib.sha256(f"{self.version}\0{canonical}".encode('utf-8')).hexdigest()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, impression):
+        """Return the HTML of a stored impression similar enough to this one, or None"""
+        if not self._disk_enabled:
+            return None
+        canonical = canonicalize(impression)
+        if not canonical:
+            return None
+        guard_text = guard(canonical)
+        query_shingles = shingles(canonical)
+        keys = band_keys(minhash(query_shingles), guard_text)
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT html FROM near_duplicates WHERE canonical_key = ? AND expires_at > ?",
+                    (self._canonical_key(canonical), now)
+                ).fetchone()
+                if row is not None:
+                    self._count(True)
+                    return row[0]
+                candidates = conn.execute(
+                    "SELECT canonical, guard, html FROM near_duplicates WHERE expires_at > ? AND id IN "
+                    f"(SELECT entry_id FROM near_duplicate_bands WHERE band_key IN ({','.join('?' * len(keys))}))",
+                    [now] + keys
+                ).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Near-duplicate lookup failed: {e}")
+            return None
+
+        best = None
+        best_similarity = self.threshold
+        for candidate, candidate_guard, html in candidates:
+            if candidate_guard != guard_text:
+                continue
+            similarity = jaccard(query_shingles, shingles(candidate))
+            if similarity >= best_similarity:
+                best, best_similarity = html, similarity
+        self._count(best is not None)
+        return best
+
+    def add(self, impression, html):
+        """Index an impression and its formatted translation"""
+        if not self._disk_enabled:
+            return
+        canonical = canonicalize(impression)
+        if not canonical:
+            return
+        guard_text = guard(canonical)
+        keys = band_keys(minhash(shingles(canonical)), guard_text)
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    canonical_key = self._canonical_key(canonical)
+                    conn.execute(
+                        "INSERT INTO near_duplicates (canonical_key, version, canonical, guard, html, expires_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (canonical_key) DO UPDATE SET "
+                        "html = excluded.html, expires_at = excluded.expires_at",
+                        (canonical_key, self.version, canonical, guard_text, html, time.time() + self.ttl)
+                    )
+                    entry_id = conn.execute("SELECT id FROM near_duplicates WHERE canonical_key = ?",
+                                            (canonical_key,)).fetchone()[0]
+                    conn.executemany("INSERT OR IGNORE INTO near_duplicate_bands (band_key, entry_id) VALUES (?, ?)",
+                                     [(key, entry_id) for key in keys])
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Near-duplicate index write failed: {e}")
+
+    def invalidate(self):
+        """Drop every indexed impression"""
+        if not self._disk_enabled:
+            return
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM near_duplicate_bands")
+                    conn.execute("DELETE FROM near_duplicates")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Near-duplicate index invalidation failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self._disk_enabled,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) * 100 if lookups > 0 else 0,
+            }
@@ -0,0 +1,238 @@
+"""
+Retries and a circuit breaker for calls to an unreliable dependency.
+
+Transient failures (timeouts, dropped connections, rate limits, 5xx) are
+retried a bounded number of times with exponential backoff and full jitter,
+so workers that failed together do not retry in lockstep. The circuit
+breaker watches the failure rate over a sliding window. When it crosses the
+threshold the breaker opens and calls fail immediately with CircuitOpenError
+instead of tying up a worker until a timeout. After a cool-down it lets a
+few trial calls through (half-open) and closes again once they succeed.
+
+A concurrency limiter caps the calls in flight. Callers over the cap wait in
+a short, bounded line for a free slot and are shed with OverloadedError when
+the line is full or the wait runs out, so overload does not pile up threads.
+
+The breaker and the limiter are per process: each worker trips on the
+failures it sees itself and limits its own calls.
+"""
+
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger('radiologytool.app')
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a call while the circuit is open"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is temporarily unavailable. "
+                         f"Please try again in {math.ceil(retry_after)} seconds.")
+        self.retry_after = retry_after
+
+
+class OverloadedError(Exception):
+    """Raised when a call could not get an in-flight slot"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is busy. Please try again in {math.ceil(retry_after)} seconds.")
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """At most max_in_flight calls at once; up to max_waiting more wait up to max_wait seconds"""
+
+    def __init__(self, name, max_in_flight=8, max_waiting=16, max_wait=10):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.shed = 0
+
+    def saturated(self):
+        """True when every slot is busy and the waiting line is full, so a new call would be shed"""
+        with self._lock:
+            return self.in_flight >= self.max_in_flight and self.waiting >= self.max_waiting
+
+    @contextmanager
+    def slot(self):
+        """Hold one in-flight slot for the duration of the block"""
+        with self._lock:
+            if self.in_flight >= self.max_in_flight and self.waiting >= self.max_waiting:
+                self.shed += 1
+                raise OverloadedError(self.name, self.max_wait)
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=self.max_wait)
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.shed += 1
+            else:
+                self.in_flight += 1
+        if not acquired:
+            raise OverloadedError(self.name, self.max_wait)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'max_in_flight': self.max_in_flight,
+                'max_waiting': self.max_waiting,
+                'shed': self.shed,
+            }
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over a sliding time window"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_rate=0.5, min_calls=10, window=60, open_seconds=30,
+                 half_open_calls=1, is_failure=lambda error: True, clock=time.monotonic):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.is_failure = is_failure
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque()
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._trials = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def _prune(self, now):
+        while self._outcomes and self._outcomes[0][0] <= now - self.window:
+            self._outcomes.popleft()
+
+    def _current_state(self, now):
+        """State with an expired cool-down turned into half-open (call with the lock held)"""
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._trials = 0
+            logger.info(f"Circuit for {self.name} is half-open, trying the dependency again")
+        return self._state
+
+    def _open(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.times_opened += 1
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go ahead now"""
+        with self._lock:
+            now = self.clock()
+            state = self._current_state(now)
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return
+            self.rejected += 1
+            retry_after = self.open_seconds - (now - self._opened_at) if state == self.OPEN else 1
+            raise CircuitOpenError(self.name, max(retry_after, 0))
+
+    def record(self, failed):
+        with self._lock:
+            now = self.clock()
+            state = self._current_state(now)
+            if state == self.HALF_OPEN:
+                if failed:
+                    self._open(now)
+                    logger.warning(f"Circuit for {self.name} re-opened after a failed trial call")
+                else:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                    logger.info(f"Circuit for {self.name} closed")
+                return
+            if state == self.OPEN:
+                return
+            self._outcomes.append((now, failed))
+            self._prune(now)
+            calls = len(self._outcomes)
+            failures = sum(1 for _, outcome in self._outcomes if outcome)
+            if calls >= self.min_calls and failures / calls >= self.failure_rate:
+                # _open() clears the window, so the counts are taken before it
+                self._open(now)
+                logger.warning(f"Circuit for {self.name} opened: {failures} of the last {calls} calls failed")
+
+    def call(self, fn):
+        """Run fn() if the circuit allows it and record whether it failed"""
+        self.before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            self.record(self.is_failure(e))
+            raise
+        self.record(False)
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            now = self.clock()
+            state = self._current_state(now)
+            self._prune(now)
+            calls = len(self._outcomes)
+            failures = sum(1 for _, outcome in self._outcomes if outcome)
+            return {
+                'state': state,
+                'recent_calls': calls,
+                'recent_failures': failures,
+                'failure_rate': failures / calls if calls else 0,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'retry_after': max(self.open_seconds - (now - self._opened_at), 0) if state == self.OPEN else 0,
+            }
+
+
+def backoff_delay(attempt, base_delay, max_delay, rng=random):
+    """Full-jitter exponential backoff: uniform between 0 and base * 2^attempt, capped"""
+    return rng.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def call_with_retries(fn, retries=2, base_delay=0.5, max_delay=8, deadline=None,
+                      retryable=lambda error: True, sleep=time.sleep, clock=time.monotonic):
+    """
+    Call fn(), retrying up to retries more times on errors retryable(error)
+    accepts. No retry starts once it would begin more than deadline seconds
+    after the first attempt.
+    """
+    started = clock()
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= retries or not retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if deadline is not None and clock() + delay - started > deadline:
+                raise
+            logger.warning(f"Attempt {attempt + 1} failed with {type(e).__name__}: {e}; "
+                           f"retrying in {delay:.2f}s")
+            sleep(delay)
+            attempt += 1
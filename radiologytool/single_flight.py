@@ -0,0 +1,167 @@
+"""
+Single-flight coalescing of identical in-flight translations.
+
+Within a process, concurrent callers for the same key wait on one leader and
+share its result. Across worker processes, the leader claims the key with a
+row in SQLite; a leader in another worker that finds the key already claimed
+polls a recheck function (normally the shared translation cache) until the
+owner's result shows up, instead of making its own upstream call.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('radiologytool.app')
+
+
+class _Call:
+    """One in-flight call that other threads can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome"""
+
+    def __init__(self, db_path=None, claim_timeout=90, poll_interval=0.1):
+        self.db_path = db_path
+        self.claim_timeout = claim_timeout
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.collapsed = 0
+        self.collapsed_across_workers = 0
+        if self.db_path:
+            self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS inflight ("
+                    "key TEXT PRIMARY KEY, owner INTEGER NOT NULL, started_at REAL NOT NULL)"
+                )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Cross-worker single-flight disabled: {e}")
+            self.db_path = None
+
+    def _claim(self, key):
+        """Claim a key for this process, taking over claims that have gone stale"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM inflight WHERE key = ? AND started_at < ?",
+                             (key, now - self.claim_timeout))
+                return conn.execute(
+                    "INSERT OR IGNORE INTO inflight (key, owner, started_at) VALUES (?, ?, ?)",
+                    (key, os.getpid(), now)
+                ).rowcount == 1
+        finally:
+            conn.close()
+
+    def _release(self, key):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM inflight WHERE key = ? AND owner = ?", (key, os.getpid()))
+        finally:
+            conn.close()
+
+    def _lead(self, key, fn, recheck):
+        """Run fn() for this process, unless another worker is already running it"""
+        if not self.db_path:
+            return fn()
+
+        claimed = False
+        deadline = time.time() + self.claim_timeout
+        try:
+            while True:
+                claimed = self._claim(key)
+                # Check again even after claiming: the previous owner may have
+                # finished between our caller's cache lookup and the claim
+                if recheck is not None:
+                    result = recheck()
+                    if result is not None:
+                        with self._lock:
+                            self.collapsed_across_workers += 1
+                        logger.info("Reused a translation produced by another worker")
+                        return result
+                if claimed:
+                    break
+                if time.time() >= deadline:
+                    logger.warning("Gave up waiting for another worker's translation")
+                    break
+                time.sleep(self.poll_interval)
+        except sqlite3.Error as e:
+            logger.warning(f"Cross-worker single-flight unavailable: {e}")
+
+        if claimed:
+            return self._run_and_release(key, fn)
+        return fn()
+
+    def _run_and_release(self, key, fn):
+        try:
+            return fn()
+        finally:
+            try:
+                self._release(key)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not release single-flight claim: {e}")
+
+    def do(self, key, fn, recheck=None):
+        """
+        Return fn() for key, sharing one execution among concurrent callers.
+        recheck() is polled while another worker owns the key and should
+        return that worker's result once it is available, or None.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._lead(key, fn, recheck)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self):
+        """How many calls were made and how many were collapsed into them"""
+        with self._lock:
+            return {
+                'leaders': self.leaders,
+                'collapsed': self.collapsed,
+                'collapsed_across_workers': self.collapsed_across_workers,
+                'in_flight': len(self._calls),
+            }
@@ -0,0 +1,264 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('translationForm');
+    const loadingIndicator = document.querySelector('.loading');
+    const translationResult = document.getElementById('translationResult');
+    const translationContent = document.getElementById('translation');
+    const exampleButtons = document.querySelectorAll('.example-btn');
+    const impressionTextarea = document.getElementById('impression');
+    const feedbackSection = document.getElementById('feedbackSection');
+    const thumbsUpBtn = document.getElementById('thumbsUpBtn');
+    const thumbsDownBtn = document.getElementById('thumbsDownBtn');
+    const feedbackComment = document.getElementById('feedbackComment');
+    const submitFeedbackBtn = document.getElementById('submitFeedbackBtn');
+    const feedbackSuccess = document.getElementById('feedbackSuccess');
+
+    // Store translation data
+    let currentTranslation = {
+        id: null,
+        originalText: '',
+        translatedText: '',
+        rating: null
+    };
+
+    // Handle form submission
+    form.addEventListener('submit', async function(event) {
+        event.preventDefault();
+
+        const impression = impressionTextarea.value.trim();
+
+        if (!impression) {
+            alert('Please enter a radiology impression to translate.');
+            return;
+        }
+
+        // Reset feedback
+        resetFeedback();
+
+        // Show loading indicator
+        loadingIndicator.style.display = 'block';
+        translationResult.style.display = 'none';
+
+        try {
+            let data;
+            try {
+                data = await translateStreaming(impression);
+            } catch (streamError) {
+                if (streamError.fromServer) {
+                    throw streamError;
+                }
+                // Streaming is unavailable, fall back to a single request
+                console.warn(streamError);
+                data = await translateOnce(impression);
+            }
+
+            // Store the current translation data
+            currentTranslation.id = data.translation_id;
+            currentTranslation.originalText = impression;
+            currentTranslation.translatedText = data.translation;
+
+            // Replace the streamed text with the final formatted version
+            translationContent.innerHTML = data.translation;
+            translationResult.style.display = 'block';
+
+            // Show feedback section
+            feedbackSection.style.display = 'block';
+        } catch (error) {
+            if (error.fromServer) {
+                alert('Error: ' + error.message);
+                return;
+            }
+            alert('An error occurred while processing your request.');
+            console.error(error);
+        } finally {
+            loadingIndicator.style.display = 'none';
+        }
+    });
+
+    // Error reported by the server rather than by the network or browser
+    function serverError(message) {
+        const error = new Error(message);
+        error.fromServer = true;
+        return error;
+    }
+
+    // Translate with one request and wait for the whole result
+    async function translateOnce(impression) {
+        const response = await fetch('translate', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/x-www-form-urlencoded',
+            },
+            body: new URLSearchParams({
+                'impression': impression
+            })
+        });
+
+        const data = await response.json();
+
+        if (!response.ok) {
+            throw serverError(data.error || 'Failed to translate impression');
+        }
+        return data;
+    }
+
+    // Translate over Server-Sent Events, showing each sentence as it arrives
+    async function translateStreaming(impression) {
+        const response = await fetch('translate/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/x-www-form-urlencoded',
+            },
+            body: new URLSearchParams({
+                'impression': impression
+            })
+        });
+
+        // Only a missing endpoint means streaming is unavailable; anything else, such as
+        // a 429 or 503, is shown rather than retried so it does not cost a second request
+        if (response.status === 404 || response.status === 405) {
+            throw new Error('Streaming translation unavailable');
+        }
+        if (!response.ok) {
+            const data = await response.json().catch(() => ({}));
+            throw serverError(data.error || 'Failed to translate impression');
+        }
+        if (!response.body) {
+            throw new Error('Streaming translation unavailable');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let streamed = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventType = 'message';
+                let payload = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) {
+                        eventType = line.slice(7);
+                    } else if (line.startsWith('data: ')) {
+                        payload += line.slice(6);
+                    }
+                });
+                const data = JSON.parse(payload);
+
+                if (eventType === 'chunk') {
+                    streamed += data.html;
+                    translationContent.innerHTML = '<p>' + streamed + '</p>';
+                    translationResult.style.display = 'block';
+                    loadingIndicator.style.display = 'none';
+                } else if (eventType === 'done' || eventType === 'error') {
+                    return data;
+                }
+            }
+        }
+        throw new Error('Translation stream ended early');
+    }
+
+    // Handle thumbs up/down
+    thumbsUpBtn.addEventListener('click', function() {
+        setRating('thumbs_up');
+    });
+
+    thumbsDownBtn.addEventListener('click', function() {
+        setRating('thumbs_down');
+    });
+
+    // Set the selected rating
+    function setRating(rating) {
+        // Update current rating
+        currentTranslation.rating = rating;
+
+        // Update UI
+        if (rating === 'thumbs_up') {
+            thumbsUpBtn.classList.add('selected');
+            thumbsDownBtn.classList.remove('selected');
+        } else {
+            thumbsUpBtn.classList.remove('selected');
+            thumbsDownBtn.classList.add('selected');
+        }
+    }
+
+    // Handle feedback submission
+    submitFeedbackBtn.addEventListener('click', async function() {
+        if (!currentTranslation.rating) {
+            alert('Please select thumbs up or thumbs down before submitting.');
+            return;
+        }
+
+        try {
+            const response = await fetch('feedback', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    translation_id: currentTranslation.id,
+                    original: currentTranslation.originalText,
+                    translation: currentTranslation.translatedText,
+                    rating: currentTranslation.rating,
+                    comment: feedbackComment.value.trim()
+                })
+            });
+
+            const data = await response.json();
+
+            if (response.ok) {
+                // Show success message
+                feedbackSuccess.style.display = 'block';
+
+                // Disable submit button
+                submitFeedbackBtn.disabled = true;
+
+                // Disable rating buttons
+                thumbsUpBtn.disabled = true;
+                thumbsDownBtn.disabled = true;
+                feedbackComment.disabled = true;
+            } else {
+                alert('Error: ' + (data.error || 'Failed to submit feedback'));
+            }
+        } catch (error) {
+            alert('An error occurred while submitting your feedback.');
+            console.error(error);
+        }
+    });
+
+    // Reset feedback UI
+    function resetFeedback() {
+        // Reset data
+        currentTranslation.rating = null;
+
+        // Reset UI
+        thumbsUpBtn.classList.remove('selected');
+        thumbsDownBtn.classList.remove('selected');
+        feedbackComment.value = '';
+        feedbackSuccess.style.display = 'none';
+
+        // Enable controls
+        submitFeedbackBtn.disabled = false;
+        thumbsUpBtn.disabled = false;
+        thumbsDownBtn.disabled = false;
+        feedbackComment.disabled = false;
+    }
+
+    // Handle example button clicks
+    exampleButtons.forEach(button => {
+        button.addEventListener('click', function() {
+            // Get the impression text
+            impressionTextarea.value = this.textContent.trim();
+            impressionTextarea.focus();
+        });
+    });
+});
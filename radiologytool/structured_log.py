@@ -0,0 +1,111 @@
+"""
+Structured logging written off the request thread.
+
+Request threads only put log records on an in-memory queue; a listener
+thread per process formats them and does the file I/O. The listener is
+started on first use and again after a fork, so preforking servers do not
+inherit a dead thread from the parent. If the queue is full, records are
+dropped and counted rather than blocking a request.
+
+Translation and feedback events go out as one compact JSON object per
+line. Long string fields are cut to a configurable length, and verbose
+debug fields (such as the raw model output) are kept only for a sampled
+share of records.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format a record as one line of JSON: ts, level, event and the record's fields"""
+
+    def __init__(self, max_field_chars=2000):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def _truncate(self, value):
+        if isinstance(value, str) and self.max_field_chars and len(value) > self.max_field_chars:
+            return f"{value[:self.max_field_chars]}...(+{len(value) - self.max_field_chars} chars)"
+        if isinstance(value, dict):
+            return {key: self._truncate(item) for key, item in value.items()}
+        return value
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'event': record.getMessage(),
+        }
+        entry.update(self._truncate(getattr(record, 'fields', {})))
+        if record.exc_info:
+            entry['exception'] = self._truncate(self.formatException(record.exc_info))
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class BackgroundLogHandler(QueueHandler):
+    """Queue records and hand them to the given handlers from a listener thread"""
+
+    def __init__(self, *handlers, max_queue=10000):
+        super().__init__(queue.Queue(max_queue))
+        self.handlers = handlers
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def _ensure_listener(self):
+        """Start the listener lazily so forked workers get their own"""
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._start_lock:
+            if self._listener_pid == pid:
+                return
+            # Records queued by the parent before a fork belong to the parent
+            self.queue = queue.Queue(self.queue.maxsize)
+            self._listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self._listener.start()
+            self._listener_pid = pid
+
+    def prepare(self, record):
+        # The listener runs in this process, so formatting can wait for its thread
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write out everything queued so far and stop this process's listener"""
+        with self._start_lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._listener_pid = None
+
+
+class EventLogger:
+    """Log named events with structured fields, keeping debug fields for a sample"""
+
+    def __init__(self, logger, debug_sample_rate=0.0):
+        self.logger = logger
+        self.debug_sample_rate = debug_sample_rate
+
+    def log(self, event, debug=None, level=logging.INFO, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        if debug and random.random() < self.debug_sample_rate:
+            fields['debug'] = debug
+        self.logger.log(level, event, extra={'fields': fields})
@@ -1,12 +1,59 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+from flask import Flask
+
+# Point the app's files at a scratch directory before importing it, so test runs leave the real ones alone
+TEST_DATA_DIR = tempfile.mkdtemp(prefix='radiology-tests-')
+for _name, _filename in [('TRANSLATION_CACHE_DB', 'translation_cache.db'),
+                          ('TRANSLATION_JOBS_DB', 'translation_jobs.db'),
+                          ('FEEDBACK_DB', 'feedback.db'),
+                          ('FEEDBACK_FILE', 'feedback_data.json'),
+                          ('LLM_METRICS_DB', 'llm_metrics.db'),
+                          ('TRANSLATION_LOG_FILE', 'translations_log.jsonl'),
+                          ('ACTIVITY_LOG_FILE', 'translations_log.txt')]:
+    os.environ[_name] = os.path.join(TEST_DATA_DIR, _filename)
+
+import app as radiology_app
 from app import app, translate_radiology_impression
-from utils import identify_medical_terms, get_simplified_explanation
+from glossary import build_glossary
+from formatting import (GlossaryAnnotator, SpanRewriter, StreamingFormatter, annotate_glossary, annotate_vertebrae,
+                        annotate_glossary_sequential, balance_parentheses,
+                        format_single_paragraph, format_translation)
+from chunking import split_findings
+from fast_path import FastPath
+from feedback_store import FeedbackStore
+from jobs import QueueFullError, TranslationJobQueue
+from llm_metrics import LLMMetrics
+from log_reader import read_log_page
+from near_duplicate import NearDuplicateIndex, canonicalize, guard
+from resilience import (CircuitBreaker, CircuitOpenError, ConcurrencyLimiter, OverloadedError,
+                        call_with_retries)
+from single_flight import SingleFlight
+from structured_log import BackgroundLogHandler, EventLogger, JsonLinesFormatter
+from translation_cache import TranslationCache
+from utils import (COMMON_MEDICAL_TERMS, MappedGlossary, MedicalTermIndex, enhance_translation_with_definitions,
+                   get_simplified_explanation, identify_medical_terms, identify_medical_terms_batch)
+
+# Keeps tests that patch the translation cache from reading or filling the real near-duplicate index
+NO_NEAR_DUPLICATES = NearDuplicateIndex(':memory:', version='v1', enabled=False)
 
 class TestRadiologyTranslator(unittest.TestCase):
     
     def setUp(self):
         """Set up test client"""
-        self.app = app.test_client()
+        flask_app = Flask(__name__)
+        flask_app.register_blueprint(app)
+        self.app = flask_app.test_client()
         self.app.testing = True
     
     def test_home_page(self):
@@ -28,10 +75,1262 @@ class TestRadiologyTranslator(unittest.TestCase):
         self.assertIn('hypertension', identified_terms)
         self.assertIn('cardiac', identified_terms)
     
+    def test_medical_terms_match_whole_words(self):
+        """Test that terms are not found inside longer words"""
+        self.assertEqual(identify_medical_terms("Adrenal glands are normal."), [])
+        self.assertEqual(identify_medical_terms_batch(["Renal cyst.", "Bilateral effusion."]),
+                         [['renal'], ['effusion', 'bilateral']])
+    
+    def test_plurals_find_their_terms(self):
+        """Test that plural and Latin plural forms are reported as their glossary terms"""
+        self.assertEqual(identify_medical_terms("Bilateral pulmonary nodules, lesions, effusions and fractures"),
+                         ['pulmonary', 'lesion', 'nodule', 'effusion', 'bilateral', 'fracture'])
+        self.assertEqual(identify_medical_terms("Foraminal stenoses; hepatic metastases–no emboli_x."),
+                         ['hepatic', 'metastasis', 'stenosis'])
+        index = MedicalTermIndex({'effusion': 'fluid buildup', 'pleural effusion': 'fluid around the lung',
+                                  'vertebra': 'a bone of the spine'})
+        matches = index.find("Pleural effusions and collapsed vertebrae.")
+        self.assertEqual([(m.term, m.start, m.end) for m in matches],
+                         [('pleural effusion', 0, 17), ('vertebra', 32, 41)])
+    
+    def test_word_table_agrees_with_the_walk(self):
+        """Test that the single-word shortcut in terms_in finds what find() finds"""
+        index = MedicalTermIndex(COMMON_MEDICAL_TERMS)
+        self.assertIsNotNone(index.word_forms)
+        for text in TestGlossaryAnnotator().corpus(count=200) + ["Effusions•nodules – café_edema, fractures'"]:
+            self.assertEqual(index.terms_in(text),
+                             sorted({m.term for m in index.find(text)}, key=index.order.__getitem__), text)
+    
+    def test_multi_word_terms_with_offsets(self):
+        """Test that the longest multi-word term is reported with its offsets"""
+        index = MedicalTermIndex({'effusion': 'fluid buildup', 'pleural effusion': 'fluid around the lung'})
+        matches = index.find("Small pleural  effusion. Effusion resolved.")
+        self.assertEqual([(m.term, m.start, m.end) for m in matches],
+                         [('pleural effusion', 6, 23), ('effusion', 25, 33)])
+    
+    def test_enhance_translation_with_definitions(self):
+        """Test that each requested term is explained once per occurrence"""
+        result = enhance_translation_with_definitions("Bilateral effusion, lateral view.", ['lateral', 'effusion'])
+        self.assertEqual(result, "Bilateral effusion (fluid buildup), lateral (to the side) view.")
+    
     def test_medical_term_explanation(self):
         """Test that medical terms are correctly explained"""
         explanation = get_simplified_explanation('hypertension')
         self.assertEqual(explanation, 'high blood pressure')
 
+class TestGlossaryAnnotator(unittest.TestCase):
+    """Test cases for the single-pass glossary annotator"""
+    
+    def corpus(self, count=1500, seed=7):
+        """Random report-like texts mixing glossary terms, case, brackets and suffix overlaps"""
+        rng = random.Random(seed)
+        terms = list(COMMON_MEDICAL_TERMS)
+        words = terms + ['BILATERAL', 'Lateral', 'radiolucent', 'Atherosclerosis', 'kidney',
+                         'lesion2', 'x_lesion', 'ſtenosis', 'there is', 'mild', 'the', 'with',
+                         'no', 'at', 'L4-L5', '2.5 cm', ',', ';', '(stable)', '{note}', '(', ')']
+        texts = []
+        for _ in range(count):
+            parts = []
+            for _ in range(rng.randint(1, 30)):
+                word = rng.choice(words)
+                if rng.random() < 0.15:
+                    word = word.upper() if rng.random() < 0.5 else word.capitalize()
+                if rng.random() < 0.1:
+                    word += rng.choice([' (', '(']) + rng.choice(words) + ')'
+                parts.append(word + rng.choice([' ', ' ', '', '\n']))
+            texts.append(''.join(parts) + rng.choice(['.', '!', '']))
+        return texts
+    
+    def test_matches_sequential_annotation(self):
+        """Test that the single pass is byte-identical to the term-by-term loop"""
+        rng = random.Random(11)
+        for text in self.corpus():
+            self.assertEqual(annotate_glossary(text), annotate_glossary_sequential(text), text)
+            explained = set(rng.sample(list(COMMON_MEDICAL_TERMS), 3))
+            expected_explained = set(explained)
+            self.assertEqual(annotate_glossary(text, explained),
+                             annotate_glossary_sequential(text, expected_explained), text)
+            self.assertEqual(explained, expected_explained, text)
+    
+    def test_suffix_of_annotated_term_is_skipped(self):
+        """Test that annotating 'bilateral' also counts as explaining 'lateral'"""
+        explained = set()
+        text = annotate_glossary("Bilateral effusion, lateral view.", explained)
+        self.assertEqual(text, "bilateral (on both sides) effusion (fluid buildup), lateral view.")
+        self.assertIn('lateral', explained)
+    
+    def test_unsupported_glossary_falls_back(self):
+        """Test that glossaries the single pass cannot reproduce use the sequential loop"""
+        self.assertTrue(GlossaryAnnotator(COMMON_MEDICAL_TERMS).single_pass)
+        self.assertFalse(GlossaryAnnotator({'disc bulge': 'a bulging disc'}).single_pass)
+        self.assertFalse(GlossaryAnnotator({'edema': 'swelling (fluid)'}).single_pass)
+        self.assertFalse(GlossaryAnnotator({'mass': 'a lump', 'Mass': 'a lump'}).single_pass)
+        glossary = {'edema': 'swelling (fluid)'}
+        self.assertEqual(GlossaryAnnotator(glossary).annotate("Mild edema."),
+                         annotate_glossary_sequential("Mild edema.", glossary=glossary))
+
+class TestMappedGlossary(unittest.TestCase):
+    """Test cases for the memory-mapped glossary file"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'glossary.bin')
+        entries = [('Disc bulge', 'disc pushing outward'), ('pleural effusion', 'fluid around the lung'),
+                   ('Pleural', 'the lining of the lung'), ('disc-bulge', 'ignored duplicate')]
+        build_glossary(entries + list(COMMON_MEDICAL_TERMS.items()), self.path)
+        self.glossary = MappedGlossary(self.path)
+    
+    def test_lookup_is_lazy_and_case_insensitive(self):
+        """Test that nothing is read until the first lookup and keys are normalized"""
+        glossary = MappedGlossary(os.path.join(self.tmpdir.name, 'missing.bin'))
+        MedicalTermIndex(glossary)
+        GlossaryAnnotator(glossary)
+        self.assertEqual(self.glossary['DISC  BULGE'], 'disc pushing outward')
+        self.assertEqual(self.glossary.get('disc-bulge'), 'disc pushing outward')
+        self.assertEqual(self.glossary['stenosis'], COMMON_MEDICAL_TERMS['stenosis'])
+        self.assertNotIn('pleural eff', self.glossary)
+        self.assertEqual(len(self.glossary), len(COMMON_MEDICAL_TERMS) + 3)
+        self.assertEqual(list(self.glossary)[:2], ['acute', 'aneurysm'])
+        self.assertEqual(repr(self.glossary), f"MappedGlossary(sha256={self.glossary.digest})")
+    
+    def test_digest_does_not_map_the_file(self):
+        """Test that the digest used in the cache version is read from the header alone"""
+        glossary = MappedGlossary(self.path)
+        self.assertEqual(len(glossary.digest), 64)
+        self.assertIsNone(glossary._mm)
+        glossary._open()
+        self.assertEqual(glossary.digest, self.glossary.digest)
+        with open(os.path.join(self.tmpdir.name, 'bogus.bin'), 'wb') as f:
+            f.write(b'not a glossary')
+        with self.assertRaises(ValueError):
+            MappedGlossary(f.name).digest
+    
+    def test_index_matches_the_in_memory_trie(self):
+        """Test that whole-word, longest-match lookup agrees with the dict glossary"""
+        mapped = MedicalTermIndex(self.glossary)
+        in_memory = MedicalTermIndex(dict(self.glossary.items()))
+        for text in TestGlossaryAnnotator().corpus(count=300) + ['Small pleural  effusion; pleural thickening.',
+                                                                  'Disc-bulge at L4-L5 and adrenal mass.']:
+            self.assertEqual(mapped.find(text), in_memory.find(text), text)
+        self.assertEqual(mapped.terms_in('Small pleural effusion and a disc bulge.'),
+                         ['Disc bulge', 'pleural effusion'])
+    
+    def test_annotator_explains_every_unexplained_term(self):
+        """Test annotation with a mapped glossary, including explained_terms"""
+        annotator = GlossaryAnnotator(self.glossary)
+        explained = {'stenosis'}
+        text = annotator.annotate('Pleural effusion and a Disc bulge (bulge). Mild stenosis, disc bulge.', explained)
+        self.assertEqual(text, 'Pleural effusion (fluid around the lung) and a Disc bulge (bulge). '
+                               'Mild stenosis, disc bulge.')
+        self.assertEqual(explained, {'stenosis', 'Disc bulge'})
+
+class TestTranslationFormatter(unittest.TestCase):
+    """Test cases for the format_translation pipeline"""
+    
+    def test_every_anatomical_match_lands_in_place(self):
+        """Test that one inserted explanation does not shift the next one"""
+        result = format_translation("The bronchi and bronchus are clear.")
+        self.assertEqual(result, "<p>The bronchi (the airways in the lungs) and "
+                                 "bronchus (the airways in the lungs) are clear.</p>")
+    
+    def test_balance_parentheses(self):
+        """Test that nesting is flattened and unbalanced parentheses are repaired"""
+        self.assertEqual(balance_parentheses("(a (b) c (d) e)"), "(a b c d e)")
+        self.assertEqual(balance_parentheses("a) (b)"), "a (b)")
+        self.assertEqual(balance_parentheses("(a (b"), "(a b)")
+        self.assertEqual(balance_parentheses("no parentheses"), "no parentheses")
+    
+    def test_span_rewriter_refuses_overlaps(self):
+        """Test that spans keep original offsets and the first of two overlapping spans wins"""
+        rewriter = SpanRewriter("L4-L5 disc")
+        self.assertTrue(rewriter.add(3, 5, "L5 (x)"))
+        self.assertFalse(rewriter.add(0, 5, "L4-L5 (y)"))
+        self.assertTrue(rewriter.add(0, 2, "L4 (z)"))
+        self.assertEqual(rewriter.apply(), "L4 (z)-L5 (x) disc")
+    
+    def test_every_vertebra_lands_in_place(self):
+        """Test that explaining one standalone vertebra does not shift the next one"""
+        self.assertEqual(annotate_vertebrae("Mild changes at L1 and also at L3 here."),
+                         "Mild changes at L1 (a vertebra in your lower back) and also at "
+                         "L3 (a vertebra in your lower back) here.")
+        self.assertEqual(format_single_paragraph("Narrowing at L4 - L5, with changes at T6 and C5."),
+                         "<p>Narrowing at L4-L5 (the area in your lower back), with changes at "
+                         "T6 (a vertebra in your lower back) and C5 (a vertebra in your lower back).</p>")
+        # A level explained once is not explained again
+        self.assertEqual(annotate_vertebrae("L2 (upper lumbar) and L2 again."), "L2 (upper lumbar) and L2 again.")
+
+class TestFastPath(unittest.TestCase):
+    """Test the local translations for trivial normal impressions"""
+    
+    def test_stock_normal_impressions(self):
+        """Test that common normal phrasings get vetted sentences with glossary explanations"""
+        fast_path = FastPath()
+        self.assertEqual(fast_path.translate('No acute intracranial abnormality.'),
+                         '<p>There are no signs of any acute (sudden or severe) problems inside the head.</p>')
+        self.assertEqual(fast_path.translate('Unremarkable study'), '<p>This scan looks normal.</p>')
+        self.assertEqual(fast_path.translate('Normal MRI of the lumbar spine.'),
+                         '<p>This scan of your lower back looks normal.</p>')
+        self.assertEqual(
+            fast_path.translate('IMPRESSION:\n1. No acute fracture or dislocation.\n2. Correlate clinically.'),
+            '<p>There is no sign of any acute (sudden or severe) fracture (broken bone) '
+            'or dislocation (joint out of place).</p>')
+    
+    def test_anything_else_goes_to_the_model(self):
+        """Test that extra findings, numbers, laterality or qualifiers are not handled locally"""
+        fast_path = FastPath()
+        for impression in ['No acute intracranial abnormality. Small 3 mm nodule.',
+                           'Mild stenosis at L4-L5.',
+                           'Left knee is normal.',
+                           'No acute fracture except of the distal radius.',
+                           'Correlate clinically.',
+                           '']:
+            self.assertIsNone(fast_path.translate(impression), impression)
+        self.assertIsNone(FastPath(enabled=False).translate('Unremarkable study.'))
+        self.assertEqual(fast_path.stats()['hits'], 0)
+        self.assertEqual(fast_path.stats()['misses'], 6)
+    
+    def test_translate_skips_openai_for_trivial_impressions(self):
+        """Test the hit share and that only the non-trivial impression reaches the model"""
+        fast_path = FastPath()
+        with mock.patch.object(radiology_app, 'fast_path', fast_path), \
+                mock.patch.object(radiology_app, 'translation_cache', mock.Mock(get=mock.Mock(return_value=None))), \
+                mock.patch.object(radiology_app, 'near_duplicates', NO_NEAR_DUPLICATES), \
+                mock.patch.object(radiology_app, '_translate_uncached', return_value='<p>model</p>') as uncached:
+            radiology_app._translate('No acute cardiopulmonary process.')
+            radiology_app._translate('Negative study.')
+            radiology_app._translate('Small renal cyst.')
+        uncached.assert_called_once_with('Small renal cyst.')
+        self.assertAlmostEqual(fast_path.stats()['hit_rate'], 200 / 3)
+
+class TestChunkedTranslation(unittest.TestCase):
+    """Test cases for translating the findings of long impressions concurrently"""
+    
+    def test_split_findings(self):
+        """Test numbered and sentence splitting, continuations and merging"""
+        self.assertEqual(
+            split_findings('IMPRESSION: 1. Disc bulge at L4-5. 2. Renal cyst, 3.2 cm. 3) No fracture. '
+                           '4. Trace effusion. This is unchanged.'),
+            ['Disc bulge at L4-5.', 'Renal cyst, 3.2 cm.', 'No fracture.', 'Trace effusion. This is unchanged.'])
+        # Numbers that do not run 1, 2, 3 are part of the text, not items
+        self.assertEqual(split_findings('Cyst measures 2. Dr. Smith was told. No fracture. Small effusion.'),
+                         ['Cyst measures 2.', 'Dr. Smith was told.', 'No fracture.', 'Small effusion.'])
+        self.assertIsNone(split_findings('1. No fracture. 2. Small effusion.'))
+        numbered = ' '.join(f'{i}. Finding {i}.' for i in range(1, 11))
+        chunks = split_findings(numbered, max_chunks=4)
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(' '.join(chunks), ' '.join(f'Finding {i}.' for i in range(1, 11)))
+    
+    def test_findings_are_translated_concurrently_and_stitched(self):
+        """Test that latency follows the slowest finding and the result is one paragraph in order"""
+        def create(messages, **kwargs):
+            finding = messages[-1]['content'].rsplit(': ', 1)[1]
+            time.sleep(0.3)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(
+                content=f"Sure, {finding.replace('Finding', 'result')}\n"))])
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.side_effect = create
+        cache = mock.Mock()
+        impression = ' '.join(f'{i}. Finding {i}.' for i in range(1, 6))
+        with mock.patch.object(radiology_app, 'TRANSLATION_CHUNKING', True), \
+                mock.patch.object(radiology_app, 'get_openai_client', return_value=fake_client), \
+                mock.patch.object(radiology_app, 'translation_cache', cache), \
+                mock.patch.object(radiology_app, 'near_duplicates', NO_NEAR_DUPLICATES):
+            started = time.monotonic()
+            translation = radiology_app._translate_uncached(impression)
+            elapsed = time.monotonic() - started
+        
+        self.assertEqual(fake_client.chat.completions.create.call_count, 5)
+        self.assertLess(elapsed, 1.0)
+        # Every part loses its own lead-in before the parts are joined
+        self.assertEqual(translation, '<p>Result 1. Result 2. Result 3. Result 4. Result 5.</p>')
+        cache.set.assert_called_once_with(impression, translation)
+
+class TestTranslationCache(unittest.TestCase):
+    
+    def setUp(self):
+        """Give every test its own SQLite file"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'cache.db')
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_normalized_impressions_share_an_entry(self):
+        """Test that whitespace and case differences hit the same entry"""
+        cache = TranslationCache(self.db_path, version='v1')
+        cache.set('No acute cardiopulmonary process.', '<p>All clear.</p>')
+        self.assertEqual(cache.get('  no ACUTE cardiopulmonary\nprocess. '), '<p>All clear.</p>')
+        self.assertEqual(cache.stats()['memory_hits'], 1)
+    
+    def test_disk_tier_survives_restart(self):
+        """Test that a new cache instance reads entries written by another"""
+        TranslationCache(self.db_path, version='v1').set('Unremarkable study.', '<p>Normal.</p>')
+        cache = TranslationCache(self.db_path, version='v1')
+        self.assertEqual(cache.get('Unremarkable study.'), '<p>Normal.</p>')
+        self.assertEqual(cache.stats()['disk_hits'], 1)
+    
+    def test_version_change_invalidates_entries(self):
+        """Test that entries written under an old prompt/formatter are not served"""
+        TranslationCache(self.db_path, version='v1').set('Unremarkable study.', '<p>Normal.</p>')
+        cache = TranslationCache(self.db_path, version='v2')
+        self.assertIsNone(cache.get('Unremarkable study.'))
+        self.assertEqual(cache.stats()['disk_entries'], 0)
+    
+    def test_lru_and_ttl_eviction(self):
+        """Test that the memory tier respects both its size and TTL limits"""
+        cache = TranslationCache(self.db_path, version='v1', max_entries=2, ttl=60)
+        cache.set('a', '<p>a</p>')
+        cache.set('b', '<p>b</p>')
+        cache.set('c', '<p>c</p>')
+        self.assertEqual(cache.stats()['memory_entries'], 2)
+        
+        expired = TranslationCache(self.db_path, version='v1', ttl=-1)
+        expired.set('d', '<p>d</p>')
+        self.assertIsNone(expired.get('d'))
+        self.assertEqual(expired.stats()['misses'], 1)
+    
+    def test_clear_reaches_other_workers(self):
+        """Test that a clear through one worker empties the memory tier of another"""
+        worker = TranslationCache(self.db_path, version='v1', sync_interval=0)
+        other_worker = TranslationCache(self.db_path, version='v1', sync_interval=0)
+        worker.set('Unremarkable study.', '<p>Normal.</p>')
+        self.assertEqual(other_worker.get('Unremarkable study.'), '<p>Normal.</p>')
+        self.assertEqual(other_worker.get('Unremarkable study.'), '<p>Normal.</p>')
+        self.assertEqual(other_worker.stats()['memory_hits'], 1)
+        worker.invalidate()
+        self.assertIsNone(other_worker.get('Unremarkable study.'))
+        self.assertIsNone(other_worker.get_stale('Unremarkable study.'))
+        self.assertEqual(other_worker.stats()['memory_entries'], 0)
+    
+    def test_disk_tier_is_purged_and_bounded(self):
+        """Test that expired rows are removed and the shared tier keeps only its newest entries"""
+        cache = TranslationCache(self.db_path, version='v1', max_disk_entries=2, purge_interval=0)
+        TranslationCache(self.db_path, version='v1', ttl=-1).set('expired', '<p>old</p>')
+        self.assertEqual(cache.stats()['disk_entries'], 1)
+        for impression in ['a', 'b', 'c']:
+            cache.set(impression, f"<p>{impression}</p>")
+        self.assertEqual(cache.stats()['disk_entries'], 2)
+        self.assertEqual(TranslationCache(self.db_path, version='v1').get('c'), '<p>c</p>')
+    
+    def test_translate_uses_cache(self):
+        """Test that a cached impression never reaches the OpenAI client"""
+        cache = TranslationCache(self.db_path, version='v1')
+        cache.set('Mild degenerative changes at L4-L5.', '<p>Cached.</p>')
+        original = radiology_app.translation_cache
+        radiology_app.translation_cache = cache
+        try:
+            self.assertEqual(translate_radiology_impression('Mild degenerative changes at L4-L5.'),
+                             '<p>Cached.</p>')
+        finally:
+            radiology_app.translation_cache = original
+
+class TestNearDuplicateIndex(unittest.TestCase):
+    """Test cases for reusing translations of near-duplicate impressions"""
+    
+    BASE = ('Mild multilevel degenerative disc disease of the lumbar spine, most pronounced at L4-5, '
+            'with a broad-based disc bulge and moderate left foraminal stenosis. No acute fracture.')
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.index = NearDuplicateIndex(os.path.join(self.tmpdir.name, 'cache.db'), version='v1')
+        self.index.add(self.BASE, '<p>Stored.</p>')
+    
+    def test_canonicalize_removes_noise(self):
+        """Test levels, laterality order, filler words, numbering and boilerplate"""
+        self.assertEqual(canonicalize('IMPRESSION: 1. Disc bulge at L4-5. 2. Correlate clinically.'),
+                         canonicalize('disc bulge at  L4 - L5.'))
+        self.assertEqual(canonicalize('There is no evidence of fracture of the right and left wrists.'),
+                         canonicalize('No fracture of the left and right wrists is seen.'))
+        self.assertEqual(canonicalize('C5/6 and L5-S1'), 'c5-c6 and l5-s1')
+        self.assertEqual(guard(canonicalize('No fracture. Small 3 mm left cyst.')),
+                         '3|3 mm|cyst|fracture|left|left cyst|mm|mm left|no|no fracture|small|small 3')
+    
+    def test_wording_variants_reuse_the_translation(self):
+        """Test that variants differing only in noise are answered from the index"""
+        for variant in [self.BASE.replace('L4-5', 'L4-L5') + ' Correlate clinically.',
+                        self.BASE.upper(),
+                        self.BASE.replace('broad-based', 'broad based'),
+                        self.BASE.replace('No acute fracture', 'There is no acute fracture')]:
+            self.assertEqual(self.index.get(variant), '<p>Stored.</p>', variant)
+        # Other workers see entries through the shared file
+        other_worker = NearDuplicateIndex(self.index.db_path, version='v1')
+        self.assertEqual(other_worker.get(self.BASE.replace('L4-5', 'L4/5')), '<p>Stored.</p>')
+    
+    def test_clinically_different_impressions_are_not_reused(self):
+        """Test that anatomy, findings, laterality, levels, negation, severity and numbers must match"""
+        # Long enough that one changed word still leaves the shingles over 90% similar
+        liver = ('Heterogeneous lesion in the liver with arterial hyperenhancement and washout on portal venous '
+                 'images, measuring 2.1 cm, compatible with hepatocellular carcinoma. Cirrhotic morphology with '
+                 'nodular contour and splenomegaly. Patent portal and hepatic veins. Gallbladder, adrenal glands and '
+                 'kidneys within normal limits. Enhancing lesion in the right lobe. No ascites. No lymphadenopathy. '
+                 'Atherosclerotic calcification of the abdominal aorta and iliac arteries. Colonic diverticulosis '
+                 'without diverticulitis. Small hiatal hernia. Bibasilar dependent atelectasis. Degenerative changes '
+                 'of the thoracolumbar spine with multilevel osteophytes.')
+        self.index.add(liver, '<p>Liver.</p>')
+        for different in [self.BASE.replace('left', 'right'),
+                          self.BASE.replace('L4-5', 'L5-S1'),
+                          self.BASE.replace('No acute fracture', 'Acute fracture'),
+                          self.BASE.replace('moderate', 'severe'),
+                          self.BASE + ' 3 mm nodule.',
+                          'Small renal cyst.',
+                          # A changed organ, a changed finding and an added finding
+                          liver.replace('in the liver', 'in the pancreas'),
+                          liver.replace('Enhancing lesion', 'Enhancing mass'),
+                          liver + ' Lytic bone lesion in the pelvis.']:
+            self.assertIsNone(self.index.get(different), different)
+        self.assertIsNone(NearDuplicateIndex(self.index.db_path, version='v2').get(self.BASE))
+        self.assertEqual(self.index.stats()['hits'], 0)
+        self.assertEqual(self.index.stats()['misses'], 9)
+    
+    def test_translate_uses_the_index_before_openai(self):
+        """Test that a near-duplicate skips the model and new translations are indexed"""
+        cache = TranslationCache(os.path.join(self.tmpdir.name, 'exact.db'), version='v1')
+        response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='A small cyst.'))])
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.return_value = response
+        with mock.patch.object(radiology_app, 'translation_cache', cache), \
+                mock.patch.object(radiology_app, 'near_duplicates', self.index), \
+                mock.patch.object(radiology_app, 'get_openai_client', return_value=fake_client):
+            self.assertEqual(radiology_app._translate(self.BASE.replace('L4-5', 'L4-L5')), '<p>Stored.</p>')
+            fake_client.chat.completions.create.assert_not_called()
+            first = radiology_app._translate('Simple cyst in the left kidney.')
+            second = radiology_app._translate('Simple cyst in the LEFT kidney. Clinical correlation recommended.')
+        self.assertEqual(first, second)
+        self.assertEqual(fake_client.chat.completions.create.call_count, 1)
+
+class TestOpenAIClient(unittest.TestCase):
+    
+    def setUp(self):
+        radiology_app._openai_client = None
+        radiology_app._openai_client_pid = None
+    
+    def tearDown(self):
+        radiology_app._openai_client = None
+        radiology_app._openai_client_pid = None
+    
+    def test_client_is_reused_within_a_worker(self):
+        """Test that repeated calls share one client and connection pool"""
+        with mock.patch('openai.OpenAI') as openai_cls:
+            first = radiology_app.get_openai_client()
+            second = radiology_app.get_openai_client()
+        self.assertIs(first, second)
+        self.assertEqual(openai_cls.call_count, 1)
+    
+    def test_client_is_rebuilt_after_fork(self):
+        """Test that a forked worker does not reuse its parent's sockets"""
+        with mock.patch('openai.OpenAI') as openai_cls:
+            radiology_app.get_openai_client()
+            radiology_app._openai_client_pid = -1
+            radiology_app.get_openai_client()
+        self.assertEqual(openai_cls.call_count, 2)
+    
+    def test_base_url_override(self):
+        """Test that a local stand-in base URL is passed to the client"""
+        with mock.patch.object(radiology_app, 'OPENAI_BASE_URL', 'http://127.0.0.1:9999/v1'), \
+                mock.patch('openai.OpenAI') as openai_cls:
+            radiology_app.get_openai_client()
+        self.assertEqual(openai_cls.call_args.kwargs['base_url'], 'http://127.0.0.1:9999/v1')
+
+class TestTranslationJobs(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'jobs.db')
+        flask_app = Flask(__name__)
+        flask_app.register_blueprint(app)
+        self.client = flask_app.test_client()
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def make_queue(self, handler, **kwargs):
+        return TranslationJobQueue(handler=handler, db_path=self.db_path, **kwargs)
+    
+    def test_job_succeeds(self):
+        """Test that a finished job reports its translation"""
+        queue = self.make_queue(lambda impression, translation_id: f"<p>{impression}</p>")
+        job = queue.wait(queue.submit('Unremarkable study.', 'trans_1'))
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['translation'], '<p>Unremarkable study.</p>')
+        self.assertEqual(job['translation_id'], 'trans_1')
+    
+    def test_job_failure_is_reported(self):
+        """Test that a handler exception becomes a failed job"""
+        def handler(impression, translation_id):
+            raise RuntimeError('upstream unavailable')
+        queue = self.make_queue(handler)
+        job = queue.wait(queue.submit('Unremarkable study.'))
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], 'upstream unavailable')
+    
+    def test_queue_depth_is_bounded(self):
+        """Test that submissions beyond the queue depth are rejected"""
+        release = threading.Event()
+        queue = self.make_queue(lambda impression, translation_id: release.wait(5),
+                                max_workers=1, max_pending=1)
+        queue.submit('first')
+        with self.assertRaises(QueueFullError):
+            queue.submit('second')
+        release.set()
+        queue.shutdown()
+    
+    def test_slow_job_times_out(self):
+        """Test that a job running past its deadline is reported as timed out"""
+        release = threading.Event()
+        queue = self.make_queue(lambda impression, translation_id: release.wait(5),
+                                job_timeout=0.05)
+        job = queue.wait(queue.submit('slow'))
+        self.assertEqual(job['status'], 'timed_out')
+        release.set()
+        queue.shutdown()
+        self.assertEqual(queue.get(job['job_id'])['status'], 'timed_out')
+    
+    def test_timed_out_jobs_stop_calling_upstream(self):
+        """Test that a timed-out job makes no further calls and a queued one never starts"""
+        release = threading.Event()
+        calls = []
+        
+        def handler(impression, translation_id):
+            calls.append(impression)
+            release.wait(5)
+            radiology_app.retry_openai(lambda: calls.append(f"{impression} upstream"))
+            return '<p>done</p>'
+        
+        # The app checks the job context of its own jobs module
+        queue = radiology_app.TranslationJobQueue(handler=handler, db_path=self.db_path, max_workers=1,
+                                                  job_timeout=0.05)
+        running = queue.submit('running')
+        queued = queue.submit('queued')
+        self.assertEqual(queue.wait(running)['status'], 'timed_out')
+        self.assertEqual(queue.wait(queued)['status'], 'timed_out')
+        release.set()
+        queue.shutdown()
+        self.assertEqual(calls, ['running'])
+        self.assertEqual(queue.get(running)['error'], 'Translation timed out')
+    
+    def test_results_expire(self):
+        """Test that finished jobs disappear after the result TTL"""
+        queue = self.make_queue(lambda impression, translation_id: '<p>done</p>', result_ttl=0)
+        job_id = queue.submit('expiring')
+        queue.wait(job_id)
+        self.assertIsNone(queue.get(job_id))
+    
+    def test_submit_and_poll_endpoints(self):
+        """Test the job endpoints end to end"""
+        queue = self.make_queue(lambda impression, translation_id: '<p>Normal.</p>')
+        with mock.patch.object(radiology_app, 'job_queue', queue):
+            response = self.client.post('/translate/jobs', data={'impression': 'Unremarkable study.'})
+            self.assertEqual(response.status_code, 202)
+            job_id = response.get_json()['job_id']
+            queue.wait(job_id)
+            response = self.client.get(f'/translate/jobs/{job_id}')
+            self.assertEqual(response.get_json()['translation'], '<p>Normal.</p>')
+            self.assertEqual(self.client.get('/translate/jobs/missing').status_code, 404)
+    
+    def test_sync_endpoint_runs_on_job_queue(self):
+        """Test that /translate still answers synchronously through the queue"""
+        queue = self.make_queue(lambda impression, translation_id: '<p>Normal.</p>')
+        with mock.patch.object(radiology_app, 'job_queue', queue):
+            response = self.client.post('/translate', data={'impression': 'Unremarkable study.'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['translation'], '<p>Normal.</p>')
+
+class TestFeedbackStore(unittest.TestCase):
+    """Test cases for the SQLite feedback store"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'feedback.db')
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def entry(self, n, rating='thumbs_up'):
+        return {'id': f'trans_{n}', 'original_text': 'Normal.', 'translation': '<p>Normal.</p>',
+                'rating': rating, 'comment': ''}
+    
+    def test_concurrent_writers_do_not_lose_entries(self):
+        """Test that two stores on one database (like two workers) keep every write"""
+        stores = [FeedbackStore(self.db_path), FeedbackStore(self.db_path)]
+        def write(store, offset):
+            for n in range(50):
+                store.append(self.entry(offset + n))
+        threads = [threading.Thread(target=write, args=(store, i * 100)) for i, store in enumerate(stores)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        entries = stores[0].all()
+        self.assertEqual(len(entries), 100)
+        self.assertEqual(len({entry['id'] for entry in entries}), 100)
+    
+    def test_migrates_legacy_json_once(self):
+        """Test that feedback_data.json is imported once and then renamed"""
+        legacy_path = os.path.join(self.tmpdir.name, 'feedback_data.json')
+        with open(legacy_path, 'w') as f:
+            json.dump([dict(self.entry(1), timestamp='2024-05-01 10:00:00'),
+                       dict(self.entry(2, 'thumbs_down'), timestamp='2024-05-02 11:00:00')], f)
+        
+        store = FeedbackStore(self.db_path, legacy_path=legacy_path)
+        self.assertFalse(os.path.exists(legacy_path))
+        self.assertTrue(os.path.exists(legacy_path + '.migrated'))
+        
+        with open(legacy_path, 'w') as f:
+            json.dump([self.entry(3)], f)
+        FeedbackStore(self.db_path, legacy_path=legacy_path)
+        entries = store.all()
+        self.assertEqual([entry['id'] for entry in entries], ['trans_1', 'trans_2'])
+        self.assertEqual(entries[1]['timestamp'], '2024-05-02 11:00:00')
+    
+    def test_write_behind_batches_entries(self):
+        """Test that buffered entries are written by the flush thread or on demand"""
+        store = FeedbackStore(self.db_path, write_behind=True, batch_size=3, flush_interval=60)
+        reader = FeedbackStore(self.db_path)
+        store.append(self.entry(1))
+        store.append(self.entry(2))
+        self.assertEqual(reader.all(), [])
+        
+        store.append(self.entry(3))
+        deadline = time.time() + 5
+        while len(reader.all()) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(reader.all()), 3)
+        
+        store.append(self.entry(4))
+        store.flush()
+        self.assertEqual(len(reader.all()), 4)
+
+    def test_rollups_match_entries(self):
+        """Test that totals and hour/day ranges agree with the raw entries"""
+        stores = [FeedbackStore(self.db_path), FeedbackStore(self.db_path, write_behind=True, batch_size=7)]
+        rng = random.Random(3)
+        entries = []
+        for n in range(200):
+            timestamp = datetime(2024, 5, 1) + timedelta(minutes=rng.randint(0, 5 * 24 * 60))
+            entry = dict(self.entry(n, rng.choice(['thumbs_up', 'thumbs_down'])),
+                         timestamp=timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                         comment=rng.choice(['', '', 'unclear']))
+            entries.append((timestamp.timestamp(), entry))
+            stores[n % 2].append(entry)
+        stores[1].flush()
+        
+        def expected(low, high):
+            chosen = [e for ts, e in entries if low <= ts < high]
+            up = sum(e['rating'] == 'thumbs_up' for e in chosen)
+            return {'total_feedback': len(chosen), 'thumbs_up': up, 'thumbs_down': len(chosen) - up,
+                    'comments': sum(bool(e['comment']) for e in chosen),
+                    'approval_rate': up / len(chosen) * 100 if chosen else 0}
+        
+        self.assertEqual(stores[0].stats(), expected(0, float('inf')))
+        since = datetime(2024, 5, 1, 5).timestamp()
+        until = datetime(2024, 5, 4, 17).timestamp()
+        self.assertEqual(stores[0].stats(since, until), expected(since, until))
+        days = stores[0].buckets('day')
+        self.assertEqual(sum(day['total_feedback'] for day in days), 200)
+    
+    def test_rollups_are_backfilled(self):
+        """Test that feedback written before rollups existed is counted"""
+        FeedbackStore(self.db_path).append(self.entry(1))
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.execute("DELETE FROM feedback_rollups")
+            conn.execute("DELETE FROM migrations WHERE name = 'feedback_rollups'")
+        conn.close()
+        self.assertEqual(FeedbackStore(self.db_path).stats()['total_feedback'], 1)
+    
+    def test_stats_endpoint(self):
+        """Test that submitted feedback shows up in /feedback/stats"""
+        flask_app = Flask(__name__)
+        flask_app.register_blueprint(app)
+        client = flask_app.test_client()
+        with mock.patch.object(radiology_app, 'feedback_store', FeedbackStore(self.db_path)):
+            response = client.post('/feedback', json={'translation_id': 'trans_1', 'original': 'Normal.',
+                                                      'translation': '<p>Normal.</p>', 'rating': 'thumbs_up',
+                                                      'comment': 'clear'})
+            self.assertEqual(response.status_code, 200)
+            data = client.get('/feedback/stats?since=2000-01-01&bucket=day').get_json()
+            self.assertEqual(data['total_feedback'], 1)
+            self.assertEqual(data['comments'], 1)
+            self.assertEqual(len(data['buckets']), 1)
+            self.assertEqual(data['since'], '2000-01-01T00:00:00+00:00')
+            # Labels name the UTC day the bucket covers, whatever the host's time zone
+            today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+            self.assertEqual(data['buckets'][0]['start'], f"{today}T00:00:00+00:00")
+            self.assertEqual(client.get('/feedback/stats?since=yesterday').status_code, 400)
+
+class TestResilience(unittest.TestCase):
+    """Test the retries and circuit breaker around the OpenAI call"""
+    
+    def make_breaker(self, **kwargs):
+        self.now = 0.0
+        return CircuitBreaker('upstream', failure_rate=0.5, min_calls=4, window=60, open_seconds=30,
+                              clock=lambda: self.now, **kwargs)
+    
+    def fail(self):
+        raise ConnectionError('down')
+    
+    def test_breaker_opens_fails_fast_and_recovers(self):
+        """Test closed -> open at the failure rate -> half-open after the cool-down -> closed"""
+        breaker = self.make_breaker()
+        breaker.call(lambda: 'ok')
+        breaker.call(lambda: 'ok')
+        with self.assertLogs('radiologytool.app', level='WARNING') as logs:
+            for _ in range(2):
+                with self.assertRaises(ConnectionError):
+                    breaker.call(self.fail)
+        self.assertEqual(breaker.snapshot()['state'], 'open')
+        self.assertIn('Circuit for upstream opened: 2 of the last 4 calls failed', logs.output[-1])
+        
+        calls = []
+        with self.assertRaises(CircuitOpenError) as raised:
+            breaker.call(lambda: calls.append(1))
+        self.assertEqual(calls, [])
+        self.assertEqual(raised.exception.retry_after, 30)
+        
+        self.now = 31
+        self.assertEqual(breaker.snapshot()['state'], 'half_open')
+        with self.assertRaises(ConnectionError):
+            breaker.call(self.fail)
+        self.assertEqual(breaker.snapshot()['state'], 'open')
+        self.now = 62
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(breaker.snapshot()['state'], 'closed')
+        self.assertEqual(breaker.snapshot()['times_opened'], 2)
+    
+    def test_streams_that_break_midway_trip_the_breaker(self):
+        """Test that a stream that opens but fails while being read counts as a failed call"""
+        def broken_stream(**kwargs):
+            yield from fake_stream('The first finding is mild. ', 'The second ')
+            raise ConnectionError('stream reset')
+        
+        breaker = self.make_breaker(is_failure=radiology_app.is_transient_openai_error)
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.side_effect = broken_stream
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch.object(radiology_app, 'get_openai_client', return_value=fake_client), \
+                mock.patch.object(radiology_app, 'openai_breaker', breaker), \
+                mock.patch.object(radiology_app, 'translation_cache',
+                                  TranslationCache(os.path.join(tmpdir, 'cache.db'), version='v1')), \
+                mock.patch.object(radiology_app, 'near_duplicates', NO_NEAR_DUPLICATES):
+            for i in range(4):
+                with self.assertRaises(ConnectionError):
+                    list(radiology_app.stream_translation(f'Finding number {i}.'))
+            self.assertEqual(breaker.snapshot()['state'], 'open')
+            with self.assertRaises(CircuitOpenError):
+                list(radiology_app.stream_translation('Finding number 5.'))
+        self.assertEqual(fake_client.chat.completions.create.call_count, 4)
+    
+    def test_breaker_ignores_errors_that_are_not_failures(self):
+        """Test that client errors such as a bad request do not trip the breaker"""
+        breaker = self.make_breaker(is_failure=lambda error: not isinstance(error, ValueError))
+        for _ in range(6):
+            with self.assertRaises(ValueError):
+                breaker.call(lambda: int('x'))
+        self.assertEqual(breaker.snapshot()['state'], 'closed')
+    
+    def test_retries_back_off_with_jitter(self):
+        """Test bounded retries, growing jittered delays and no retry for other errors"""
+        attempts = []
+        delays = []
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise TimeoutError('slow')
+            return 'ok'
+        
+        result = call_with_retries(flaky, retries=3, base_delay=1, max_delay=10, sleep=delays.append,
+                                   retryable=lambda error: isinstance(error, TimeoutError))
+        self.assertEqual(result, 'ok')
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(0 <= delays[0] <= 1 and 0 <= delays[1] <= 2)
+        
+        always_slow = mock.Mock(side_effect=TimeoutError('slow'))
+        with self.assertRaises(TimeoutError):
+            call_with_retries(always_slow, retries=2, sleep=lambda delay: None)
+        self.assertEqual(always_slow.call_count, 3)
+        bad_request = mock.Mock(side_effect=ValueError('bad request'))
+        with self.assertRaises(ValueError):
+            call_with_retries(bad_request, retries=2, retryable=lambda error: isinstance(error, TimeoutError),
+                              sleep=lambda delay: None)
+        self.assertEqual(bad_request.call_count, 1)
+    
+    def test_open_circuit_serves_stale_cache_and_shows_on_health(self):
+        """Test that an open circuit serves an expired cached translation and is reported"""
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        cache = TranslationCache(os.path.join(tmpdir.name, 'cache.db'), version='v1', ttl=-1)
+        cache.set('Small renal cyst.', '<p>Old translation.</p>')
+        # Built from the app's own import so the app catches its CircuitOpenError
+        breaker = radiology_app.CircuitBreaker('The translation service', open_seconds=30)
+        breaker._open(time.monotonic())
+        flask_app = Flask(__name__)
+        flask_app.register_blueprint(app)
+        with mock.patch.object(radiology_app, 'openai_breaker', breaker), \
+                mock.patch.object(radiology_app, 'translation_cache', cache), \
+                mock.patch.object(radiology_app, 'near_duplicates', NO_NEAR_DUPLICATES), \
+                mock.patch.object(radiology_app, 'get_openai_client') as get_client:
+            self.assertIsNone(cache.get('Small renal cyst.'))
+            self.assertEqual(radiology_app._translate('Small renal cyst.'), '<p>Old translation.</p>')
+            self.assertIn('temporarily unavailable', radiology_app.translate_radiology_impression('Liver lesion.'))
+            health = flask_app.test_client().get('/health?format=json').get_json()
+        get_client.return_value.chat.completions.create.assert_not_called()
+        self.assertEqual(health['openai_circuit']['state'], 'open')
+    
+    def test_limiter_queues_then_sheds_overflow(self):
+        """Test that calls over the cap wait for a slot and are shed once the line is full"""
+        limiter = ConcurrencyLimiter('upstream', max_in_flight=1, max_waiting=1, max_wait=5)
+        release = threading.Event()
+        entered = threading.Event()
+        def hold():
+            with limiter.slot():
+                entered.set()
+                release.wait(5)
+        holder = threading.Thread(target=hold)
+        holder.start()
+        entered.wait(5)
+        
+        waited = []
+        def wait_for_slot():
+            with limiter.slot():
+                waited.append(1)
+        waiter = threading.Thread(target=wait_for_slot)
+        waiter.start()
+        for _ in range(100):
+            if limiter.snapshot()['waiting'] == 1:
+                break
+            time.sleep(0.01)
+        self.assertTrue(limiter.saturated())
+        with self.assertRaises(OverloadedError):
+            with limiter.slot():
+                pass
+        
+        release.set()
+        holder.join()
+        waiter.join()
+        self.assertEqual(waited, [1])
+        self.assertEqual(limiter.snapshot(), {'in_flight': 0, 'waiting': 0, 'max_in_flight': 1,
+                                              'max_waiting': 1, 'shed': 1})
+        
+        timed_out = ConcurrencyLimiter('upstream', max_in_flight=1, max_waiting=1, max_wait=0.05)
+        with timed_out.slot():
+            with self.assertRaises(OverloadedError):
+                with timed_out.slot():
+                    pass
+    
+    def test_saturated_gate_sheds_streams_with_503(self):
+        """Test that the stream endpoint answers 503 with Retry-After when no slot can be had"""
+        gate = mock.Mock(saturated=mock.Mock(return_value=True), max_wait=10)
+        gate.name = 'The translation service'
+        flask_app = Flask(__name__)
+        flask_app.register_blueprint(app)
+        with mock.patch.object(radiology_app, 'llm_gate', gate):
+            response = flask_app.test_client().post('/translate/stream', data={'impression': 'Liver lesion.'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
+class TestSingleFlight(unittest.TestCase):
+    """Test cases for coalescing identical in-flight translations"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'inflight.db')
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_concurrent_callers_share_one_call(self):
+        """Test that threads asking for the same key wait for a single call"""
+        flight = SingleFlight(db_path=self.db_path)
+        calls = []
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return '<p>Normal.</p>'
+        
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['<p>Normal.</p>'] * 5)
+        self.assertEqual(flight.stats()['collapsed'], 4)
+        self.assertEqual(flight.stats()['in_flight'], 0)
+    
+    def test_error_is_shared_with_waiters(self):
+        """Test that a failed call raises in every waiting thread"""
+        flight = SingleFlight()
+        def failing():
+            time.sleep(0.2)
+            raise RuntimeError('upstream unavailable')
+        
+        errors = []
+        def call():
+            try:
+                flight.do('key', failing)
+            except RuntimeError as e:
+                errors.append(str(e))
+        
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, ['upstream unavailable'] * 3)
+    
+    def test_waits_for_claim_held_by_another_worker(self):
+        """Test that a key claimed by another process is answered from recheck"""
+        flight = SingleFlight(db_path=self.db_path, poll_interval=0.01)
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.execute("INSERT INTO inflight (key, owner, started_at) VALUES (?, ?, ?)",
+                         ('key', os.getpid() + 1, time.time()))
+        conn.close()
+        
+        polls = []
+        def recheck():
+            polls.append(1)
+            return '<p>From another worker.</p>' if len(polls) >= 3 else None
+        fn = mock.Mock(return_value='<p>Own call.</p>')
+        
+        self.assertEqual(flight.do('key', fn, recheck=recheck), '<p>From another worker.</p>')
+        fn.assert_not_called()
+        self.assertEqual(flight.stats()['collapsed_across_workers'], 1)
+    
+    def test_stale_claim_is_taken_over(self):
+        """Test that a claim older than the timeout does not block forever"""
+        flight = SingleFlight(db_path=self.db_path, claim_timeout=1)
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.execute("INSERT INTO inflight (key, owner, started_at) VALUES (?, ?, ?)",
+                         ('key', os.getpid() + 1, time.time() - 5))
+        conn.close()
+        
+        self.assertEqual(flight.do('key', lambda: '<p>Own call.</p>', recheck=lambda: None),
+                         '<p>Own call.</p>')
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM inflight").fetchone()[0], 0)
+        conn.close()
+
+
+def fake_stream(*pieces):
+    """Chat-completions stream chunks carrying the given text pieces"""
+    return [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+            for piece in pieces]
+
+class TestStreamingTranslation(unittest.TestCase):
+    
+    RAW = "Sure! There is mild stenosis at L4-L5. The lesion is benign. This can cause pain."
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        flask_app = Flask(__name__)
+        flask_app.register_blueprint(app)
+        self.client = flask_app.test_client()
+        self.cache = TranslationCache(os.path.join(self.tmpdir.name, 'cache.db'), version='v1')
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_formatter_releases_complete_sentences(self):
+        """Test that text is held back until a sentence is complete"""
+        formatter = StreamingFormatter()
+        self.assertEqual(formatter.feed("Sure! There is mild sten"), '')
+        released = formatter.feed("osis at L4-L5. The les")
+        self.assertEqual(released, "There is mild stenosis (narrowing) at L4-L5 (the area in your lower back). ")
+        self.assertEqual(formatter.feed("ion is"), '')
+        self.assertEqual(formatter.finish(), "The lesion (area of abnormal tissue) is")
+    
+    def test_formatter_matches_single_paragraph_for_simple_text(self):
+        """Test that streamed sentences add up to the one-shot formatting"""
+        formatter = StreamingFormatter()
+        streamed = ''.join(formatter.feed(piece) for piece in self.RAW.split(' ')[:1] + 
+                           [' ' + word for word in self.RAW.split(' ')[1:]])
+        streamed += formatter.finish()
+        self.assertEqual(f"<p>{streamed}</p>", format_single_paragraph(self.RAW))
+    
+    def test_stream_endpoint_sends_chunks_then_final_html(self):
+        """Test the SSE endpoint with a fake streaming completion"""
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.return_value = fake_stream(
+            *[piece + ' ' for piece in self.RAW.split(' ')])
+        with mock.patch.object(radiology_app, 'get_openai_client', return_value=fake_client), \
+                mock.patch.object(radiology_app, 'translation_cache', self.cache), \
+                mock.patch.object(radiology_app, 'near_duplicates', NO_NEAR_DUPLICATES):
+            response = self.client.post('/translate/stream', data={'impression': 'Mild stenosis L4-L5'})
+            body = response.get_data(as_text=True)
+        
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertTrue(fake_client.chat.completions.create.call_args.kwargs['stream'])
+        events = [block.split('\n') for block in body.strip().split('\n\n')]
+        self.assertEqual(events[0][0], 'event: chunk')
+        self.assertEqual(events[-1][0], 'event: done')
+        done = json.loads(events[-1][1][len('data: '):])
+        self.assertEqual(done['translation'], format_single_paragraph(self.RAW + ' '))
+        self.assertEqual(self.cache.get('Mild stenosis L4-L5'), done['translation'])
+    
+    def test_stream_endpoint_serves_cached_translation(self):
+        """Test that a cached impression is answered with a single done event"""
+        self.cache.set('Small renal cyst.', '<p>Cyst.</p>')
+        with mock.patch.object(radiology_app, 'translation_cache', self.cache), \
+                mock.patch.object(radiology_app, 'near_duplicates', NO_NEAR_DUPLICATES):
+            body = self.client.post('/translate/stream', data={'impression': 'Small renal cyst.'}).get_data(as_text=True)
+        self.assertTrue(body.startswith('event: done'))
+        self.assertIn('<p>Cyst.</p>', body)
+    
+    def test_stream_endpoint_rejects_get(self):
+        """Test that report text cannot be sent in a query string, where access logs would keep it"""
+        response = self.client.get('/translate/stream?impression=Small%20renal%20cyst.')
+        self.assertEqual(response.status_code, 405)
+
+class TestBatchTranslation(unittest.TestCase):
+    
+    def setUp(self):
+        flask_app = Flask(__name__)
+        flask_app.register_blueprint(app)
+        self.client = flask_app.test_client()
+    
+    def test_batch_runs_concurrently_and_keeps_order(self):
+        """Test that a batch takes about as long as one call and keeps input order"""
+        calls = []
+        def slow_translate(impression):
+            calls.append(impression)
+            time.sleep(0.2)
+            if impression == 'bad':
+                raise RuntimeError('upstream unavailable')
+            return f"<p>{impression}</p>"
+        
+        impressions = [f"impression {i}" for i in range(8)] + ['Impression  0', 'bad', '']
+        with mock.patch.object(radiology_app, '_translate', side_effect=slow_translate):
+            started = time.monotonic()
+            response = self.client.post('/translate/batch', json={'impressions': impressions})
+            elapsed = time.monotonic() - started
+        
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(len(calls), 9)
+        self.assertEqual([r['index'] for r in data['results']], list(range(11)))
+        self.assertEqual(data['results'][3]['translation'], '<p>impression 3</p>')
+        self.assertEqual(data['results'][8]['translation'], '<p>impression 0</p>')
+        self.assertEqual(data['results'][8]['translation_id'], data['results'][0]['translation_id'])
+        self.assertIn('upstream unavailable', data['results'][9]['error'])
+        self.assertIn('error', data['results'][10])
+        self.assertEqual(data['summary'], {'total': 11, 'distinct': 9, 'succeeded': 9, 'failed': 2})
+    
+    def test_batch_size_is_limited(self):
+        """Test that oversized batches are rejected"""
+        impressions = ['x'] * (radiology_app.TRANSLATION_BATCH_MAX + 1)
+        response = self.client.post('/translate/batch', json={'impressions': impressions})
+        self.assertEqual(response.status_code, 400)
+
+class TestStructuredLogging(unittest.TestCase):
+    """Test the queued JSON lines log used for translation and feedback events"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'records.jsonl')
+        file_handler = logging.FileHandler(self.path)
+        file_handler.setFormatter(JsonLinesFormatter(max_field_chars=20))
+        self.handler = BackgroundLogHandler(file_handler)
+        self.addCleanup(file_handler.close)
+        self.logger = logging.getLogger(f"test.records.{self.id()}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+    
+    def read_records(self):
+        self.handler.stop()
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+    
+    def test_records_are_written_by_the_listener_thread(self):
+        """Test one compact record per event, with long fields cut and debug fields sampled"""
+        writers = []
+        original_emit = logging.FileHandler.emit
+        def emit(handler, record):
+            writers.append(threading.current_thread().name)
+            original_emit(handler, record)
+        
+        with mock.patch.object(logging.FileHandler, 'emit', emit):
+            EventLogger(self.logger, debug_sample_rate=1.0).log(
+                'translation', translation_id='t1', impression='x' * 50, debug={'raw_text': 'raw'})
+            EventLogger(self.logger, debug_sample_rate=0.0).log('feedback', rating='thumbs_up',
+                                                                debug={'raw_text': 'raw'})
+            records = self.read_records()
+        
+        self.assertNotIn(threading.current_thread().name, writers)
+        self.assertEqual([r['event'] for r in records], ['translation', 'feedback'])
+        self.assertEqual(records[0]['impression'], 'x' * 20 + '...(+30 chars)')
+        self.assertEqual(records[0]['debug'], {'raw_text': 'raw'})
+        self.assertNotIn('debug', records[1])
+    
+    def test_translation_and_feedback_are_logged_once(self):
+        """Test that the endpoints log through the event logger instead of writing the file directly"""
+        flask_app = Flask(__name__)
+        flask_app.register_blueprint(app)
+        client = flask_app.test_client()
+        logged = []
+        with mock.patch.object(radiology_app.events, 'log', side_effect=lambda event, **fields: logged.append(event)), \
+                mock.patch.object(radiology_app, 'feedback_store', mock.Mock()), \
+                mock.patch('builtins.open', side_effect=AssertionError('synchronous file write')):
+            radiology_app.log_translation('t1', 'impression', '<p>translation</p>')
+            response = client.post('/feedback', json={'translation_id': 't1', 'original': 'impression',
+                                                      'translation': '<p>translation</p>', 'rating': 'thumbs_up'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(logged, ['translation', 'feedback'])
+
+class TestLLMMetrics(unittest.TestCase):
+    """Test the OpenAI call metrics and their Prometheus endpoint"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, 'metrics.db')
+        self.metrics = LLMMetrics(self.db_path, buckets=(1, 5), timeout_errors=(TimeoutError,))
+    
+    def test_workers_share_counters(self):
+        """Test that two instances on one file, like two workers, add up in one scrape"""
+        other_worker = LLMMetrics(self.db_path, buckets=(1, 5))
+        self.metrics.record('gpt-3.5-turbo', 0.5, 'success', prompt_tokens=1000, completion_tokens=2000)
+        other_worker.record('gpt-3.5-turbo', 3.0, 'success', prompt_tokens=1000, completion_tokens=0)
+        other_worker.record('gpt-3.5-turbo', 7.0, 'timeout', error='APITimeoutError')
+        text = self.metrics.render()
+        
+        success = 'model="gpt-3.5-turbo",outcome="success"'
+        self.assertIn(f'radiology_llm_request_duration_seconds_bucket{{{success},le="1"}} 1', text)
+        self.assertIn(f'radiology_llm_request_duration_seconds_bucket{{{success},le="5"}} 2', text)
+        self.assertIn(f'radiology_llm_request_duration_seconds_bucket{{{success},le="+Inf"}} 2', text)
+        self.assertIn(f'radiology_llm_request_duration_seconds_sum{{{success}}} 3.5', text)
+        self.assertIn('radiology_llm_tokens_total{model="gpt-3.5-turbo",type="prompt"} 2000', text)
+        self.assertIn('radiology_llm_cost_usd_total{model="gpt-3.5-turbo"} 0.004', text)
+        self.assertIn('radiology_llm_timeouts_total{model="gpt-3.5-turbo"} 1', text)
+        self.assertIn('radiology_llm_errors_total{model="gpt-3.5-turbo",type="APITimeoutError"} 1', text)
+        self.assertIn('# TYPE radiology_llm_request_duration_seconds histogram', text)
+    
+    def test_translation_call_is_observed(self):
+        """Test that a translation records usage, and a failing call records an error"""
+        response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='All clear.'))],
+                                   usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30))
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.side_effect = [response, ValueError('bad request')]
+        cache = TranslationCache(os.path.join(self.tmpdir.name, 'cache.db'), version='v1')
+        flask_app = Flask(__name__)
+        flask_app.register_blueprint(app)
+        with mock.patch.object(radiology_app, 'get_openai_client', return_value=fake_client), \
+                mock.patch.object(radiology_app, 'translation_cache', cache), \
+                mock.patch.object(radiology_app, 'near_duplicates', NO_NEAR_DUPLICATES), \
+                mock.patch.object(radiology_app, 'llm_metrics', self.metrics):
+            radiology_app._translate_uncached('Normal study')
+            with self.assertRaises(ValueError):
+                radiology_app._translate_uncached('Another study')
+            response = flask_app.test_client().get('/metrics')
+        
+        text = response.get_data(as_text=True)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        self.assertIn('radiology_llm_tokens_total{model="gpt-3.5-turbo",type="completion"} 30', text)
+        self.assertIn('radiology_llm_requests_total{model="gpt-3.5-turbo",outcome="error"} 1', text)
+        self.assertIn('radiology_llm_errors_total{model="gpt-3.5-turbo",type="ValueError"} 1', text)
+    
+    def test_streamed_call_times_only_openai(self):
+        """Test that a stream counts each attempt, leaves out slow reading and records a disconnect"""
+        pieces = fake_stream('First finding is mild. ', 'Second finding is small. ', 'Third finding is stable.')
+        usage = SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=50, completion_tokens=10))
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.side_effect = [ConnectionError('reset'), pieces + [usage], list(pieces)]
+        cache = TranslationCache(os.path.join(self.tmpdir.name, 'cache.db'), version='v1')
+        breaker = CircuitBreaker('upstream', min_calls=100, is_failure=radiology_app.is_transient_openai_error)
+        with mock.patch.object(radiology_app, 'get_openai_client', return_value=fake_client), \
+                mock.patch.object(radiology_app, 'translation_cache', cache), \
+                mock.patch.object(radiology_app, 'near_duplicates', NO_NEAR_DUPLICATES), \
+                mock.patch.object(radiology_app, 'openai_breaker', breaker), \
+                mock.patch.object(radiology_app, 'OPENAI_RETRY_BASE_DELAY', 0), \
+                mock.patch.object(radiology_app, 'llm_metrics', self.metrics):
+            for _ in radiology_app.stream_translation('Three findings.'):
+                # A browser that is slow to take each chunk
+                time.sleep(0.2)
+            stream = radiology_app.stream_translation('Three other findings.')
+            self.assertEqual(next(stream)[0], 'chunk')
+            stream.close()
+        
+        values = self.metrics.values()
+        def requests(outcome):
+            return values.get(('radiology_llm_requests_total', f'model="gpt-3.5-turbo",outcome="{outcome}"'))
+        self.assertEqual(requests('error'), 1)
+        self.assertEqual(requests('success'), 1)
+        self.assertEqual(requests('cancelled'), 1)
+        self.assertLess(values[('radiology_llm_request_duration_seconds_sum',
+                                'model="gpt-3.5-turbo",outcome="success"')], 0.2)
+        self.assertEqual(values[('radiology_llm_tokens_total', 'model="gpt-3.5-turbo",type="prompt"')], 50)
+
+class TestLogReader(unittest.TestCase):
+    """Test paging backwards through the log and its rotated backups"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.log_path = os.path.join(self.tmpdir.name, 'translations_log.txt')
+        # 30 entries oldest first: 0-9 in .2, 10-19 in .1, 20-29 live; odd ones span two lines
+        for suffix, first in (('.2', 0), ('.1', 10), ('', 20)):
+            with open(self.log_path + suffix, 'w') as f:
+                for i in range(first, first + 10):
+                    f.write(f"2024-01-01 00:00:{i:02d},000 - INFO - entry {i} <b>\n")
+                    if i % 2:
+                        f.write(f"ORIGINAL: continuation of {i}\n")
+    
+    def numbers(self, page):
+        return [int(entry.split(' - ')[2].split()[1]) for entry in page['entries']]
+    
+    def test_pages_cover_every_file_in_order(self):
+        """Test that small blocks and pages still return every entry exactly once"""
+        seen = []
+        cursor = None
+        while True:
+            page = read_log_page(self.log_path, limit=7, cursor=cursor, block_size=16)
+            seen = self.numbers(page) + seen
+            cursor = page['cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, list(range(30)))
+        page = read_log_page(self.log_path, limit=3)
+        self.assertEqual(page['entries'][0], "2024-01-01 00:00:27,000 - INFO - entry 27 <b>\n"
+                                             "ORIGINAL: continuation of 27")
+    
+    def test_cursor_survives_rotation(self):
+        """Test that a cursor keeps pointing at the same entries after a rollover"""
+        page = read_log_page(self.log_path, limit=5)
+        self.assertEqual(self.numbers(page), list(range(25, 30)))
+        os.replace(self.log_path + '.2', self.log_path + '.3')
+        os.replace(self.log_path + '.1', self.log_path + '.2')
+        os.replace(self.log_path, self.log_path + '.1')
+        with open(self.log_path, 'w') as f:
+            f.write("2024-01-01 00:01:00,000 - INFO - entry 30\n")
+        self.assertEqual(self.numbers(read_log_page(self.log_path, limit=5, cursor=page['cursor'])),
+                         list(range(20, 25)))
+        with self.assertRaises(ValueError):
+            read_log_page(self.log_path, cursor='not-a-cursor')
+    
+    def test_view_logs_escapes_page_and_links_older(self):
+        """Test the /view-logs page, its JSON form and the older-entries link"""
+        flask_app = Flask(__name__)
+        flask_app.register_blueprint(app)
+        client = flask_app.test_client()
+        with mock.patch.object(radiology_app, 'log_file', self.log_path):
+            body = client.get('/view-logs?source=activity&limit=2').get_data(as_text=True)
+            data = client.get('/view-logs?source=activity&limit=2&format=json').get_json()
+            older = client.get(f"/view-logs?source=activity&format=json&limit=2&cursor={data['cursor']}").get_json()
+            self.assertEqual(client.get('/view-logs?cursor=bad').status_code, 400)
+        self.assertIn('entry 29 &lt;b&gt;', body)
+        self.assertNotIn('entry 27', body)
+        self.assertIn('Older entries', body)
+        self.assertEqual(self.numbers(older), [26, 27])
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
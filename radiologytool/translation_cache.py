@@ -0,0 +1,287 @@
+"""
+Two-tier cache for radiology translations.
+
+The first tier is an in-process LRU with size and TTL eviction. The second
+tier is a SQLite file that survives restarts and is shared by every worker
+process on the host. Entries hold the final HTML produced by
+format_single_paragraph and are keyed by a hash of the normalized impression
+plus a version fingerprint, so changing the prompt or the formatter makes
+every older entry unreachable.
+
+Clearing the cache bumps a generation counter stored next to the entries.
+Each worker compares it with the generation its memory tier was filled
+under, at most once per sync_interval, and empties its memory tier when it
+has changed, so a clear made through one worker reaches all of them. Expired
+rows are purged from the shared tier periodically, and it is trimmed to its
+newest max_disk_entries rows.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('radiologytool.app')
+
+
+def normalize_impression(impression):
+    """Collapse whitespace and case so trivially different pastes share a key"""
+    return ' '.join(impression.split()).lower()
+
+
+def fingerprint(*parts):
+    """Build a short version string from anything that changes the output"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+class TranslationCache:
+    """LRU memory cache backed by a SQLite store shared across workers"""
+
+    def __init__(self, db_path, version, max_entries=1000, ttl=30 * 24 * 3600, max_disk_entries=50000,
+                 sync_interval=1.0, purge_interval=300):
+        self.db_path = db_path
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.sync_interval = sync_interval
+        self.purge_interval = purge_interval
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._next_sync = 0.0
+        self._next_purge = time.time() + purge_interval
+        self._disk_enabled = self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        """Create the tables, drop rows written under another version and read the generation"""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    "key TEXT PRIMARY KEY, version TEXT NOT NULL, "
+                    "html TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS translations_created_at ON translations (created_at)")
+                conn.execute("CREATE TABLE IF NOT EXISTS cache_state (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+                with conn:
+                    conn.execute("INSERT OR IGNORE INTO cache_state (name, value) VALUES ('generation', 0)")
+                    conn.execute("DELETE FROM translations WHERE version != ? OR expires_at <= ?",
+                                 (self.version, time.time()))
+                self._generation = self._read_generation(conn)
+            finally:
+                conn.close()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Translation cache disk tier disabled: {e}")
+            return False
+
+    @staticmethod
+    def _read_generation(conn):
+        return conn.execute("SELECT value FROM cache_state WHERE name = 'generation'").fetchone()[0]
+
+    def _sync_generation(self, now):
+        """Empty the memory tier when the cache was cleared through another worker"""
+        if not self._disk_enabled or now < self._next_sync:
+            return
+        self._next_sync = now + self.sync_interval
+        try:
+            conn = self._connect()
+            try:
+                generation = self._read_generation(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Translation cache generation check failed: {e}")
+            return
+        with self._lock:
+            if generation != self._generation:
+                self._memory.clear()
+                self._generation = generation
+
+    def _purge(self, now):
+        """Delete expired rows and trim the shared tier to its newest max_disk_entries"""
+        self._next_purge = now + self.purge_interval
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM translations WHERE expires_at <= ?", (now,))
+                    conn.execute(
+                        "DELETE FROM translations WHERE key IN "
+                        "(SELECT key FROM translations ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,)
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Translation cache purge failed: {e}")
+
+    def make_key(self, impression):
+        """Hash the normalized impression together with the cache version"""
+        payload = f"{self.version}\0{normalize_impression(impression)}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _remember(self, key, html, expires_at):
+        with self._lock:
+            self._memory[key] = (html, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, impression, count_miss=True):
+        """
+        Return the cached HTML for an impression, or None on a miss.
+        Pass count_miss=False when polling so repeated checks do not skew the stats.
+        """
+        key = self.make_key(impression)
+        now = time.time()
+        self._sync_generation(now)
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                html, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return html
+                del self._memory[key]
+
+        row = None
+        if self._disk_enabled:
+            try:
+                conn = self._connect()
+                try:
+                    row = conn.execute(
+                        "SELECT html, expires_at FROM translations WHERE key = ? AND expires_at > ?",
+                        (key, now)
+                    ).fetchone()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Translation cache read failed: {e}")
+
+        if row is None:
+            if count_miss:
+                with self._lock:
+                    self.misses += 1
+            return None
+
+        html, expires_at = row
+        self._remember(key, html, expires_at)
+        with self._lock:
+            self.disk_hits += 1
+        return html
+
+    def get_stale(self, impression):
+        """
+        Return the stored HTML for an impression even if it has expired, for
+        use when a fresh translation cannot be made. Does not touch the stats.
+        """
+        key = self.make_key(impression)
+        self._sync_generation(time.time())
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                return entry[0]
+        if not self._disk_enabled:
+            return None
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT html FROM translations WHERE key = ?", (key,)).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Translation cache read failed: {e}")
+            return None
+        return row[0] if row else None
+
+    def set(self, impression, html):
+        """Store the formatted HTML for an impression in both tiers"""
+        key = self.make_key(impression)
+        now = time.time()
+        expires_at = now + self.ttl
+        self._remember(key, html, expires_at)
+
+        if not self._disk_enabled:
+            return
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO translations (key, version, html, created_at, expires_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, self.version, html, now, expires_at)
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Translation cache write failed: {e}")
+            return
+        if now >= self._next_purge:
+            self._purge(now)
+
+    def invalidate(self):
+        """Drop every entry from both tiers, and from the other workers' memory tiers at their next check"""
+        with self._lock:
+            self._memory.clear()
+        if not self._disk_enabled:
+            return
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("UPDATE cache_state SET value = value + 1 WHERE name = 'generation'")
+                    conn.execute("DELETE FROM translations")
+                    generation = self._read_generation(conn)
+                with self._lock:
+                    self._generation = generation
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Translation cache invalidation failed: {e}")
+
+    def stats(self):
+        """Hit/miss counters for this worker plus the size of each tier"""
+        disk_entries = None
+        if self._disk_enabled:
+            try:
+                conn = self._connect()
+                try:
+                    disk_entries = conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Translation cache stats failed: {e}")
+
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'version': self.version,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (hits / lookups) * 100 if lookups > 0 else 0,
+                'memory_entries': len(self._memory),
+                'disk_entries': disk_entries,
+            }
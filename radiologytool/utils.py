@@ -2,6 +2,18 @@
 Utilities for the Radiology Translator application.
 """
 
+import os
+import re
+import string
+from collections import namedtuple
+from functools import lru_cache
+
+from radiologytool.glossary import MappedGlossary
+
+# A leading "Impression:"-style label and list numbering, stripped before an impression is matched or split
+LEAD_IN = re.compile(r'^\s*(?:impression|findings|conclusion)\s*:\s*', re.IGNORECASE)
+NUMBERING = re.compile(r'(?:^|(?<=\s))\d+[.)]\s+')
+
 # Common medical terms and their simplified explanations
 COMMON_MEDICAL_TERMS = {
     "hypertension": "high blood pressure",
@@ -65,24 +77,187 @@ COMMON_MEDICAL_TERMS = {
 }
 
 
+TOKEN_PATTERN = re.compile(r'\w+')
+
+TermMatch = namedtuple('TermMatch', ['term', 'start', 'end'])
+
+# ASCII punctuation becomes a space; "_" is a word character and is kept
+PUNCTUATION_TO_SPACE = str.maketrans({c: ' ' for c in string.punctuation if c != '_'})
+
+# (singular ending, plural ending) pairs, so "nodules", "stenoses" and "vertebrae" find their terms
+PLURAL_ENDINGS = [('', 's'), ('', 'es'), ('sis', 'ses'), ('y', 'ies'), ('us', 'i'), ('a', 'ae'),
+                  ('um', 'a'), ('ix', 'ices'), ('ex', 'ices')]
+
+
+def plural_forms(word):
+    """The plural spellings of a word"""
+    return [word[:len(word) - len(singular)] + plural
+            for singular, plural in PLURAL_ENDINGS if word.endswith(singular)]
+
+
+def distinct_words(text):
+    """The set of lowercase TOKEN_PATTERN words in a text, split in C rather than one match at a time"""
+    words = set(text.lower().translate(PUNCTUATION_TO_SPACE).split())
+    # Pieces still holding other symbols, such as "–" or "•", are split by the pattern itself
+    for word in [word for word in words if not word.isalnum()]:
+        words.discard(word)
+        words.update(TOKEN_PATTERN.findall(word))
+    return words
+
+
+def singular_forms(word):
+    """The words a plural spelling may come from, the inverse of plural_forms"""
+    return [word[:len(word) - len(plural)] + singular
+            for singular, plural in PLURAL_ENDINGS if word.endswith(plural) and len(word) > len(plural)]
+
+
+class MedicalTermIndex:
+    """
+    Finds glossary terms in text as whole words, in one pass.
+    
+    Terms are stored in a trie keyed by lowercase word tokens, so multi-word
+    terms are matched token by token and "renal" no longer matches inside
+    "adrenal". A token that is not in the trie is also tried in its singular
+    forms, so "nodules" finds "nodule". Where terms overlap the longest one
+    starting first wins. A MappedGlossary is walked the same way through
+    prefix searches on its sorted keys instead of a trie, so nothing is built
+    in memory.
+    
+    When every term is a single word, terms_in skips the walk: the distinct
+    words of the text are intersected with a table of every term and its
+    plural forms, which keeps the work in C.
+    """
+    
+    def __init__(self, glossary):
+        self.glossary = glossary
+        self.mapped = isinstance(glossary, MappedGlossary)
+        self.order = {}
+        self.trie = {}
+        self.word_forms = None
+        # Most words start no term; remembering that saves a prefix search per word for a mapped glossary
+        self._first_node = lru_cache(maxsize=16384)(lambda token: self._child(None, token))
+        if self.mapped:
+            return
+        for i, term in enumerate(glossary):
+            tokens = TOKEN_PATTERN.findall(term.lower())
+            if not tokens:
+                continue
+            node = self.trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            # None marks the end of a term; tokens are never None
+            node[None] = term
+            self.order[term] = i
+        if all(list(node) == [None] for node in self.trie.values()):
+            # A word that is a term itself wins over a plural form of another term, as in the walk
+            self.word_forms = {}
+            for word, node in self.trie.items():
+                for form in plural_forms(word):
+                    self.word_forms.setdefault(form, node[None])
+            self.word_forms.update((word, node[None]) for word, node in self.trie.items())
+    
+    def _child(self, node, token):
+        """The trie node after token or one of its singular forms, or None"""
+        child = self._step(node, token)
+        if child is None:
+            for singular in singular_forms(token):
+                child = self._step(node, singular)
+                if child is not None:
+                    break
+        return child
+    
+    def _step(self, node, token):
+        """The trie node after token, or None; for a mapped glossary the node is the key so far"""
+        if not self.mapped:
+            return node.get(token) if node is not None else self.trie.get(token)
+        key = token if node is None else f"{node} {token}"
+        if len(key.split(' ')) > self.glossary.max_words or not self.glossary.has_prefix(key):
+            return None
+        return key
+    
+    def _term(self, node):
+        """The term ending at a node, or None"""
+        if not self.mapped:
+            return node.get(None)
+        found = self.glossary.lookup(node)
+        return found[1] if found else None
+    
+    @staticmethod
+    def _joins(gap):
+        """Whether the text between two tokens keeps them in one term"""
+        return bool(gap) and all(c.isspace() or c == '-' for c in gap)
+    
+    def find(self, text):
+        """
+        Returns a TermMatch (term, start, end) for every term occurrence in
+        the text, in order of appearance.
+        """
+        tokens = [(m.group().lower(), m.start(), m.end()) for m in TOKEN_PATTERN.finditer(text)]
+        matches = []
+        i = 0
+        while i < len(tokens):
+            node = self._first_node(tokens[i][0])
+            longest = None
+            j = i
+            while node is not None:
+                term = self._term(node)
+                if term is not None:
+                    longest = (term, j)
+                if j + 1 >= len(tokens) or not self._joins(text[tokens[j][2]:tokens[j + 1][1]]):
+                    break
+                j += 1
+                node = self._child(node, tokens[j][0])
+            if longest is None:
+                i += 1
+                continue
+            term, last = longest
+            matches.append(TermMatch(term, tokens[i][1], tokens[last][2]))
+            i = last + 1
+        return matches
+    
+    def find_batch(self, texts):
+        """Returns the matches for each text in a list of reports"""
+        return [self.find(text) for text in texts]
+    
+    def terms_in(self, text):
+        """Returns the distinct terms in the text, in glossary order"""
+        order = self.glossary.position if self.mapped else self.order.__getitem__
+        if self.word_forms is not None:
+            words = distinct_words(text)
+            return sorted({self.word_forms[word] for word in words.intersection(self.word_forms)}, key=order)
+        return sorted({match.term for match in self.find(text)}, key=order)
+
+
+# Set RADIOLOGY_GLOSSARY to a file built with radiologytool/glossary.py to use a large glossary
+GLOSSARY_PATH = os.environ.get('RADIOLOGY_GLOSSARY')
+GLOSSARY = MappedGlossary(GLOSSARY_PATH) if GLOSSARY_PATH else COMMON_MEDICAL_TERMS
+# Names the glossary's contents for the translation cache version without mapping the file
+GLOSSARY_VERSION = f"sha256={GLOSSARY.digest}" if GLOSSARY_PATH else COMMON_MEDICAL_TERMS
+
+MEDICAL_TERM_INDEX = MedicalTermIndex(GLOSSARY)
+
+
 def identify_medical_terms(text):
     """
     Identifies medical terms in the given text.
     Returns a list of identified terms.
     """
-    identified_terms = []
-    for term in COMMON_MEDICAL_TERMS:
-        if term.lower() in text.lower():
-            identified_terms.append(term)
-    
-    return identified_terms
+    return MEDICAL_TERM_INDEX.terms_in(text)
+
+
+def identify_medical_terms_batch(texts):
+    """
+    Identifies medical terms in each of a list of reports.
+    Returns one list of identified terms per report.
+    """
+    return [MEDICAL_TERM_INDEX.terms_in(text) for text in texts]
 
 
 def get_simplified_explanation(term):
     """
     Returns a simplified explanation for a medical term.
     """
-    return COMMON_MEDICAL_TERMS.get(term.lower(), "")
+    return GLOSSARY.get(term.lower(), "")
 
 
 def enhance_translation_with_definitions(translation, medical_terms):
@@ -91,15 +266,18 @@ def enhance_translation_with_definitions(translation, medical_terms):
     This is unused in the current version but could be used to enhance 
     the translation with tooltips or explanations for medical terms.
     """
-    enhanced_translation = translation
-    
-    for term in medical_terms:
-        if term.lower() in enhanced_translation.lower():
-            explanation = get_simplified_explanation(term)
-            if explanation:
-                # Format term with its definition
-                formatted_term = f"{term} ({explanation})"
-                # Replace the term with the formatted version
-                enhanced_translation = enhanced_translation.replace(term, formatted_term)
+    wanted = {term.lower() for term in medical_terms}
+    pieces = []
+    last = 0
+    for match in MEDICAL_TERM_INDEX.find(translation):
+        if match.term.lower() not in wanted:
+            continue
+        explanation = get_simplified_explanation(match.term)
+        if explanation:
+            # Format the term as written with its definition
+            pieces.append(translation[last:match.end])
+            pieces.append(f" ({explanation})")
+            last = match.end
+    pieces.append(translation[last:])
     
-    return enhanced_translation 
\ No newline at end of file
+    return ''.join(pieces)
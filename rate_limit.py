@@ -0,0 +1,220 @@
+"""
+Per-client rate limiting for the hub.
+
+Each client (an API key from the X-API-Key header when it is one of the
+configured keys, otherwise the client IP) gets a token bucket per route
+group. Unknown keys are ignored, so a client cannot get a fresh budget by
+sending a new key with each request. A bucket holds up to `burst` tokens and
+refills at `rate` tokens per second; a request takes one token (a batch
+takes one per item, see DEFAULT_COSTS), or is answered with 429 and a Retry-After header saying when the next token will
+be available. Buckets live in a SQLite file, so every worker process on the
+host enforces the same budget.
+
+Limits are set per path prefix, so the translation endpoints can have a
+tight budget while the lab helper keeps a generous one. Override the
+defaults with RATE_LIMITS, a JSON object such as
+{"/radiology/translate": {"requests": 10, "per": 60, "burst": 20}}; a rule
+with "requests": 0 exempts its prefix from any shorter prefix's limit.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import sqlite3
+import time
+
+from flask import jsonify, request
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES = {
+    # Every translation endpoint, including stream, batch and jobs, shares one budget
+    '/radiology/translate': {'requests': 10, 'per': 60, 'burst': 20, 'methods': ['POST']},
+    # Polling a job's status is cheap and must not use up the translation budget
+    '/radiology/translate/jobs': {'requests': 0, 'methods': ['GET']},
+    '/radiology/feedback': {'requests': 30, 'per': 60, 'burst': 30, 'methods': ['POST']},
+    '/lab-value-helper': {'requests': 300, 'per': 60, 'burst': 100},
+    # Loading the page's scripts and styles must not use up the lab budget
+    '/lab-value-helper/static': {'requests': 0, 'methods': ['GET']},
+}
+
+# Routes that take one token per item of a list in the JSON body rather than one per request
+DEFAULT_COSTS = {
+    '/radiology/translate/batch': 'impressions',
+}
+
+
+class RateLimitRule:
+    """A token bucket budget for every path under a prefix"""
+
+    def __init__(self, prefix, requests, per=60, burst=None, methods=None):
+        self.prefix = prefix.rstrip('/') or '/'
+        self.unlimited = not requests
+        self.rate = requests / per
+        self.burst = burst if burst is not None else requests
+        self.methods = {method.upper() for method in methods} if methods else None
+
+    def matches(self, path, method):
+        if self.methods is not None and method not in self.methods:
+            return False
+        return path == self.prefix or path.startswith(self.prefix + '/') or self.prefix == '/'
+
+
+def load_rules(value=None):
+    """Rules from the defaults merged with a RATE_LIMITS JSON object, longest prefix first"""
+    config = {prefix: dict(rule) for prefix, rule in DEFAULT_RULES.items()}
+    if value:
+        try:
+            for prefix, rule in json.loads(value).items():
+                config[prefix] = dict(config.get(prefix, {}), **rule)
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Ignoring invalid RATE_LIMITS: {e}")
+    rules = [RateLimitRule(prefix, **rule) for prefix, rule in config.items()]
+    return sorted(rules, key=lambda rule: len(rule.prefix), reverse=True)
+
+
+def hash_api_key(api_key):
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+def load_api_keys(value=None):
+    """SHA-256 hex digests of the accepted API keys, from a comma-separated RATE_LIMIT_API_KEYS"""
+    return frozenset(digest.strip().lower() for digest in (value or '').split(',') if digest.strip())
+
+
+class TokenBucketStore:
+    """Token buckets in SQLite, updated atomically so workers share them"""
+
+    def __init__(self, db_path, cleanup_probability=0.01):
+        self.db_path = db_path
+        self.cleanup_probability = cleanup_probability
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.isolation_level = None
+        return conn
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS buckets_full_at ON buckets (full_at)")
+        finally:
+            conn.close()
+
+    def take(self, key, rate, burst, cost=1, now=None):
+        """
+        Take cost tokens from the bucket if it has them. Returns
+        (allowed, retry_after_seconds, tokens_left).
+        """
+        now = time.time() if now is None else now
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock up front so the read-modify-write is atomic
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    tokens = float(burst)
+                else:
+                    tokens = min(float(burst), row[0] + max(now - row[1], 0) * rate)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                    retry_after = 0
+                else:
+                    retry_after = (cost - tokens) / rate
+                full_at = now + (burst - tokens) / rate
+                conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                             (key, tokens, now, full_at))
+                if random.random() < self.cleanup_probability:
+                    # A bucket that has refilled completely is the same as no bucket
+                    conn.execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        return allowed, retry_after, tokens
+
+
+def client_identity(trusted_proxies=0, api_keys=frozenset()):
+    """The caller's API key (hashed) if it is an accepted one, otherwise its IP behind the given number of proxies"""
+    api_key = request.headers.get('X-API-Key')
+    if api_key:
+        digest = hash_api_key(api_key)
+        if digest in api_keys:
+            return 'key:' + digest[:32]
+    address = request.remote_addr or 'unknown'
+    if trusted_proxies:
+        forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+        if len(forwarded) >= trusted_proxies:
+            address = forwarded[-trusted_proxies]
+    return 'ip:' + address
+
+
+class RateLimiter:
+    """Checks every request against the first matching rule before it reaches a view"""
+
+    def __init__(self, store, rules, trusted_proxies=0, api_keys=frozenset(), enabled=True, costs=None):
+        self.store = store
+        self.rules = rules
+        self.costs = DEFAULT_COSTS if costs is None else costs
+        self.trusted_proxies = trusted_proxies
+        self.api_keys = api_keys
+        self.enabled = enabled
+        self.limited = 0
+
+    def rule_for(self, path, method):
+        for rule in self.rules:
+            if rule.matches(path, method):
+                return rule
+        return None
+
+    def cost_of(self, rule):
+        """Tokens the current request takes: one, or one per item for a batch route, at most a full bucket"""
+        field = self.costs.get(request.path)
+        if field is None or request.method != 'POST':
+            return 1
+        # Flask keeps the parsed body, so the view does not parse it again
+        data = request.get_json(silent=True) if request.is_json else None
+        items = data.get(field) if isinstance(data, dict) else None
+        if not isinstance(items, list):
+            return 1
+        # A batch bigger than the bucket could never be allowed; the view rejects oversized batches itself
+        return min(max(len(items), 1), max(rule.burst, 1))
+
+    def check(self):
+        """before_request hook: returns a 429 response when the client is over budget"""
+        if not self.enabled:
+            return None
+        rule = self.rule_for(request.path, request.method)
+        if rule is None or rule.unlimited:
+            return None
+        key = f"{rule.prefix}|{client_identity(self.trusted_proxies, self.api_keys)}"
+        try:
+            allowed, retry_after, _ = self.store.take(key, rule.rate, rule.burst, cost=self.cost_of(rule))
+        except sqlite3.Error as e:
+            # Failing open keeps the tools usable if the limiter store breaks
+            logger.warning(f"Rate limit check failed, allowing request: {e}")
+            return None
+        if allowed:
+            return None
+        self.limited += 1
+        response = jsonify({'error': 'Too many requests. Please slow down and try again shortly.'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+        return response
+
+    def init_app(self, app):
+        app.before_request(self.check)
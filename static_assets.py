@@ -0,0 +1,141 @@
+"""
+Fingerprinted, precompressed static files for the hub and its tools.
+
+When an app is set up, every file in its static folder and in its
+blueprints' static folders is hashed, and url_for('static', ...) or
+url_for('<blueprint>.static', ...) returns a name with the content hash in
+it, such as lab_helper.3f2a9c1b7d04.js. The file behind such a URL never
+changes (a new version gets a new URL), so it is served with a year-long
+immutable Cache-Control and browsers do not ask for it again. Text files are
+compressed once at setup with gzip, and with brotli when the brotli package
+is installed, and each response carries the smallest encoding the client
+accepts. Requests for the plain filename are still served by Flask, which
+has the browser revalidate them.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import posixpath
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_LENGTH = 12
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+def fingerprinted_name(filename, digest):
+    """style.css with digest 3f2a... becomes style.3f2a....css"""
+    root, ext = posixpath.splitext(filename)
+    return f"{root}.{digest}{ext}"
+
+
+def compress(data, mimetype, min_size=512):
+    """{encoding: body} for the encodings that make a compressible file smaller"""
+    if len(data) < min_size or not mimetype.startswith(COMPRESSIBLE_TYPES):
+        return {}
+    bodies = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in bodies.items() if len(body) < len(data)}
+
+
+def scan_folder(folder, min_size=512):
+    """Manifest of a static folder: filename -> fingerprinted name, and fingerprinted name -> asset"""
+    urls = {}
+    assets = {}
+    for directory, dirnames, filenames in os.walk(folder):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith('.'))
+        for name in sorted(filenames):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(directory, name)
+            filename = os.path.relpath(path, folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            fingerprinted = fingerprinted_name(filename, digest)
+            urls[filename] = fingerprinted
+            assets[fingerprinted] = {
+                'filename': filename,
+                'digest': digest,
+                'mimetype': mimetype,
+                'bodies': compress(data, mimetype, min_size),
+            }
+    return {'urls': urls, 'assets': assets}
+
+
+class StaticAssets:
+    """Serves an app's static folders under content-hashed URLs with long-lived caching"""
+
+    def __init__(self, max_age=365 * 24 * 3600, min_compress_size=512, enabled=True):
+        self.max_age = max_age
+        self.min_compress_size = min_compress_size
+        self.enabled = enabled
+
+    def init_app(self, app):
+        """Fingerprint the app's static files; call after its blueprints are registered"""
+        if not self.enabled:
+            return
+        folders = {}
+        if app.has_static_folder:
+            folders['static'] = app.static_folder
+        for name, blueprint in app.blueprints.items():
+            if blueprint.has_static_folder:
+                folders[f"{name}.static"] = blueprint.static_folder
+
+        manifests = {}
+        for endpoint, folder in folders.items():
+            if endpoint not in app.view_functions or not os.path.isdir(folder):
+                continue
+            manifest = scan_folder(folder, self.min_compress_size)
+            manifests[endpoint] = manifest
+            app.view_functions[endpoint] = self._view(app.view_functions[endpoint], folder, manifest)
+            logger.info(f"Fingerprinted {len(manifest['urls'])} static files for {endpoint}"
+                        + ("" if brotli is not None else " (brotli not installed, gzip only)"))
+
+        def fingerprint_url(endpoint, values):
+            manifest = manifests.get(endpoint)
+            if manifest is not None and 'filename' in values:
+                values['filename'] = manifest['urls'].get(values['filename'], values['filename'])
+
+        app.url_defaults(fingerprint_url)
+
+    def _view(self, send_static_file, folder, manifest):
+        def static(filename):
+            asset = manifest['assets'].get(filename)
+            if asset is None:
+                return send_static_file(filename=filename)
+            encoding = self._choose_encoding(asset)
+            if encoding is None:
+                response = send_from_directory(folder, asset['filename'], etag=asset['digest'], max_age=self.max_age)
+            else:
+                response = current_app.response_class(asset['bodies'][encoding], mimetype=asset['mimetype'])
+                response.headers['Content-Encoding'] = encoding
+                response.set_etag(f"{asset['digest']}-{encoding}")
+                response.make_conditional(request)
+            if asset['bodies']:
+                response.vary.add('Accept-Encoding')
+            response.cache_control.public = True
+            response.cache_control.max_age = self.max_age
+            response.cache_control.immutable = True
+            return response
+        return static
+
+    @staticmethod
+    def _choose_encoding(asset):
+        # Brotli first: when both are accepted it is the smaller of the two
+        for encoding in ('br', 'gzip'):
+            if encoding in asset['bodies'] and request.accept_encodings[encoding]:
+                return encoding
+        return None
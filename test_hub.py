@@ -0,0 +1,137 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import Blueprint, Flask
+
+# The radiology tests import their tool as `app`, so the hub is loaded under another name
+_spec = importlib.util.spec_from_file_location('hub', os.path.join(os.path.dirname(__file__), 'app.py'))
+hub = importlib.util.module_from_spec(_spec)
+os.environ.setdefault('RATE_LIMIT_DB', os.path.join(tempfile.mkdtemp(), 'rate_limits.db'))
+_spec.loader.exec_module(hub)
+
+TOOLS = [
+    {'name': 'Alpha', 'description': 'First tool', 'url': '/alpha', 'icon': 'flask', 'module': 'alpha'},
+    {'name': 'Alpha Beta', 'description': 'Nested tool', 'url': '/alpha/beta', 'icon': 'flask', 'module': 'beta'},
+]
+
+
+def tool_app(tool):
+    blueprint = Blueprint(tool['module'], tool['module'])
+    blueprint.add_url_rule('/', 'index', lambda: f"{tool['name']} home")
+    flask_app = Flask(tool['module'])
+    flask_app.register_blueprint(blueprint, url_prefix=tool['url'])
+    return flask_app
+
+
+class TestLazyToolDispatcher(unittest.TestCase):
+    """Test cases for loading tools on their first request"""
+
+    def setUp(self):
+        self.hub_app = Flask('hub')
+        self.hub_app.add_url_rule('/', 'index', lambda: 'hub home')
+        self.loaded = []
+
+    def dispatcher(self, factory=None, retry_seconds=60):
+        def record(tool):
+            self.loaded.append(tool['module'])
+            return (factory or tool_app)(tool)
+        dispatcher = hub.LazyToolDispatcher(self.hub_app.wsgi_app, TOOLS, factory=record,
+                                            retry_seconds=retry_seconds)
+        self.hub_app.wsgi_app = dispatcher
+        return dispatcher
+
+    def test_tools_load_on_first_request(self):
+        """Test that a tool is created on its first request and then reused"""
+        self.dispatcher()
+        client = self.hub_app.test_client()
+        self.assertEqual(client.get('/').data, b'hub home')
+        self.assertEqual(self.loaded, [])
+
+        self.assertEqual(client.get('/alpha/').data, b'Alpha home')
+        self.assertEqual(client.get('/alpha/').data, b'Alpha home')
+        self.assertEqual(self.loaded, ['alpha'])
+        # The longest matching url wins
+        self.assertEqual(client.get('/alpha/beta/').data, b'Alpha Beta home')
+        self.assertEqual(self.loaded, ['alpha', 'beta'])
+        # A url that only shares a prefix with a tool stays with the hub
+        self.assertEqual(client.get('/alphabet/').status_code, 404)
+        self.assertEqual(self.loaded, ['alpha', 'beta'])
+
+    def test_failed_tool_answers_503_until_retry(self):
+        """Test that a tool that fails to import is not retried until the retry window passes"""
+        attempts = []
+
+        def broken(tool):
+            attempts.append(tool['module'])
+            raise ImportError('missing dependency')
+
+        dispatcher = self.dispatcher(factory=broken)
+        client = self.hub_app.test_client()
+        for _ in range(3):
+            response = client.get('/alpha/')
+            self.assertEqual(response.status_code, 503)
+            self.assertIn(b'Alpha is unavailable', response.data)
+        self.assertEqual(attempts, ['alpha'])
+        # The hub and other tools keep working
+        self.assertEqual(client.get('/').data, b'hub home')
+
+        dispatcher.retry_seconds = 0
+        dispatcher.factory = tool_app
+        self.assertEqual(client.get('/alpha/').data, b'Alpha home')
+        self.assertNotIn('/alpha', dispatcher.failures)
+
+
+class TestHub(unittest.TestCase):
+    """Test cases for the hub app"""
+
+    def test_index_lists_tools_without_loading_them(self):
+        """Test that the landing page is served from the registry alone"""
+        response = hub.app.test_client().get('/')
+        self.assertEqual(response.status_code, 200)
+        for tool in hub.TOOLS:
+            self.assertIn(tool['url'].encode(), response.data)
+        self.assertEqual(hub.tool_dispatcher.apps, {})
+
+    def test_every_tool_names_a_module(self):
+        """Test that the registry entries have what the dispatcher and index need"""
+        for tool in hub.TOOLS:
+            self.assertTrue({'name', 'description', 'url', 'icon', 'module'} <= set(tool))
+            self.assertTrue(tool['url'].startswith('/') and not tool['url'].endswith('/'))
+
+
+class TestGunicornConfig(unittest.TestCase):
+    """Test cases for the production server settings"""
+
+    def load_config(self, **env):
+        spec = importlib.util.spec_from_file_location(
+            'gunicorn_conf', os.path.join(os.path.dirname(__file__), 'gunicorn.conf.py'))
+        config = importlib.util.module_from_spec(spec)
+        with mock.patch.dict(os.environ, env):
+            spec.loader.exec_module(config)
+        return config
+
+    def test_defaults_preload_threaded_workers(self):
+        """Test that workers are sized from the CPUs, preloaded and recycled"""
+        with mock.patch.dict(os.environ):
+            for name in ('WEB_CONCURRENCY', 'GUNICORN_MAX_REQUESTS', 'PORT'):
+                os.environ.pop(name, None)
+            config = self.load_config()
+        self.assertTrue(config.preload_app)
+        self.assertEqual(config.worker_class, 'gthread')
+        self.assertEqual(config.workers, min(2 * config._cpu_count() + 1, 8))
+        self.assertEqual(config.max_requests, 1000)
+        self.assertEqual(config.bind, '0.0.0.0:10000')
+
+    def test_environment_overrides(self):
+        """Test that the platform's PORT and WEB_CONCURRENCY are honoured"""
+        config = self.load_config(PORT='8080', WEB_CONCURRENCY='3', GUNICORN_MAX_REQUESTS='0')
+        self.assertEqual(config.bind, '0.0.0.0:8080')
+        self.assertEqual(config.workers, 3)
+        self.assertEqual(config.max_requests, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
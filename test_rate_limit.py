@@ -0,0 +1,183 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from flask import Flask
+
+from rate_limit import RateLimiter, TokenBucketStore, hash_api_key, load_api_keys, load_rules
+
+
+class TestTokenBucketStore(unittest.TestCase):
+    """Test cases for the SQLite token buckets"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'rate_limits.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_burst_then_refill(self):
+        """Test that a full bucket allows a burst, then refills at the rate"""
+        store = TokenBucketStore(self.db_path)
+        for _ in range(3):
+            allowed, _, _ = store.take('client', rate=1, burst=3, now=100)
+            self.assertTrue(allowed)
+        allowed, retry_after, _ = store.take('client', rate=1, burst=3, now=100)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 1)
+
+        allowed, _, tokens = store.take('client', rate=1, burst=3, now=101.5)
+        self.assertTrue(allowed)
+        self.assertAlmostEqual(tokens, 0.5)
+        # Refilling never goes past the burst
+        _, _, tokens = store.take('client', rate=1, burst=3, now=1000)
+        self.assertAlmostEqual(tokens, 2)
+
+    def test_buckets_are_shared_between_stores(self):
+        """Test that two stores on one file (as in two workers) share a bucket"""
+        first = TokenBucketStore(self.db_path)
+        second = TokenBucketStore(self.db_path)
+        self.assertTrue(first.take('client', rate=0.1, burst=2, now=100)[0])
+        self.assertTrue(second.take('client', rate=0.1, burst=2, now=100)[0])
+        self.assertFalse(first.take('client', rate=0.1, burst=2, now=100)[0])
+        self.assertTrue(second.take('other', rate=0.1, burst=2, now=100)[0])
+
+    def test_full_buckets_are_cleaned_up(self):
+        """Test that buckets that have refilled completely are deleted"""
+        store = TokenBucketStore(self.db_path, cleanup_probability=1)
+        store.take('idle', rate=1, burst=2, now=100)
+        store.take('busy', rate=1, burst=2, now=200)
+        conn = sqlite3.connect(self.db_path)
+        keys = [row[0] for row in conn.execute("SELECT key FROM buckets")]
+        conn.close()
+        self.assertEqual(keys, ['busy'])
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test cases for per-route limits on a Flask app"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = TokenBucketStore(os.path.join(self.tmpdir.name, 'rate_limits.db'))
+        self.flask_app = Flask(__name__)
+
+        @self.flask_app.route('/radiology/translate', methods=['POST'])
+        def translate():
+            return 'ok'
+
+        @self.flask_app.route('/radiology/translate/batch', methods=['POST'])
+        def translate_batch():
+            return 'ok'
+
+        @self.flask_app.route('/radiology/translate/jobs/<job_id>')
+        def job_status(job_id):
+            return 'ok'
+
+        @self.flask_app.route('/lab-value-helper/evaluate', methods=['POST'])
+        def evaluate():
+            return 'ok'
+
+        @self.flask_app.route('/lab-value-helper/static/<path:filename>')
+        def lab_static(filename):
+            return 'ok'
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_client(self, rules, **kwargs):
+        RateLimiter(self.store, load_rules(json.dumps(rules)), **kwargs).init_app(self.flask_app)
+        return self.flask_app.test_client()
+
+    def test_over_budget_gets_429_with_retry_after(self):
+        """Test that a client over its budget is told when to come back"""
+        client = self.make_client({'/radiology/translate': {'requests': 1, 'per': 60, 'burst': 2}})
+        self.assertEqual(client.post('/radiology/translate').status_code, 200)
+        self.assertEqual(client.post('/radiology/translate').status_code, 200)
+        response = client.post('/radiology/translate')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '60')
+        self.assertIn('error', response.get_json())
+
+    def test_clients_and_routes_have_separate_budgets(self):
+        """Test that other clients, the lab helper and job polling are not throttled by translations"""
+        client = self.make_client({'/radiology/translate': {'requests': 1, 'per': 60, 'burst': 1}},
+                                  api_keys=load_api_keys(hash_api_key('partner-key').upper() + ', '))
+        self.assertEqual(client.post('/radiology/translate').status_code, 200)
+        self.assertEqual(client.post('/radiology/translate').status_code, 429)
+
+        self.assertEqual(client.post('/radiology/translate', headers={'X-API-Key': 'partner-key'}).status_code, 200)
+        self.assertEqual(client.post('/radiology/translate', environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code, 200)
+        self.assertEqual(client.get('/radiology/translate/jobs/abc').status_code, 200)
+        self.assertEqual(client.post('/lab-value-helper/evaluate').status_code, 200)
+
+    def test_unknown_keys_and_forged_forwarding_do_not_reset_the_budget(self):
+        """Test that made-up API keys and X-Forwarded-For from an untrusted hop still hit the IP's bucket"""
+        client = self.make_client({'/radiology/translate': {'requests': 1, 'per': 60, 'burst': 1}},
+                                  api_keys=load_api_keys(hash_api_key('partner-key')))
+        self.assertEqual(client.post('/radiology/translate').status_code, 200)
+        for i in range(3):
+            self.assertEqual(client.post('/radiology/translate', headers={'X-API-Key': f'random-{i}'}).status_code, 429)
+            self.assertEqual(client.post('/radiology/translate',
+                                         headers={'X-Forwarded-For': f'203.0.113.{i}'}).status_code, 429)
+
+    def test_forwarded_address_behind_trusted_proxy(self):
+        """Test that the client address comes from X-Forwarded-For when the hub sits behind a proxy"""
+        client = self.make_client({'/radiology/translate': {'requests': 1, 'per': 60, 'burst': 1}},
+                                  trusted_proxies=1)
+        proxy = {'REMOTE_ADDR': '10.0.0.2'}
+        self.assertEqual(client.post('/radiology/translate', environ_base=proxy,
+                                     headers={'X-Forwarded-For': '203.0.113.9'}).status_code, 200)
+        self.assertEqual(client.post('/radiology/translate', environ_base=proxy,
+                                     headers={'X-Forwarded-For': '203.0.113.9'}).status_code, 429)
+        # A spoofed entry in front of the one the proxy added is ignored
+        self.assertEqual(client.post('/radiology/translate', environ_base=proxy,
+                                     headers={'X-Forwarded-For': '198.51.100.1, 203.0.113.9'}).status_code, 429)
+        self.assertEqual(client.post('/radiology/translate', environ_base=proxy,
+                                     headers={'X-Forwarded-For': '203.0.113.10'}).status_code, 200)
+
+    def test_batch_takes_a_token_per_impression(self):
+        """Test that a 20-item batch drains 20 tokens from the shared translation budget"""
+        client = self.make_client({'/radiology/translate': {'requests': 1, 'per': 60, 'burst': 21}})
+        impressions = [f'Finding {i}' for i in range(20)]
+        self.assertEqual(client.post('/radiology/translate/batch', json={'impressions': impressions}).status_code, 200)
+        _, _, tokens = self.store.take('/radiology/translate|ip:127.0.0.1', rate=1 / 60, burst=21, cost=0)
+        self.assertAlmostEqual(tokens, 1, places=2)
+        self.assertEqual(client.post('/radiology/translate').status_code, 200)
+        self.assertEqual(client.post('/radiology/translate/batch', json={'impressions': ['One more']}).status_code, 429)
+
+    def test_malformed_batch_takes_one_token(self):
+        """Test that a batch body without an impressions list costs one request, as the view rejects it"""
+        client = self.make_client({'/radiology/translate': {'requests': 1, 'per': 60, 'burst': 2}})
+        self.assertEqual(client.post('/radiology/translate/batch', json=['not', 'an', 'object']).status_code, 200)
+        self.assertEqual(client.post('/radiology/translate/batch', data='impressions').status_code, 200)
+        self.assertEqual(client.post('/radiology/translate/batch', json={'impressions': []}).status_code, 429)
+
+    def test_lab_static_files_are_not_limited(self):
+        """Test that loading the lab helper's scripts and styles does not spend its budget"""
+        client = self.make_client({'/lab-value-helper': {'requests': 1, 'per': 60, 'burst': 1}})
+        for _ in range(5):
+            self.assertEqual(client.get('/lab-value-helper/static/js/app.js').status_code, 200)
+        self.assertEqual(client.post('/lab-value-helper/evaluate').status_code, 200)
+        self.assertEqual(client.post('/lab-value-helper/evaluate').status_code, 429)
+
+    def test_disabled_limiter_allows_everything(self):
+        """Test that RATE_LIMIT_ENABLED=0 turns the checks off"""
+        RateLimiter(self.store, load_rules('{"/radiology/translate": {"requests": 1, "burst": 1}}'),
+                    enabled=False).init_app(self.flask_app)
+        client = self.flask_app.test_client()
+        for _ in range(3):
+            self.assertEqual(client.post('/radiology/translate').status_code, 200)
+
+    def test_invalid_config_falls_back_to_defaults(self):
+        """Test that a malformed RATE_LIMITS keeps the default rules, longest prefix first"""
+        rules = load_rules('not json')
+        prefixes = [rule.prefix for rule in rules]
+        self.assertEqual(prefixes[0], '/radiology/translate/jobs')
+        self.assertIn('/lab-value-helper', prefixes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from flask import Blueprint, Flask, url_for
+
+import static_assets
+from static_assets import StaticAssets, fingerprinted_name
+
+STYLESHEET = ''.join(f".rule-{i} {{ color: #{i:06x}; }}\n" for i in range(100))
+
+
+class TestStaticAssets(unittest.TestCase):
+    """Test cases for fingerprinted, precompressed static files"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        folder = os.path.join(self.tmpdir.name, 'static')
+        os.makedirs(os.path.join(folder, 'css'))
+        with open(os.path.join(folder, 'css', 'tool.css'), 'w') as f:
+            f.write(STYLESHEET)
+        with open(os.path.join(folder, 'tiny.js'), 'w') as f:
+            f.write('var tiny = 1;\n')
+
+        blueprint = Blueprint('tool', __name__, static_folder=folder)
+        self.app = Flask(__name__, static_folder=None)
+        self.app.register_blueprint(blueprint, url_prefix='/tool')
+        StaticAssets(max_age=600).init_app(self.app)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def asset_url(self, filename):
+        with self.app.test_request_context():
+            return url_for('tool.static', filename=filename)
+
+    def test_urls_carry_the_content_hash(self):
+        """Test that url_for returns a name that changes with the file's contents"""
+        url = self.asset_url('css/tool.css')
+        self.assertRegex(url, r'^/tool/static/css/tool\.[0-9a-f]{12}\.css$')
+        self.assertEqual(fingerprinted_name('css/tool.css', 'abc'), 'css/tool.abc.css')
+        # Files that are not in the folder are left alone
+        self.assertEqual(self.asset_url('missing.css'), '/tool/static/missing.css')
+
+    def test_fingerprinted_files_are_immutable_and_compressed(self):
+        """Test that a hashed URL is served compressed with long-lived caching"""
+        url = self.asset_url('css/tool.css')
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.data).decode(), STYLESHEET)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertTrue(response.cache_control.immutable)
+        self.assertTrue(response.cache_control.public)
+        self.assertEqual(response.cache_control.max_age, 600)
+
+        again = self.client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+        plain = self.client.get(url, headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(plain.get_data(as_text=True), STYLESHEET)
+        self.assertTrue(plain.cache_control.immutable)
+        self.assertNotEqual(plain.headers['ETag'], response.headers['ETag'])
+
+    def test_brotli_preferred_when_installed(self):
+        """Test that brotli is sent to clients that accept it"""
+        if static_assets.brotli is None:
+            self.skipTest('brotli is not installed')
+        response = self.client.get(self.asset_url('css/tool.css'), headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(static_assets.brotli.decompress(response.data).decode(), STYLESHEET)
+
+    def test_small_files_and_plain_names(self):
+        """Test that small files are not compressed and plain names are still served for revalidation"""
+        response = self.client.get(self.asset_url('tiny.js'), headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertNotIn('Vary', response.headers)
+        self.assertTrue(response.cache_control.immutable)
+
+        response = self.client.get('/tool/static/tiny.js')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.cache_control.immutable)
+        self.assertEqual(self.client.get('/tool/static/tiny.0123456789ab.js').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()